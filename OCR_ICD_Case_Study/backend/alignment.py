@@ -0,0 +1,192 @@
+# alignment.py
+# ---------------------------------------------------------
+# Fuzzy sentence -> bounding box alignment for ICD grounding.
+#
+# The LLM's supporting_sentence is often paraphrased, re-cased, or
+# spans several OCR lines, so exact or single-line matching misses.
+# Per document we precompute, for every OCR line:
+#   - its normalized token set
+#   - its character 3-gram shingle set
+# A query is aligned by
+#   1. picking candidate lines with the BM25 index (rag_retriever),
+#   2. expanding each into windows of 1..MAX_SPAN_LINES consecutive
+#      lines on the same page (signatures = union of line signatures),
+#   3. scoring windows with token F1 + shingle Dice similarity,
+# and the best window's union bbox is returned with its score as
+# confidence.
+# A window only qualifies if it also covers at least
+# MIN_CONTENT_COVERAGE of the sentence's content tokens, weighted by
+# their BM25 IDF in the document. Content tokens exclude section
+# labels ("Diagnosis:", "Assessment:", ...), so a line that shares only
+# boilerplate and a common word with the sentence (e.g.
+# "Diagnosis: Type 2 Diabetes Mellitus" vs. a "Diagnosis: Hypertension"
+# line) is not returned as its evidence.
+# ---------------------------------------------------------
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .chunk_table import ChunkTable
+from .rag_retriever import BM25Retriever, get_retriever, tokenize
+
+MAX_SPAN_LINES = 3
+CANDIDATE_LINES = 8
+MIN_CONFIDENCE = 0.35
+MIN_CONTENT_COVERAGE = 0.5
+
+# section labels and note boilerplate: shared by unrelated lines, never evidence on their own
+_BOILERPLATE = frozenset(
+    "admission admitting assessment chief complaint diagnoses diagnosis discharge dx final "
+    "history hpi impression note patient plan pmh primary problem problems pt reason secondary "
+    "today visit".split()
+)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def shingles(normalized: str, n: int = 3) -> FrozenSet[str]:
+    if len(normalized) < n:
+        return frozenset([normalized]) if normalized else frozenset()
+    return frozenset(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+
+
+def _dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class Alignment:
+    __slots__ = ("page", "bbox", "start", "end", "text", "confidence")
+
+    def __init__(self, page: int, bbox: Tuple[float, float, float, float], start: int, end: int,
+                 text: str, confidence: float):
+        self.page = page
+        self.bbox = bbox
+        self.start = start  # first line index (inclusive)
+        self.end = end      # last line index (exclusive)
+        self.text = text
+        self.confidence = confidence
+
+
+class SentenceAligner:
+    def __init__(self, table: ChunkTable, retriever: Optional[BM25Retriever] = None):
+        self.table = table
+        self.retriever = retriever or BM25Retriever(table)
+        self.line_tokens: List[FrozenSet[str]] = []
+        self.line_shingles: List[FrozenSet[str]] = []
+        for text in table.texts():
+            self.line_tokens.append(frozenset(tokenize(text)))
+            self.line_shingles.append(shingles(normalize(text)))
+        self._span_cache: Dict[Tuple[int, int], Tuple[FrozenSet[str], FrozenSet[str]]] = {}
+        n = len(table)
+        # weight of a token that occurs nowhere in the document (the rarest possible)
+        self._unseen_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    def content_weights(self, query_tokens: FrozenSet[str]) -> Dict[str, float]:
+        """IDF weight of each non-boilerplate query token (tokens absent from the document weigh most)."""
+        idf = self.retriever.idf
+        return {t: idf.get(t, self._unseen_idf) for t in query_tokens if t not in _BOILERPLATE}
+
+    def content_coverage(self, weights: Dict[str, float], start: int, end: int) -> float:
+        total = sum(weights.values())
+        if not total:
+            return 1.0  # nothing but boilerplate to go on: similarity alone decides
+        tokens, _ = self._span_signature(start, end)
+        return sum(w for t, w in weights.items() if t in tokens) / total
+
+    def _span_signature(self, start: int, end: int):
+        key = (start, end)
+        sig = self._span_cache.get(key)
+        if sig is None:
+            tokens = frozenset().union(*self.line_tokens[start:end])
+            grams = frozenset().union(*self.line_shingles[start:end])
+            sig = (tokens, grams)
+            self._span_cache[key] = sig
+        return sig
+
+    def _candidate_spans(self, query: str) -> List[Tuple[int, int]]:
+        scores = self.retriever.score(query)
+        lines = sorted(scores, key=scores.get, reverse=True)[:CANDIDATE_LINES]
+        spans = set()
+        pages = self.table.pages
+        n = len(pages)
+        for i in lines:
+            page = pages[i]
+            for width in range(1, MAX_SPAN_LINES + 1):
+                for start in range(max(0, i - width + 1), i + 1):
+                    end = start + width
+                    if end > n:
+                        continue
+                    if pages[start] != page or pages[end - 1] != page:
+                        continue
+                    spans.add((start, end))
+        return sorted(spans)
+
+    def similarity(self, query_tokens: FrozenSet[str], query_grams: FrozenSet[str], start: int, end: int) -> float:
+        tokens, grams = self._span_signature(start, end)
+        if query_tokens and tokens:
+            token_f1 = 2 * len(query_tokens & tokens) / (len(query_tokens) + len(tokens))
+        else:
+            token_f1 = 0.0
+        return 0.5 * token_f1 + 0.5 * _dice(query_grams, grams)
+
+    def align(self, sentence: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[Alignment]:
+        if not sentence:
+            return None
+        query_tokens = frozenset(tokenize(sentence))
+        query_grams = shingles(normalize(sentence))
+        weights = self.content_weights(query_tokens)
+
+        best: Optional[Tuple[float, int, int]] = None
+        for start, end in self._candidate_spans(sentence):
+            if self.content_coverage(weights, start, end) < MIN_CONTENT_COVERAGE:
+                continue
+            score = self.similarity(query_tokens, query_grams, start, end)
+            # ties go to the shorter span
+            if best is None or score > best[0] or (score == best[0] and end - start < best[2] - best[1]):
+                best = (score, start, end)
+
+        if best is None or best[0] < min_confidence:
+            return None
+
+        score, start, end = best
+        table = self.table
+        text = " ".join(table.texts(start, end))
+        return Alignment(table.page(start), table.union_bbox(start, end), start, end, text, round(score, 4))
+
+    def align_all(self, sentences: List[str]) -> List[Optional[Alignment]]:
+        """Batch alignment; duplicate sentences are aligned once."""
+        done: Dict[str, Optional[Alignment]] = {}
+        for s in sentences:
+            if s not in done:
+                done[s] = self.align(s)
+        return [done[s] for s in sentences]
+
+
+# One aligner per doc_id; OCR output of a doc never changes.
+_ALIGNERS: "OrderedDict[str, SentenceAligner]" = OrderedDict()
+_ALIGNERS_MAX = 64
+_ALIGNERS_LOCK = threading.Lock()
+
+
+def get_aligner(doc_id: str, table: ChunkTable) -> SentenceAligner:
+    with _ALIGNERS_LOCK:
+        aligner = _ALIGNERS.get(doc_id)
+        if aligner is not None and len(aligner.table) == len(table):
+            _ALIGNERS.move_to_end(doc_id)
+            return aligner
+
+    aligner = SentenceAligner(table, get_retriever(doc_id, table))
+    with _ALIGNERS_LOCK:
+        _ALIGNERS[doc_id] = aligner
+        while len(_ALIGNERS) > _ALIGNERS_MAX:
+            _ALIGNERS.popitem(last=False)
+    return aligner
@@ -1,26 +1,53 @@
-import base64
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
 import uuid
-from io import BytesIO
-from typing import Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
 
 from .schemas import (
     UploadOut,
+    BatchStatus,
     ExtractRequest,
     ExtractResponse,
     ReportRequest,
     ReportResponse,
+    JobStatus,
+    PageInfo,
+    ChunkPage,
+    ICDItem,
 )
-from .ocr_client import run_ocr
-from .llm_client import extract_icd_with_llm
+from .config import (
+    OCR_WORKERS, OCR_QUEUE_MAX, OCR_JOB_HISTORY, PREVIEW_MAX_WIDTH,
+    BATCH_CONCURRENCY, BATCH_OUTPUT_DIR, MAX_UPLOAD_BYTES, LOG_LEVEL,
+)
+from .jobs import JobQueue, QueueFullError
+from .ocr_cache import OCR_CACHE
+from .doc_store import DocumentStore, make_doc_store
+from .ocr_client import run_ocr, close_http_client
+from .chunk_table import ChunkTable, normalize_bbox
+from .llm_client import extract_icds_for_chunks, extraction_mode, extraction_model, SYSTEM_PROMPT
+from .icd_cache import ICD_CACHE, extraction_key
+from .llm_gateway import get_gateway
 from .report_generator import generate_report_for_icds
+from .uploads import UploadTooLarge, spool_upload, upload_buffer
+from .pipeline import PipelineStats, iter_sources, make_writer, run_pipeline
+from .previews import render_page_preview, preview_blob_name, preview_media_type
+from . import metrics
+from .metrics import HTTP_SECONDS, stage
 
-try:
-    from PIL import Image
-except ImportError:
-    Image = None  # type: ignore
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 
 app = FastAPI(title="Pharma ICD OCR Demo (LangChain + Azure + OpenAI + pgvector)")
@@ -34,121 +61,457 @@ app.add_middleware(
 )
 
 
-# In-memory doc store for demo
-DOC_STORE: Dict[str, Dict[str, Any]] = {}
+# Doc store: bounded in-memory LRU or SQLite shared across workers (DOC_STORE_BACKEND)
+DOC_STORE: DocumentStore = make_doc_store()
+
+
+async def _get_doc(doc_id: str) -> Optional[Dict[str, Any]]:
+    # disk-backed stores do blocking I/O; keep it off the event loop
+    return await asyncio.to_thread(DOC_STORE.get, doc_id)
+
+
+async def _process_upload(doc_id: str, doc_name: str, upload) -> None:
+    """Background job: OCR → store. Runs on the JobQueue workers.
+
+    `upload` is the spooled temp file from POST /upload; it is read through
+    a zero-copy view and closed here. Previews are not rendered here;
+    GET /doc/{doc_id}/page/{n}.png renders them on first use from the
+    stored original.
+    """
+    try:
+        with upload_buffer(upload) as content:
+            # OCR (async – the event loop keeps serving while Azure works)
+            table, pages = await run_ocr(doc_id, doc_name, content)
+
+            doc = {
+                "doc_name": doc_name,
+                "table": table,
+                "pages": pages,
+            }
+            await JOBS.run_in_thread(DOC_STORE.put, doc_id, doc)
+            await JOBS.run_in_thread(DOC_STORE.put_blob, doc_id, "source", content)
+    finally:
+        upload.close()
+
+
+JOBS = JobQueue(_process_upload, workers=OCR_WORKERS, max_queued=OCR_QUEUE_MAX, history=OCR_JOB_HISTORY)
+
+
+def _stats_gauge(label: str, stats: Callable[[], Dict[str, Any]]):
+    """Expose the numeric fields of a stats() dict as one labelled gauge family."""
+    def collect():
+        return {
+            ((label, key),): value
+            for key, value in stats().items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+    return collect
 
 
-@app.post("/upload", response_model=UploadOut)
+metrics.register_gauges("jobs", "OCR jobs by status (and worker count).", _stats_gauge("status", JOBS.stats))
+metrics.register_gauges("ocr_cache", "OCR result cache counters.", _stats_gauge("field", OCR_CACHE.stats))
+metrics.register_gauges("icd_cache", "ICD extraction cache counters.", _stats_gauge("field", ICD_CACHE.stats))
+
+
+@app.middleware("http")
+async def _observe_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # route template, not the raw path: doc ids must not become label values
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            route=getattr(route, "path", "unmatched"),
+            method=request.method,
+            status=str(status),
+        )
+
+
+@app.middleware("http")
+async def _reject_oversized_uploads(request: Request, call_next):
+    # refuse before the multipart body is received and parsed
+    length = request.headers.get("content-length")
+    if request.url.path == "/upload" and length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES + 64 * 1024:
+        return Response(status_code=413, content=f"upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+    return await call_next(request)
+
+
+@app.on_event("startup")
+async def _startup():
+    await JOBS.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await JOBS.stop()
+    await close_http_client()
+    await get_gateway().aclose()
+
+
+@app.post("/upload", response_model=UploadOut, status_code=202)
 async def upload(file: UploadFile = File(...)):
     """
-    Upload an image or PDF → run OCR → return preview image + chunks + bounding boxes.
+    Upload an image or PDF → enqueue OCR + preview. Returns immediately;
+    poll GET /jobs/{doc_id} until it reports "succeeded", then GET /doc/{doc_id}.
     """
-    content = await file.read()
+    # streamed to a spooled temp file; the job owns (and closes) it
+    try:
+        with stage("upload_read"):
+            upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     doc_id = str(uuid.uuid4())
     doc_name = file.filename or "document"
 
-    # OCR
-    chunks, page_width, page_height = run_ocr(doc_id, doc_name, content)
+    try:
+        JOBS.submit(doc_id, doc_name, upload)
+    except QueueFullError as e:
+        upload.close()
+        raise HTTPException(status_code=503, detail=str(e))
 
-    # PREVIEW image generation
-    image_data_url = _make_preview_image_data_url(content, page_width, page_height)
+    return UploadOut(status="queued", doc_id=doc_id)
 
-    DOC_STORE[doc_id] = {
-        "doc_name": doc_name,
-        "chunks": chunks,
-        "image_data_url": image_data_url,
-        "page_width": page_width,
-        "page_height": page_height,
-    }
 
-    return UploadOut(status="ok", doc_id=doc_id)
+@app.get("/jobs/{doc_id}", response_model=JobStatus)
+async def get_job(doc_id: str):
+    """Status of a background upload job: queued / running / succeeded / failed."""
+    job = JOBS.get(doc_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+# Batch ingestion: batch_id -> {"stats", "task", "results", "error"}
+BATCHES: Dict[str, Dict[str, Any]] = {}
+
 
+def _save_upload(file: UploadFile, dest: str) -> None:
+    # chunked copy from Starlette's spooled temp file; never holds the whole upload
+    file.file.seek(0)
+    with open(dest, "wb") as out:
+        shutil.copyfileobj(file.file, out, 1024 * 1024)
 
-# --------------------------------------------------------------------
-# FIXED PREVIEW IMAGE FUNCTION (handles PDF or Images)
-# --------------------------------------------------------------------
-from PIL import Image as PILImage
 
-def _make_preview_image_data_url(content: bytes, page_width: float, page_height: float) -> str:
+async def _run_batch(batch_id: str, inputs_dir: str) -> None:
+    batch = BATCHES[batch_id]
+    try:
+        writer = make_writer(batch["results"])
+        await run_pipeline(iter_sources([inputs_dir]), writer, BATCH_CONCURRENCY, stats=batch["stats"])
+    except Exception as e:
+        batch["error"] = str(e)
+    finally:
+        batch["stats"].finished_at = batch["stats"].finished_at or time.time()
+        await asyncio.to_thread(shutil.rmtree, inputs_dir, True)
+
+
+@app.post("/upload/batch", response_model=BatchStatus, status_code=202)
+async def upload_batch(files: List[UploadFile] = File(...)):
     """
-    Creates a preview image:
-    - If it's an image: load directly
-    - If it's a PDF: create a blank white canvas sized based on page inches
+    Upload many images/PDFs (repeat the `files` field) and/or .zip archives of them.
+    Documents run through OCR → ICD extraction → grounding with BATCH_CONCURRENCY
+    in flight; poll GET /batches/{batch_id}, then download the JSONL results.
     """
+    batch_id = str(uuid.uuid4())
+    batch_dir = os.path.join(BATCH_OUTPUT_DIR, batch_id)
+    inputs_dir = os.path.join(batch_dir, "inputs")
+    await asyncio.to_thread(os.makedirs, inputs_dir, exist_ok=True)
+
+    for i, file in enumerate(files):
+        name = os.path.basename(file.filename or f"document-{i}")
+        # prefix keeps duplicate filenames apart and preserves upload order
+        await asyncio.to_thread(_save_upload, file, os.path.join(inputs_dir, f"{i:06d}-{name}"))
+
+    BATCHES[batch_id] = {
+        "stats": PipelineStats(),
+        "results": os.path.join(batch_dir, "results.jsonl"),
+        "error": None,
+    }
+    BATCHES[batch_id]["task"] = asyncio.create_task(_run_batch(batch_id, inputs_dir))
+    return _batch_status(batch_id)
+
+
+def _batch_status(batch_id: str) -> BatchStatus:
+    batch = BATCHES[batch_id]
+    stats = batch["stats"].as_dict()
+    if batch["error"]:
+        status = "failed"
+    elif stats["finished"]:
+        status = "succeeded"
+    else:
+        status = "running"
+    return BatchStatus(
+        batch_id=batch_id,
+        status=status,
+        submitted=stats["submitted"],
+        succeeded=stats["succeeded"],
+        failed=stats["failed"],
+        elapsed_s=stats["elapsed_s"],
+        docs_per_s=stats["docs_per_s"],
+        results_url=f"/batches/{batch_id}/results",
+        error=batch["error"],
+    )
+
+
+@app.get("/batches/{batch_id}", response_model=BatchStatus)
+async def get_batch(batch_id: str):
+    if batch_id not in BATCHES:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return _batch_status(batch_id)
 
-    try:
-        # Try treating the input as an image
-        img = PILImage.open(BytesIO(content)).convert("RGB")
 
-    except Exception:
-        # PDF fallback
-        print("⚠️ Uploaded file is not an image. Creating blank preview canvas instead.")
+@app.get("/batches/{batch_id}/results")
+async def get_batch_results(batch_id: str):
+    """JSONL, one line per document; readable while the batch is still running."""
+    batch = BATCHES.get(batch_id)
+    if not batch or not os.path.exists(batch["results"]):
+        raise HTTPException(status_code=404, detail="no results yet")
+    return FileResponse(batch["results"], media_type="application/x-ndjson")
 
-        # Convert PDF size from inches → pixels
-        # Azure often returns page dimensions in inches
-        w_px = int(float(page_width) * 96)
-        h_px = int(float(page_height) * 96)
 
-        # Minimum for preview
-        w_px = max(w_px, 800)
-        h_px = max(h_px, 1100)
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: per-stage / per-route latency histograms, queue and cache gauges."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
 
-        img = PILImage.new("RGB", (w_px, h_px), color="white")
 
-    # Convert to Base64
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    return f"data:image/png;base64,{b64}"
+@app.get("/ocr-cache/stats")
+async def ocr_cache_stats():
+    """Hit/miss counters for the content-addressed OCR cache."""
+    return OCR_CACHE.stats()
+
+
+@app.get("/icd-cache/stats")
+async def icd_cache_stats():
+    """Hit / miss / coalesced counters for memoized ICD extraction."""
+    return ICD_CACHE.stats()
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Per-operation call / retry / latency / token counters of the LLM gateway."""
+    return get_gateway().stats()
+
+
+@app.get("/doc-store/stats")
+async def doc_store_stats():
+    """Size / eviction counters for the configured document store."""
+    return await asyncio.to_thread(DOC_STORE.stats)
+
+
+async def _extract_icds(doc_id: str, doc: Dict[str, Any]) -> List[ICDItem]:
+    """ICD extraction for a stored doc, memoized + single-flighted per document."""
+    table = doc["table"]
+    model = f"{extraction_model()}:{extraction_mode(table)}"
+    key = extraction_key(doc_id, table.full_text(), model, SYSTEM_PROMPT)
+
+    async def compute() -> List[ICDItem]:
+        with stage("llm_extract"):
+            return await extract_icds_for_chunks(table)
+
+    return await ICD_CACHE.get_or_compute(key, compute)
 
 
 @app.post("/extract-icd", response_model=ExtractResponse)
 async def extract_icd(req: ExtractRequest):
     """Run LLM (or mock) to extract ICD codes and supporting sentences."""
-    doc = DOC_STORE.get(req.doc_id)
+    doc = await _get_doc(req.doc_id)
     if not doc:
         raise ValueError("Unknown doc_id")
 
-    chunks = doc["chunks"]
-    full_text = "\n".join(c.text for c in chunks)
-
-    icd_items = extract_icd_with_llm(full_text)
+    icd_items = await _extract_icds(req.doc_id, doc)
     return ExtractResponse(doc_id=req.doc_id, icds=icd_items)
 
 
 @app.post("/view-report", response_model=ReportResponse)
 async def view_report(req: ReportRequest):
     """Return ICD codes + grounded locations (page, bbox, doc)."""
-    doc = DOC_STORE.get(req.doc_id)
+    doc = await _get_doc(req.doc_id)
     if not doc:
         raise ValueError("Unknown doc_id")
 
-    chunks = doc["chunks"]
-    full_text = "\n".join(c.text for c in chunks)
-    icd_items = extract_icd_with_llm(full_text)
-
-    locations = generate_report_for_icds(
-        doc_id=req.doc_id,
-        chunks=chunks,
-        icds=icd_items,
-        filter_codes=req.icd_codes,
-    )
+    # same doc as the preceding /extract-icd call → served from ICD_CACHE
+    icd_items = await _extract_icds(req.doc_id, doc)
+
+    # index build is CPU-bound on long charts; keep it off the event loop
+    with stage("grounding"):
+        locations = await asyncio.to_thread(
+            generate_report_for_icds,
+            doc_id=req.doc_id,
+            table=doc["table"],
+            icds=icd_items,
+            filter_codes=req.icd_codes,
+        )
+    if req.normalized:
+        sizes = _page_sizes(doc)
+        for loc in locations:
+            loc.bbox = normalize_bbox(loc.bbox, sizes.get(loc.page))
     return ReportResponse(doc_id=req.doc_id, locations=locations)
 
 
+def _find_page(doc: Dict[str, Any], page: int) -> Optional[PageInfo]:
+    for p in doc["pages"]:
+        if p.page == page:
+            return p
+    return None
+
+
+def _page_sizes(doc: Dict[str, Any]):
+    return {p.page: (p.width, p.height) for p in doc["pages"]}
+
+
+def _level_table(doc: Dict[str, Any], level: str) -> ChunkTable:
+    table = doc["table"]
+    if level == "line":
+        return table
+    if table.layout is None:
+        raise HTTPException(status_code=404, detail=f"no {level} layout for this document")
+    return table.layout.words if level == "word" else table.layout.paragraphs
+
+
+def _page_bounds(table: ChunkTable, page: Optional[int]):
+    """(start, end) row range of `table` for one page, or for all pages."""
+    if page is None:
+        return 0, len(table)
+    return table.page_range(page)
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_response(obj: Any) -> Response:
+    # bypasses response_model validation; the payload is built to match it
+    return Response(content=_dumps(obj), media_type="application/json")
+
+
 @app.get("/doc/{doc_id}")
 async def get_doc(doc_id: str):
-    """Return preview image + OCR chunks + page dimensions for drawing boxes."""
-    doc = DOC_STORE.get(doc_id)
+    """Return document metadata: per-page sizes and preview URLs.
+
+    Chunks are fetched per page from GET /doc/{doc_id}/chunks.
+    """
+    doc = await _get_doc(doc_id)
     if not doc:
         return {"error": "doc not found"}
 
-    chunks = [c.model_dump() for c in doc["chunks"]]
-    return {
+    return _json_response({
         "doc_id": doc_id,
         "doc_name": doc["doc_name"],
-        "image_data_url": doc["image_data_url"],
-        "page_width": doc["page_width"],
-        "page_height": doc["page_height"],
-        "chunks": chunks,
-    }
+        "page_count": len(doc["pages"]),
+        "line_count": len(doc["table"]),
+        "pages": [
+            dict(
+                p.model_dump(),
+                image_url=f"/doc/{doc_id}/page/{p.page}.png",
+                chunks_url=f"/doc/{doc_id}/chunks?page={p.page}",
+            )
+            for p in doc["pages"]
+        ],
+    })
+
+
+@app.get("/doc/{doc_id}/chunks", response_model=ChunkPage)
+async def get_doc_chunks(
+    doc_id: str,
+    page: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+    level: str = Query("line", pattern="^(line|word|paragraph)$"),
+    normalized: bool = False,
+):
+    """OCR chunks of one page (or all pages), paginated by offset/limit.
+
+    With stream=true the whole selection is sent as NDJSON, one chunk per
+    line, so clients can draw boxes as they arrive. level=word|paragraph
+    returns the Azure word / paragraph groupings instead of lines, and
+    normalized=true returns boxes in 0–1 page coordinates.
+    """
+    doc = await _get_doc(doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="doc not found")
+    if page is not None and _find_page(doc, page) is None:
+        raise HTTPException(status_code=404, detail="page not found")
+
+    table = _level_table(doc, level)
+    start, end = _page_bounds(table, page)
+    sizes = _page_sizes(doc) if normalized else None
+
+    def _rows(lo: int, hi: int):
+        rows = table.to_dicts(lo, hi, page_sizes=sizes)
+        if level == "paragraph":
+            roles = doc["table"].layout.paragraph_roles
+            for i, row in enumerate(rows, lo):
+                row["role"] = roles[i]
+        return rows
+
+    if stream:
+        def _ndjson():
+            # OCRChunk dicts are built per batch of rows, never for the whole doc at once
+            for lo in range(start, end, 256):
+                rows = _rows(lo, min(lo + 256, end))
+                yield b"".join(_dumps(r) + b"\n" for r in rows)
+
+        return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+    lo = min(start + offset, end)
+    hi = min(lo + limit, end)
+    return _json_response({
+        "doc_id": doc_id,
+        "page": page,
+        "offset": offset,
+        "limit": limit,
+        "total": end - start,
+        "chunks": _rows(lo, hi),
+    })
+
+
+@app.get("/doc/{doc_id}/page/{page}.png")
+async def get_page_preview(
+    doc_id: str,
+    page: int,
+    request: Request,
+    max_width: int = Query(PREVIEW_MAX_WIDTH, ge=64, le=4000),
+):
+    """Page preview, rendered on first request and cached in the doc store.
+
+    Previews of a doc_id never change, so the ETag is derived from the
+    request alone and a matching If-None-Match is answered without
+    touching the store.
+    """
+    if page < 1:
+        raise HTTPException(status_code=404, detail="page not found")
+
+    blob_name = preview_blob_name(page, max_width)
+    etag = f'"{doc_id}-{blob_name}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "private, max-age=86400, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+
+    doc = await _get_doc(doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="doc not found")
+    page_info = _find_page(doc, page)
+    if page_info is None:
+        raise HTTPException(status_code=404, detail="page not found")
+
+    data = await asyncio.to_thread(DOC_STORE.get_blob, doc_id, blob_name)
+    media_type = preview_media_type()
+    if data is None:
+        source = await asyncio.to_thread(DOC_STORE.get_blob, doc_id, "source")
+        if source is None:
+            raise HTTPException(status_code=404, detail="original upload no longer available")
+        with stage("preview_render"):
+            data, media_type = await asyncio.to_thread(
+                render_page_preview, source, page, max_width, page_info.width, page_info.height
+            )
+        await asyncio.to_thread(DOC_STORE.put_blob, doc_id, blob_name, data)
+
+    return Response(content=data, media_type=media_type, headers=cache_headers)
@@ -0,0 +1,293 @@
+# chunk_table.py
+# ---------------------------------------------------------
+# Columnar, array-backed storage for a document's OCR lines.
+#
+# One OCRChunk per line repeats doc_id / doc_name and allocates a
+# pydantic model + bbox tuple each. A ChunkTable instead keeps
+#   - doc_id / doc_name once,
+#   - all line texts in one "\n"-joined string + an offsets array
+#     (so the full document text is the buffer itself),
+#   - page numbers and x1 / y1 / x2 / y2 as typed `array` columns
+#     (float32 for the box, compatible with numpy.frombuffer).
+# Lines are in page order, so a page is a contiguous slice found by
+# bisection. OCRChunk models / JSON dicts are only built at the API
+# edge (to_chunks / to_dicts) for the rows actually returned.
+#
+# When the OCR response has them, a LineLayout rides along with the
+# line table: a word table, a paragraph table, and per-line links
+# (word row range, paragraph row) precomputed by ocr_layout.
+# ---------------------------------------------------------
+
+import base64
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .schemas import OCRChunk
+
+BBox = Tuple[float, float, float, float]
+
+# float32 columns; round on the way out so 1.2 doesn't come back as 1.2000000476837158
+_BBOX_DIGITS = 4
+
+
+PageSizes = Dict[int, Tuple[float, float]]
+
+_COLUMNS = (("offsets", "q"), ("pages", "I"), ("x1", "f"), ("y1", "f"), ("x2", "f"), ("y2", "f"))
+
+
+def _encode(column: array) -> str:
+    return base64.b64encode(column.tobytes()).decode("ascii")
+
+
+def _decode(typecode: str, data: str) -> array:
+    column = array(typecode)
+    column.frombytes(base64.b64decode(data))
+    return column
+
+
+class ChunkTable:
+    __slots__ = ("doc_id", "doc_name", "buffer", "offsets", "pages", "x1", "y1", "x2", "y2", "layout")
+
+    def __init__(self, doc_id: str, doc_name: str, buffer: str, offsets: array, pages: array,
+                 x1: array, y1: array, x2: array, y2: array, layout: Optional["LineLayout"] = None):
+        self.doc_id = doc_id
+        self.doc_name = doc_name
+        self.buffer = buffer    # line texts joined with "\n"
+        # 'q', len n+1: line i is buffer[offsets[i]:offsets[i+1] - 1] (the -1 drops the "\n")
+        self.offsets = offsets
+        self.pages = pages      # 'I', 1-based page per line, non-decreasing
+        self.x1 = x1            # 'f' (float32) bbox columns
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+        self.layout = layout
+
+    # ---------------- construction ----------------
+    @classmethod
+    def from_columns(cls, doc_id: str, doc_name: str, texts: List[str], pages: Iterable[int],
+                     x1: Iterable[float], y1: Iterable[float], x2: Iterable[float], y2: Iterable[float]) -> "ChunkTable":
+        """Build from parallel columns (e.g. numpy arrays), rows already in page order."""
+        buffer = "\n".join(texts)
+        if buffer.count("\n") != max(len(texts) - 1, 0):
+            texts = [t.replace("\n", " ") for t in texts]
+            buffer = "\n".join(texts)
+        offsets = array("q", accumulate((len(t) + 1 for t in texts), initial=0))
+        return cls(
+            doc_id, doc_name, buffer, offsets, array("I", pages),
+            array("f", x1), array("f", y1), array("f", x2), array("f", y2),
+        )
+
+    @classmethod
+    def from_lines(cls, doc_id: str, doc_name: str, lines: Iterable[Tuple[int, str, Sequence[float]]]) -> "ChunkTable":
+        """Build from (page, text, bbox) rows already in page order."""
+        texts: List[str] = []
+        offsets = array("q", [0])
+        pages = array("I")
+        x1, y1, x2, y2 = array("f"), array("f"), array("f"), array("f")
+        pos = 0
+        for page, text, bbox in lines:
+            # a newline inside a line would break the buffer layout
+            text = text.replace("\n", " ")
+            texts.append(text)
+            pos += len(text) + 1
+            offsets.append(pos)
+            pages.append(page)
+            x1.append(bbox[0])
+            y1.append(bbox[1])
+            x2.append(bbox[2])
+            y2.append(bbox[3])
+        buffer = "\n".join(texts)
+        return cls(doc_id, doc_name, buffer, offsets, pages, x1, y1, x2, y2)
+
+    @classmethod
+    def from_chunks(cls, chunks: List[OCRChunk]) -> "ChunkTable":
+        doc_id = chunks[0].doc_id if chunks else ""
+        doc_name = chunks[0].doc_name if chunks else ""
+        return cls.from_lines(doc_id, doc_name, ((c.page, c.text, c.bbox) for c in chunks))
+
+    def with_doc(self, doc_id: str, doc_name: str) -> "ChunkTable":
+        """Same lines under another doc_id / doc_name; the columns are shared, not copied."""
+        layout = self.layout.with_doc(doc_id, doc_name) if self.layout is not None else None
+        return ChunkTable(doc_id, doc_name, self.buffer, self.offsets, self.pages,
+                          self.x1, self.y1, self.x2, self.y2, layout)
+
+    # ---------------- row access ----------------
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def text(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def page(self, i: int) -> int:
+        return self.pages[i]
+
+    def bbox(self, i: int) -> BBox:
+        return (
+            round(self.x1[i], _BBOX_DIGITS),
+            round(self.y1[i], _BBOX_DIGITS),
+            round(self.x2[i], _BBOX_DIGITS),
+            round(self.y2[i], _BBOX_DIGITS),
+        )
+
+    def texts(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        end = len(self) if end is None else end
+        if start >= end:
+            return []
+        # one slice + split instead of a slice per line
+        return self.buffer[self.offsets[start]:self.offsets[end] - 1].split("\n")
+
+    def text_range(self, start: int, end: int) -> str:
+        """Lines start..end-1 joined with "\n" – a single slice of the buffer."""
+        if start >= end:
+            return ""
+        return self.buffer[self.offsets[start]:self.offsets[end] - 1]
+
+    def full_text(self) -> str:
+        return self.buffer
+
+    def union_bbox(self, start: int, end: int) -> BBox:
+        return (
+            round(min(self.x1[start:end]), _BBOX_DIGITS),
+            round(min(self.y1[start:end]), _BBOX_DIGITS),
+            round(max(self.x2[start:end]), _BBOX_DIGITS),
+            round(max(self.y2[start:end]), _BBOX_DIGITS),
+        )
+
+    def page_range(self, page: int) -> Tuple[int, int]:
+        """[start, end) row range of `page` (empty if it has no lines)."""
+        return bisect_left(self.pages, page), bisect_right(self.pages, page)
+
+    def normalized_bbox(self, i: int, page_sizes: PageSizes) -> BBox:
+        return normalize_bbox(self.bbox(i), page_sizes.get(self.pages[i]))
+
+    def iter_lines(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str, BBox]]:
+        end = len(self) if end is None else end
+        for i, text in enumerate(self.texts(start, end), start):
+            yield self.pages[i], text, self.bbox(i)
+
+    # ---------------- API edge ----------------
+    def to_dicts(self, start: int = 0, end: Optional[int] = None,
+                 page_sizes: Optional[PageSizes] = None) -> List[Dict[str, Any]]:
+        """OCRChunk-shaped dicts for JSON responses, without pydantic.
+
+        With `page_sizes` ({page: (width, height)}) boxes are normalized to 0–1
+        page coordinates. Line tables with a layout also carry their word row
+        range and paragraph row.
+        """
+        doc_id, doc_name = self.doc_id, self.doc_name
+        end = len(self) if end is None else end
+        rows = []
+        for i, (page, text, bbox) in enumerate(self.iter_lines(start, end), start):
+            if page_sizes is not None:
+                bbox = normalize_bbox(bbox, page_sizes.get(page))
+            rows.append({"doc_id": doc_id, "doc_name": doc_name, "page": page, "text": text, "bbox": bbox})
+        if self.layout is not None:
+            self.layout.annotate(rows, start)
+        return rows
+
+    def to_chunks(self, start: int = 0, end: Optional[int] = None) -> List[OCRChunk]:
+        doc_id, doc_name = self.doc_id, self.doc_name
+        return [
+            OCRChunk.model_construct(doc_id=doc_id, doc_name=doc_name, page=page, text=text, bbox=bbox)
+            for page, text, bbox in self.iter_lines(start, end)
+        ]
+
+    # ---------------- persistence ----------------
+    def nbytes(self) -> int:
+        size = len(self.buffer) + sum(getattr(self, name).itemsize * len(getattr(self, name)) for name, _ in _COLUMNS)
+        if self.layout is not None:
+            size += self.layout.nbytes()
+        return size
+
+    def to_payload(self, with_doc: bool = True) -> Dict[str, Any]:
+        """JSON-safe dict; the numeric columns travel as base64 of their raw bytes."""
+        payload: Dict[str, Any] = {"buffer": self.buffer}
+        for name, _ in _COLUMNS:
+            payload[name] = _encode(getattr(self, name))
+        if with_doc:
+            payload["doc_id"] = self.doc_id
+            payload["doc_name"] = self.doc_name
+        if self.layout is not None:
+            payload["layout"] = self.layout.to_payload()
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], doc_id: Optional[str] = None,
+                     doc_name: Optional[str] = None) -> "ChunkTable":
+        columns = {name: _decode(typecode, payload[name]) for name, typecode in _COLUMNS}
+        table = cls(
+            doc_id if doc_id is not None else payload.get("doc_id", ""),
+            doc_name if doc_name is not None else payload.get("doc_name", ""),
+            payload["buffer"],
+            **columns,
+        )
+        if payload.get("layout"):
+            table.layout = LineLayout.from_payload(payload["layout"], table.doc_id, table.doc_name)
+        return table
+
+
+def normalize_bbox(bbox: BBox, size: Optional[Tuple[float, float]]) -> BBox:
+    """Page units → 0–1 page coordinates (unchanged if the page size is unknown)."""
+    if not size or not size[0] or not size[1]:
+        return bbox
+    w, h = size
+    return (round(bbox[0] / w, 6), round(bbox[1] / h, 6), round(bbox[2] / w, 6), round(bbox[3] / h, 6))
+
+
+class LineLayout:
+    """Word / paragraph groupings for the lines of a ChunkTable.
+
+    words / paragraphs are ChunkTables of their own (page order); line i
+    spans word rows line_word_start[i]:line_word_end[i] and belongs to
+    paragraph row line_paragraph[i] (-1 if none).
+    """
+
+    __slots__ = ("words", "paragraphs", "paragraph_roles", "line_word_start", "line_word_end", "line_paragraph")
+
+    def __init__(self, words: ChunkTable, paragraphs: ChunkTable, paragraph_roles: List[Optional[str]],
+                 line_word_start: array, line_word_end: array, line_paragraph: array):
+        self.words = words
+        self.paragraphs = paragraphs
+        self.paragraph_roles = paragraph_roles
+        self.line_word_start = line_word_start  # 'q'
+        self.line_word_end = line_word_end      # 'q'
+        self.line_paragraph = line_paragraph    # 'q', -1 = no paragraph
+
+    def with_doc(self, doc_id: str, doc_name: str) -> "LineLayout":
+        return LineLayout(
+            self.words.with_doc(doc_id, doc_name), self.paragraphs.with_doc(doc_id, doc_name),
+            self.paragraph_roles, self.line_word_start, self.line_word_end, self.line_paragraph,
+        )
+
+    def annotate(self, rows: List[Dict[str, Any]], start: int) -> None:
+        for i, row in enumerate(rows, start):
+            paragraph = self.line_paragraph[i]
+            row["paragraph"] = paragraph if paragraph >= 0 else None
+            row["words"] = (self.line_word_start[i], self.line_word_end[i])
+
+    def nbytes(self) -> int:
+        links = (self.line_word_start, self.line_word_end, self.line_paragraph)
+        return self.words.nbytes() + self.paragraphs.nbytes() + sum(c.itemsize * len(c) for c in links)
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "words": self.words.to_payload(with_doc=False),
+            "paragraphs": self.paragraphs.to_payload(with_doc=False),
+            "paragraph_roles": self.paragraph_roles,
+            "line_word_start": _encode(self.line_word_start),
+            "line_word_end": _encode(self.line_word_end),
+            "line_paragraph": _encode(self.line_paragraph),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], doc_id: str, doc_name: str) -> "LineLayout":
+        return cls(
+            ChunkTable.from_payload(payload["words"], doc_id, doc_name),
+            ChunkTable.from_payload(payload["paragraphs"], doc_id, doc_name),
+            payload["paragraph_roles"],
+            _decode("q", payload["line_word_start"]),
+            _decode("q", payload["line_word_end"]),
+            _decode("q", payload["line_paragraph"]),
+        )
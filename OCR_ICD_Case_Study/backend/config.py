@@ -1,3 +1,4 @@
+import logging
 import os
 from dotenv import load_dotenv, find_dotenv
 
@@ -7,11 +8,69 @@ load_dotenv(find_dotenv(), override=True)
 # --- Azure OCR ---
 AZURE_OCR_ENDPOINT = os.getenv("AZURE_OCR_ENDPOINT", "").rstrip("/")
 AZURE_OCR_KEY = os.getenv("AZURE_OCR_KEY", "")
+# Overall deadline for one analyze job (submit + polling), in seconds
+AZURE_OCR_TIMEOUT_S = float(os.getenv("AZURE_OCR_TIMEOUT_S", "60"))
+# Max OCR jobs in flight against Azure at once (per worker process)
+AZURE_OCR_MAX_CONCURRENCY = int(os.getenv("AZURE_OCR_MAX_CONCURRENCY", "8"))
+# Poll backoff bounds when Azure does not send Retry-After
+AZURE_OCR_POLL_INITIAL_S = float(os.getenv("AZURE_OCR_POLL_INITIAL_S", "0.5"))
+AZURE_OCR_POLL_MAX_S = float(os.getenv("AZURE_OCR_POLL_MAX_S", "5"))
+
+# --- Background OCR jobs ---
+# Number of concurrent upload workers (OCR + chunk build + store; previews render lazily per page)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "4"))
+# Max queued uploads before /upload starts answering 503
+OCR_QUEUE_MAX = int(os.getenv("OCR_QUEUE_MAX", "1000"))
+# How many finished job records /jobs/{doc_id} keeps around
+OCR_JOB_HISTORY = int(os.getenv("OCR_JOB_HISTORY", "10000"))
+
+# --- Uploads (streamed to a spooled temp file; larger bodies get 413) ---
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# bytes kept in RAM before the spool rolls over to disk
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_KB", "1024")) * 1024
+
+# --- Batch ingestion (POST /upload/batch and `python -m backend.ingest`) ---
+# Documents processed concurrently (OCR + ICD extraction + grounding)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", ".cache/batches")
+
+# --- OCR result cache (keyed by SHA-256 of the uploaded bytes) ---
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "256"))
+# SQLite file backing the in-memory LRU; empty disables the disk tier
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", ".cache/ocr_cache.sqlite3")
+
+# --- Document store (OCR chunks + previews per doc_id) ---
+# "memory" (per-process LRU) or "sqlite" (shared by all uvicorn workers)
+DOC_STORE_BACKEND = os.getenv("DOC_STORE_BACKEND", "memory").lower()
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", ".cache/doc_store.sqlite3")
+# Approximate resident byte budget for the memory backend
+DOC_STORE_MAX_BYTES = int(os.getenv("DOC_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Documents expire this many seconds after their last write (0 = never)
+DOC_STORE_TTL_S = float(os.getenv("DOC_STORE_TTL_S", str(24 * 3600)))
+
+# --- Page previews (rendered lazily per page, cached in the doc store) ---
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "JPEG").upper()  # JPEG | WEBP | PNG
+PREVIEW_MAX_WIDTH = int(os.getenv("PREVIEW_MAX_WIDTH", "1200"))
+PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", "80"))
 
 # --- OpenAI ---
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# OPENAI_BASE_URL / LLM_MAX_CONCURRENCY / LLM_TIMEOUT_S / LLM_MAX_RETRIES
+# are read by llm_gateway.get_gateway()
+
+# --- ICD extraction over long documents ---
+# single = whole text in one call, chunked = map-reduce over windows,
+# auto = chunked only when the text does not fit in one window
+ICD_EXTRACTION_MODE = os.getenv("ICD_EXTRACTION_MODE", "auto").lower()
+ICD_WINDOW_TOKENS = int(os.getenv("ICD_WINDOW_TOKENS", "3000"))
+ICD_WINDOW_OVERLAP_LINES = int(os.getenv("ICD_WINDOW_OVERLAP_LINES", "3"))
+ICD_MAX_CONCURRENCY = int(os.getenv("ICD_MAX_CONCURRENCY", "4"))
+
+# --- ICD extraction cache (per doc_id + text/model/prompt hash) ---
+ICD_CACHE_MAX_ENTRIES = int(os.getenv("ICD_CACHE_MAX_ENTRIES", "1024"))
+ICD_CACHE_TTL_S = float(os.getenv("ICD_CACHE_TTL_S", "3600"))
 
 # --- Supabase / PGVector ---
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
@@ -21,9 +80,17 @@ USE_MOCK_OCR = os.getenv("USE_MOCK_OCR", "true").lower() == "true"
 USE_MOCK_LLM = os.getenv("USE_MOCK_LLM", "false").lower() == "true"
 USE_PG_VECTOR = os.getenv("USE_PG_VECTOR", "false").lower() == "true"
 
-# --- Debug printout ---
-print(f"[CONFIG] Loaded .env from: {find_dotenv()}")
-print(f"[CONFIG] AZURE_OCR_ENDPOINT = {AZURE_OCR_ENDPOINT}")
-print(f"[CONFIG] USE_MOCK_OCR = {USE_MOCK_OCR}")
-print(f"[CONFIG] USE_MOCK_LLM = {USE_MOCK_LLM}")
-print(f"[CONFIG] USE_PG_VECTOR = {USE_PG_VECTOR}")
+# --- Logging / metrics ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of OCR jobs whose per-line text/bbox dump is logged at DEBUG.
+# The dump contains document text (PHI): keep at 0 outside local debugging.
+OCR_DEBUG_SAMPLE_RATE = float(os.getenv("OCR_DEBUG_SAMPLE_RATE", "0"))
+# Emit OpenTelemetry spans for pipeline stages (needs opentelemetry-api + an SDK/exporter)
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+logger.info("Loaded .env from: %s", find_dotenv() or "(none)")
+logger.info(
+    "AZURE_OCR_ENDPOINT=%s USE_MOCK_OCR=%s USE_MOCK_LLM=%s USE_PG_VECTOR=%s",
+    AZURE_OCR_ENDPOINT, USE_MOCK_OCR, USE_MOCK_LLM, USE_PG_VECTOR,
+)
@@ -0,0 +1,256 @@
+# doc_store.py
+# ---------------------------------------------------------
+# Pluggable storage for uploaded documents.
+#
+# A document record is a plain dict:
+#     {"doc_name", "table": ChunkTable, "pages": List[PageInfo]}
+#
+# The table's lines are in page order; pages[i].line_count says how
+# many belong to each page.
+#
+# Binary payloads (the original upload, rendered page previews) are
+# stored next to it as named blobs and live / die with the document.
+#
+# Backends:
+#   - MemoryDocumentStore: per-process LRU with a byte budget + TTL
+#   - SQLiteDocumentStore: one file on disk, shared by every uvicorn
+#     worker on the host, so any worker can serve any doc_id
+# ---------------------------------------------------------
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .schemas import PageInfo
+from .chunk_table import ChunkTable
+from .config import DOC_STORE_BACKEND, DOC_STORE_PATH, DOC_STORE_MAX_BYTES, DOC_STORE_TTL_S
+
+# rough overhead of the record dict + PageInfo models
+_RECORD_OVERHEAD_BYTES = 1024
+_PAGE_OVERHEAD_BYTES = 300
+
+
+def estimate_size(doc: Dict[str, Any]) -> int:
+    """Approximate resident size of a document record, in bytes."""
+    size = _RECORD_OVERHEAD_BYTES + _PAGE_OVERHEAD_BYTES * len(doc.get("pages", []))
+    table = doc.get("table")
+    if table is not None:
+        size += table.nbytes()
+    return size
+
+
+class DocumentStore:
+    """Interface every backend implements."""
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, doc_id: str, doc: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete(self, doc_id: str) -> None:
+        raise NotImplementedError
+
+    def put_blob(self, doc_id: str, name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def get_blob(self, doc_id: str, name: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def __contains__(self, doc_id: str) -> bool:
+        return self.get(doc_id) is not None
+
+
+class MemoryDocumentStore(DocumentStore):
+    def __init__(self, max_bytes: int, ttl_s: float = 0):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        # doc_id -> (doc, size, expires_at)
+        self._docs: "OrderedDict[str, Tuple[Dict[str, Any], int, float]]" = OrderedDict()
+        self._blobs: Dict[str, Dict[str, bytes]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._docs.get(doc_id)
+            if item is None:
+                return None
+            doc, _, expires_at = item
+            if expires_at and expires_at < time.time():
+                self._pop(doc_id)
+                return None
+            self._docs.move_to_end(doc_id)
+            return doc
+
+    def put(self, doc_id: str, doc: Dict[str, Any]) -> None:
+        size = estimate_size(doc)
+        expires_at = time.time() + self.ttl_s if self.ttl_s else 0.0
+        with self._lock:
+            if doc_id in self._docs:
+                self._pop(doc_id)
+            self._docs[doc_id] = (doc, size, expires_at)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, doc_id: str) -> None:
+        with self._lock:
+            if doc_id in self._docs:
+                self._pop(doc_id)
+
+    def put_blob(self, doc_id: str, name: str, data: bytes) -> None:
+        if not isinstance(data, bytes):
+            data = bytes(data)  # own a copy; callers may pass a short-lived memoryview
+        with self._lock:
+            if doc_id not in self._docs:
+                return
+            blobs = self._blobs.setdefault(doc_id, {})
+            self._bytes += len(data) - len(blobs.get(name, b""))
+            blobs[name] = data
+            self._docs.move_to_end(doc_id)
+            self._evict()
+
+    def get_blob(self, doc_id: str, name: str) -> Optional[bytes]:
+        with self._lock:
+            return self._blobs.get(doc_id, {}).get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "documents": len(self._docs),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def _pop(self, doc_id: str) -> None:
+        _, size, _ = self._docs.pop(doc_id)
+        self._bytes -= size
+        for data in self._blobs.pop(doc_id, {}).values():
+            self._bytes -= len(data)
+
+    def _evict(self) -> None:
+        # least recently used first, but never the document just touched
+        while self._bytes > self.max_bytes and len(self._docs) > 1:
+            oldest = next(iter(self._docs))
+            self._pop(oldest)
+            self.evictions += 1
+
+
+class SQLiteDocumentStore(DocumentStore):
+    def __init__(self, path: str, ttl_s: float = 0):
+        self.path = path
+        self.ttl_s = ttl_s
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        db = self._conn()
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                doc_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (doc_id, name)
+            )
+            """
+        )
+        db.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets several worker processes read concurrently
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT payload, expires_at FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if not row:
+            return None
+        payload, expires_at = row
+        if expires_at and expires_at < time.time():
+            self.delete(doc_id)
+            return None
+        doc = json.loads(payload)
+        doc["table"] = ChunkTable.from_payload(doc["table"], doc_id=doc_id, doc_name=doc["doc_name"])
+        doc["pages"] = [PageInfo(**p) for p in doc["pages"]]
+        return doc
+
+    def put(self, doc_id: str, doc: Dict[str, Any]) -> None:
+        payload = dict(doc)
+        payload["table"] = doc["table"].to_payload(with_doc=False)
+        payload["pages"] = [p.model_dump() for p in doc["pages"]]
+        expires_at = time.time() + self.ttl_s if self.ttl_s else 0.0
+        db = self._conn()
+        db.execute(
+            "INSERT OR REPLACE INTO documents (doc_id, payload, expires_at) VALUES (?, ?, ?)",
+            (doc_id, json.dumps(payload), expires_at),
+        )
+        # opportunistic cleanup keeps the file from growing forever
+        now = time.time()
+        db.execute(
+            "DELETE FROM blobs WHERE doc_id IN "
+            "(SELECT doc_id FROM documents WHERE expires_at > 0 AND expires_at < ?)",
+            (now,),
+        )
+        db.execute("DELETE FROM documents WHERE expires_at > 0 AND expires_at < ?", (now,))
+        db.commit()
+
+    def delete(self, doc_id: str) -> None:
+        db = self._conn()
+        db.execute("DELETE FROM blobs WHERE doc_id = ?", (doc_id,))
+        db.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        db.commit()
+
+    def put_blob(self, doc_id: str, name: str, data: bytes) -> None:
+        db = self._conn()
+        db.execute(
+            "INSERT OR REPLACE INTO blobs (doc_id, name, data) VALUES (?, ?, ?)",
+            (doc_id, name, sqlite3.Binary(data)),
+        )
+        db.commit()
+
+    def get_blob(self, doc_id: str, name: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT data FROM blobs WHERE doc_id = ? AND name = ?", (doc_id, name)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        (count,) = self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()
+        return {
+            "backend": "sqlite",
+            "documents": count,
+            "path": self.path,
+            "bytes_on_disk": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+def make_doc_store() -> DocumentStore:
+    if DOC_STORE_BACKEND == "sqlite":
+        return SQLiteDocumentStore(DOC_STORE_PATH, ttl_s=DOC_STORE_TTL_S)
+    if DOC_STORE_BACKEND == "memory":
+        return MemoryDocumentStore(DOC_STORE_MAX_BYTES, ttl_s=DOC_STORE_TTL_S)
+    raise ValueError(f"Unknown DOC_STORE_BACKEND: {DOC_STORE_BACKEND!r}")
@@ -0,0 +1,88 @@
+# icd_cache.py
+# ---------------------------------------------------------
+# Memoized ICD extraction.
+#
+# /extract-icd and /view-report both need the ICDs of the same
+# document, and the frontend calls them back to back. Results are
+# cached per (doc_id, text, model, prompt) with LRU + TTL eviction,
+# and concurrent requests for the same key share one in-flight LLM
+# call (single-flight) instead of each starting their own.
+# ---------------------------------------------------------
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from .schemas import ICDItem
+from .config import ICD_CACHE_MAX_ENTRIES, ICD_CACHE_TTL_S
+
+
+def extraction_key(doc_id: str, text: str, model: str, prompt: str) -> str:
+    h = hashlib.sha256()
+    for part in (text, model, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return f"{doc_id}:{h.hexdigest()}"
+
+
+class ICDCache:
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        # key -> (expires_at, items)
+        self._entries: "OrderedDict[str, Tuple[float, List[ICDItem]]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[List[ICDItem]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[List[ICDItem]]]
+    ) -> List[ICDItem]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, items = entry
+            if not self.ttl_s or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return items
+            del self._entries[key]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            # shield: one waiter disconnecting must not cancel the shared call
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.ensure_future(compute())
+        self._inflight[key] = future
+        try:
+            items = await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(key, None)
+            else:
+                future.add_done_callback(lambda _f: self._inflight.pop(key, None))
+
+        self._entries[key] = (time.monotonic() + self.ttl_s, items)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return items
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+
+ICD_CACHE = ICDCache(max_entries=ICD_CACHE_MAX_ENTRIES, ttl_s=ICD_CACHE_TTL_S)
@@ -0,0 +1,55 @@
+"""
+Bulk ingester: OCR → ICD extraction → grounding for a whole archive of charts.
+
+Inputs may be files, directories (walked recursively) or .zip archives.
+Results are appended to JSONL (one line per document) or, with a
+.parquet output path and pyarrow installed, Parquet (one row per
+grounded ICD location). From OCR_ICD_Case_Study/:
+
+    python -m backend.ingest charts/ more_charts.zip --out results.jsonl --concurrency 16
+"""
+
+import argparse
+import asyncio
+import sys
+
+from .config import BATCH_CONCURRENCY
+from .llm_gateway import get_gateway
+from .ocr_client import close_http_client
+from .pipeline import PipelineStats, iter_sources, make_writer, run_pipeline
+
+
+async def main(inputs, out: str, concurrency: int, progress_every: int) -> PipelineStats:
+    stats = PipelineStats()
+
+    def on_result(result) -> None:
+        done = stats.succeeded + stats.failed
+        if result["status"] != "succeeded":
+            print(f"failed: {result['doc_name']}: {result.get('error')}", file=sys.stderr)
+        if progress_every and done % progress_every == 0:
+            s = stats.as_dict()
+            print(f"{done} docs ({s['failed']} failed) in {s['elapsed_s']:.0f}s, {s['docs_per_s']:.2f} docs/s",
+                  file=sys.stderr)
+
+    try:
+        await run_pipeline(iter_sources(inputs), make_writer(out), concurrency, stats=stats, on_result=on_result)
+    finally:
+        await close_http_client()
+        await get_gateway().aclose()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="files, directories or .zip archives")
+    parser.add_argument("--out", default="results.jsonl", help=".jsonl or .parquet")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--progress-every", type=int, default=100)
+    args = parser.parse_args()
+
+    final = asyncio.run(main(args.inputs, args.out, args.concurrency, args.progress_every)).as_dict()
+    print(
+        f"done: {final['succeeded']} succeeded, {final['failed']} failed "
+        f"in {final['elapsed_s']:.1f}s ({final['docs_per_s']:.2f} docs/s) → {args.out}"
+    )
+    sys.exit(1 if final["failed"] else 0)
@@ -0,0 +1,114 @@
+# jobs.py
+# ---------------------------------------------------------
+# Background job queue for uploads.
+#
+# /upload only enqueues; a fixed pool of worker tasks drains the
+# queue and runs OCR + chunk building and stores the result and the
+# original file. Page previews are not rendered here: the page
+# endpoint renders them lazily on first request. OCR itself is async
+# I/O, the blocking steps (document store writes) are pushed to a
+# thread pool of the same size, so the pool size bounds both.
+# ---------------------------------------------------------
+
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .schemas import JobStatus
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+JobHandler = Callable[..., Awaitable[None]]
+
+
+class JobQueue:
+    def __init__(self, handler: JobHandler, workers: int, max_queued: int, history: int):
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._max_queued = max_queued
+        self._history = history
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, JobStatus]" = OrderedDict()
+        self.executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="ocr-job")
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self._max_queued)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ocr-worker-{i}")
+            for i in range(self._workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.executor.shutdown(wait=False)
+
+    def submit(self, doc_id: str, doc_name: str, *args: Any) -> JobStatus:
+        """Enqueue a job; raises QueueFullError instead of blocking the caller."""
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() has not been called")
+        job = JobStatus(doc_id=doc_id, doc_name=doc_name, status="queued", submitted_at=time.time())
+        try:
+            self._queue.put_nowait((job, args))
+        except asyncio.QueueFull:
+            raise QueueFullError("Upload queue is full, retry later")
+        self._jobs[doc_id] = job
+        self._trim_history()
+        return job
+
+    def get(self, doc_id: str) -> Optional[JobStatus]:
+        return self._jobs.get(doc_id)
+
+    async def run_in_thread(self, fn: Callable, *args: Any):
+        """Run CPU-bound work on the job pool instead of the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        counts["workers"] = self._workers
+        return counts
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job, args = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            job.queue_wait_s = job.started_at - job.submitted_at
+            try:
+                await self._handler(job.doc_id, job.doc_name, *args)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "cancelled"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.run_s = job.finished_at - job.started_at
+                self._queue.task_done()
+
+    def _trim_history(self) -> None:
+        # Drop the oldest *finished* jobs; queued/running ones are never evicted.
+        if len(self._jobs) <= self._history:
+            return
+        for doc_id in list(self._jobs):
+            if len(self._jobs) <= self._history:
+                break
+            if self._jobs[doc_id].status in ("succeeded", "failed"):
+                del self._jobs[doc_id]
@@ -1,14 +1,37 @@
-
+import asyncio
 import json
-from typing import List
+from typing import Dict, List, Tuple
 
 from .schemas import ICDItem
-from .config import OPENAI_API_KEY, LLM_MODEL, USE_MOCK_LLM
+from .chunk_table import ChunkTable
+from .llm_gateway import get_gateway
+from .config import (
+    LLM_MODEL,
+    USE_MOCK_LLM,
+    ICD_EXTRACTION_MODE,
+    ICD_WINDOW_TOKENS,
+    ICD_WINDOW_OVERLAP_LINES,
+    ICD_MAX_CONCURRENCY,
+)
+
+
+SYSTEM_PROMPT = (
+    "You are a medical coding assistant. "
+    "Given clinical text, extract ICD-10 codes with their description and the exact supporting sentence. "
+    "Return a JSON object with key 'icds' as a list, where each item has: "
+    "icd_code, icd_description, supporting_sentence."
+)
+
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None  # type: ignore
+def _use_mock() -> bool:
+    return USE_MOCK_LLM or not get_gateway().configured
+
+
+def extraction_model() -> str:
+    """Name of whatever will answer extract_icd_with_llm (part of cache keys)."""
+    if _use_mock():
+        return "mock"
+    return LLM_MODEL
 
 
 def extract_icd_with_llm_mock(doc_text: str) -> List[ICDItem]:
@@ -27,36 +50,15 @@ def extract_icd_with_llm_mock(doc_text: str) -> List[ICDItem]:
     ]
 
 
-def extract_icd_with_llm(doc_text: str) -> List[ICDItem]:
-    """Real OpenAI call (JSON structured output) if configured, else mock.
-
-    Prompt: 'Extract ICD codes and exact supporting sentence.'
-    """
-    if USE_MOCK_LLM or not OPENAI_API_KEY or OpenAI is None:
-        return extract_icd_with_llm_mock(doc_text)
-
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    system_prompt = (
-        "You are a medical coding assistant. "
-        "Given clinical text, extract ICD-10 codes with their description and the exact supporting sentence. "
-        "Return a JSON object with key 'icds' as a list, where each item has: "
-        "icd_code, icd_description, supporting_sentence."
-    )
-
+def _messages(doc_text: str) -> List[Dict[str, str]]:
     user_prompt = f"Clinical text:\n\n{doc_text}\n\nReturn ONLY JSON."
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    resp = client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
 
-    content = resp.choices[0].message.content
+def _parse_icd_items(content: str) -> List[ICDItem]:
     data = json.loads(content)
 
     icds_raw = data.get("icds") or []
@@ -70,3 +72,114 @@ def extract_icd_with_llm(doc_text: str) -> List[ICDItem]:
             )
         )
     return icd_items
+
+
+async def extract_icd_with_llm(doc_text: str) -> List[ICDItem]:
+    """Real OpenAI call (JSON structured output) if configured, else mock.
+
+    Goes through the shared LLM gateway (pooled async client, concurrency
+    limit, retries), so it never blocks the event loop.
+
+    Prompt: 'Extract ICD codes and exact supporting sentence.'
+    """
+    if _use_mock():
+        return extract_icd_with_llm_mock(doc_text)
+
+    resp = await get_gateway().chat(
+        model=LLM_MODEL,
+        messages=_messages(doc_text),
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+    return _parse_icd_items(resp.choices[0].message.content)
+
+
+# --------------------------------------------------------------------
+# Map-reduce extraction for long documents
+# --------------------------------------------------------------------
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English clinical text; close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def split_into_windows(
+    table: ChunkTable, max_tokens: int, overlap_lines: int = 0
+) -> List[Tuple[int, int]]:
+    """Group consecutive OCR lines into [start, end) windows of at most `max_tokens`.
+
+    Each window repeats up to `overlap_lines` trailing lines of the previous
+    one, so a sentence broken across a window boundary is still seen whole.
+    The overlap never covers the whole previous window (every window starts
+    after the one before it) and is trimmed to what fits in the budget with
+    the next line. A single line longer than the budget gets a window of its own.
+    """
+    line_tokens = [estimate_tokens(t) for t in table.texts()]
+    windows: List[Tuple[int, int]] = []
+    start = 0
+    current_tokens = 0
+    fresh = 0  # lines in the window that are not overlap from the previous one
+
+    for i, tokens in enumerate(line_tokens):
+        if fresh and current_tokens + tokens > max_tokens:
+            windows.append((start, i))
+            overlap = min(overlap_lines, i - start - 1)
+            while overlap and sum(line_tokens[i - overlap:i]) + tokens > max_tokens:
+                overlap -= 1
+            start = i - overlap
+            current_tokens = sum(line_tokens[start:i])
+            fresh = 0
+        current_tokens += tokens
+        fresh += 1
+
+    if fresh:
+        windows.append((start, len(line_tokens)))
+    return windows
+
+
+def merge_icd_items(per_window: List[List[ICDItem]]) -> List[ICDItem]:
+    """Deduplicate by ICD code, keeping the first window's description/sentence."""
+    merged: Dict[str, ICDItem] = {}
+    for items in per_window:
+        for item in items:
+            code = item.icd_code.strip().upper()
+            if not code:
+                continue
+            seen = merged.get(code)
+            if seen is None:
+                merged[code] = item
+            elif not seen.supporting_sentence and item.supporting_sentence:
+                merged[code] = item
+    return list(merged.values())
+
+
+async def extract_icd_chunked(
+    table: ChunkTable,
+    max_tokens: int = ICD_WINDOW_TOKENS,
+    overlap_lines: int = ICD_WINDOW_OVERLAP_LINES,
+    concurrency: int = ICD_MAX_CONCURRENCY,
+) -> List[ICDItem]:
+    """Map: one LLM call per window, at most `concurrency` in flight.
+    Reduce: merge + dedupe by code."""
+    windows = split_into_windows(table, max_tokens, overlap_lines)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(start: int, end: int) -> List[ICDItem]:
+        async with semaphore:
+            return await extract_icd_with_llm(table.text_range(start, end))
+
+    per_window = await asyncio.gather(*(_one(s, e) for s, e in windows))
+    return merge_icd_items(per_window)
+
+
+def extraction_mode(table: ChunkTable) -> str:
+    if ICD_EXTRACTION_MODE in ("single", "chunked"):
+        return ICD_EXTRACTION_MODE
+    total = sum(estimate_tokens(t) for t in table.texts())
+    return "chunked" if total > ICD_WINDOW_TOKENS else "single"
+
+
+async def extract_icds_for_chunks(table: ChunkTable) -> List[ICDItem]:
+    """Entry point for the API: picks single-call or map-reduce extraction."""
+    if extraction_mode(table) == "chunked":
+        return await extract_icd_chunked(table)
+    return await extract_icd_with_llm(table.full_text())
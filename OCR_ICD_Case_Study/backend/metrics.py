@@ -0,0 +1,157 @@
+# metrics.py
+# ---------------------------------------------------------
+# Per-stage latency metrics, Prometheus text exposition, optional
+# OpenTelemetry spans.
+#
+#   with stage("ocr_submit"):
+#       ...
+#
+# records the wall time of the block into the
+# ocr_icd_stage_seconds{stage=...} histogram (and a failure counter
+# when it raises), and, with OTEL_ENABLED and opentelemetry
+# installed, wraps it in a span of the same name.
+#
+# Stages: upload_read, ocr_submit, ocr_poll_wait, chunk_build,
+# preview_render, llm_extract, grounding.
+#
+# Metrics are per process; with several uvicorn workers each one
+# serves its own /metrics (scrape them all or use one worker per pod).
+# ---------------------------------------------------------
+
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import OCR_DEBUG_SAMPLE_RATE, OTEL_ENABLED
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None  # type: ignore
+
+PREFIX = "ocr_icd"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Labels, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {k: (list(c), s, n) for k, (c, s, n) in self._values.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', repr(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {n}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(f"{PREFIX}_stage_seconds", "Wall time of one pipeline stage.")
+STAGE_FAILURES = Counter(f"{PREFIX}_stage_failures_total", "Pipeline stages that raised.")
+HTTP_SECONDS = Histogram(f"{PREFIX}_http_request_seconds", "HTTP request latency by route.")
+
+_METRICS = [STAGE_SECONDS, STAGE_FAILURES, HTTP_SECONDS]
+
+# name -> (help, callable returning {labels dict as tuple: value}); read at scrape time
+_GAUGES: Dict[str, Tuple[str, Callable[[], Dict[Labels, float]]]] = {}
+
+_tracer = trace.get_tracer(PREFIX) if (trace is not None and OTEL_ENABLED) else None
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[None]:
+    """Time a pipeline stage (works around `await`s inside the block)."""
+    span = _tracer.start_as_current_span(name, attributes=attributes or None) if _tracer else nullcontext()
+    started = time.perf_counter()
+    with span:
+        try:
+            yield
+        except BaseException:
+            STAGE_FAILURES.inc(stage=name)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def register_gauges(name: str, help: str, collect: Callable[[], Dict[Labels, float]]) -> None:
+    """Expose values computed at scrape time (queue depth, cache hit counts, ...)."""
+    _GAUGES[f"{PREFIX}_{name}"] = (help, collect)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for name, (help, collect) in sorted(_GAUGES.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_fmt_labels(k)} {float(v)}" for k, v in sorted(values.items())]
+    return "\n".join(lines) + "\n"
+
+
+def debug_sampled() -> bool:
+    """True for OCR_DEBUG_SAMPLE_RATE of calls: gate for verbose (PHI-bearing) dumps."""
+    return OCR_DEBUG_SAMPLE_RATE > 0 and random.random() < OCR_DEBUG_SAMPLE_RATE
@@ -0,0 +1,113 @@
+# ocr_cache.py
+# ---------------------------------------------------------
+# Content-addressed cache for OCR results.
+#
+# Key  = SHA-256 of the uploaded bytes.
+# Value = page sizes + the document's ChunkTable, i.e. everything
+#         run_ocr returns except the per-upload doc_id / doc_name,
+#         which are swapped in on a hit (ChunkTable.with_doc).
+#
+# Two tiers: an in-memory LRU in front of an optional SQLite file,
+# so re-uploads survive restarts and are shared by uvicorn workers.
+# ---------------------------------------------------------
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .schemas import PageInfo
+from .chunk_table import ChunkTable
+from .config import OCR_CACHE_MAX_ENTRIES, OCR_CACHE_PATH
+
+
+def content_hash(content) -> str:
+    # bytes or any buffer (memoryview / mmap) – hashed without copying
+    return hashlib.sha256(content).hexdigest()
+
+
+class OCRCache:
+    def __init__(self, max_entries: int = 256, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results (sha256 TEXT PRIMARY KEY, payload TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str, doc_id: str, doc_name: str) -> Optional[Tuple[ChunkTable, List[PageInfo]]]:
+        """Return (table, pages) rehydrated for this upload, or None."""
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT payload FROM ocr_results WHERE sha256 = ?", (key,)
+                ).fetchone()
+                if row:
+                    entry = self._decode(json.loads(row[0]))
+                    self._remember(key, entry)
+                    self.hits += 1
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+
+        # columns are shared with the cached table, only doc_id / doc_name differ
+        return entry["table"].with_doc(doc_id, doc_name), [PageInfo(**p) for p in entry["pages"]]
+
+    def put(self, key: str, table: ChunkTable, pages: List[PageInfo]) -> None:
+        entry = {
+            "pages": [p.model_dump() for p in pages],
+            "table": table,
+        }
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                payload = {"pages": entry["pages"], "table": table.to_payload(with_doc=False)}
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_results (sha256, payload) VALUES (?, ?)",
+                    (key, json.dumps(payload)),
+                )
+                self._db.commit()
+
+    @staticmethod
+    def _decode(payload: dict) -> dict:
+        return {"pages": payload["pages"], "table": ChunkTable.from_payload(payload["table"])}
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "memory_entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "disk_enabled": self._db is not None,
+        }
+
+    def _remember(self, key: str, entry: dict) -> None:
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+
+OCR_CACHE = OCRCache(max_entries=OCR_CACHE_MAX_ENTRIES, path=OCR_CACHE_PATH or None)
@@ -1,9 +1,30 @@
+import asyncio
+import logging
 import time
-from typing import List, Tuple
-import requests
-from .schemas import OCRChunk
-from .config import AZURE_OCR_ENDPOINT, AZURE_OCR_KEY, USE_MOCK_OCR
-
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from .schemas import PageInfo
+from .chunk_table import ChunkTable
+from .ocr_layout import parse_analyze_result
+from .ocr_cache import OCR_CACHE, content_hash
+from .uploads import iter_chunks
+from .metrics import debug_sampled, stage
+from .config import (
+    AZURE_OCR_ENDPOINT,
+    AZURE_OCR_KEY,
+    AZURE_OCR_TIMEOUT_S,
+    AZURE_OCR_MAX_CONCURRENCY,
+    AZURE_OCR_POLL_INITIAL_S,
+    AZURE_OCR_POLL_MAX_S,
+    USE_MOCK_OCR,
+)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore
+
+logger = logging.getLogger(__name__)
 
 # def run_azure_ocr_mock(doc_id: str, doc_name: str):
 #     page_width, page_height = 800, 1000
@@ -21,99 +42,174 @@ from .config import AZURE_OCR_ENDPOINT, AZURE_OCR_KEY, USE_MOCK_OCR
 #     return chunks, page_width, page_height
 
 
-def run_azure_ocr_bytes(doc_id: str, doc_name: str, content: bytes):
-    """
-    Azure Document Intelligence Read API (v4.0)
-    Supports: PDF, JPG, PNG, TIFF
-    """
-
-    if not AZURE_OCR_ENDPOINT or not AZURE_OCR_KEY:
-        raise RuntimeError("Missing Azure config")
-
-    endpoint = AZURE_OCR_ENDPOINT.rstrip("/")
-    url = f"{endpoint}/formrecognizer/documentModels/prebuilt-read:analyze?api-version=2023-07-31"
-
-    headers = {
-        "Ocp-Apim-Subscription-Key": AZURE_OCR_KEY,
-        "Content-Type": "application/pdf"  # works for image or pdf
-    }
-
-    print("\n📤 Sending file to Azure PDF OCR...")
+# --------------------------------------------------------------------
+# Shared HTTP session
+# --------------------------------------------------------------------
+# One pooled client per process so every upload reuses keep-alive
+# connections to Azure instead of paying a TLS handshake per request.
+_http_client: Optional["httpx.AsyncClient"] = None
+_ocr_semaphore: Optional[asyncio.Semaphore] = None
 
-    response = requests.post(url, headers=headers, data=content)
 
-    if response.status_code != 202:
-        raise RuntimeError(f"Azure OCR submit failed ({response.status_code}): {response.text}")
+def get_http_client() -> "httpx.AsyncClient":
+    global _http_client
+    if httpx is None:
+        raise RuntimeError("httpx is required for Azure OCR (pip install httpx)")
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=AZURE_OCR_MAX_CONCURRENCY * 2,
+                max_keepalive_connections=AZURE_OCR_MAX_CONCURRENCY,
+            ),
+        )
+    return _http_client
 
-    operation_location = response.headers["Operation-Location"]
 
-    print("⏳ Waiting for OCR result...")
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
-    # Poll for result
-    for _ in range(30):
-        result_resp = requests.get(operation_location, headers={"Ocp-Apim-Subscription-Key": AZURE_OCR_KEY})
-        if result_resp.status_code == 200:
-            result_json = result_resp.json()
-            status = result_json.get("status")
-            if status == "succeeded":
-                break
-            if status == "failed":
-                raise RuntimeError("Azure OCR processing failed.")
-        time.sleep(1)
 
-    print("✅ Azure OCR completed!\n")
+def _get_semaphore() -> asyncio.Semaphore:
+    global _ocr_semaphore
+    if _ocr_semaphore is None:
+        _ocr_semaphore = asyncio.Semaphore(AZURE_OCR_MAX_CONCURRENCY)
+    return _ocr_semaphore
 
-    result = result_json["analyzeResult"]
-    pages = result.get("pages", [])
 
-    chunks = []
+def _retry_after_seconds(headers, default: float) -> float:
+    """Read Azure's Retry-After header (seconds); fall back to `default`."""
+    value = headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return default
 
-    print("========================")
-    print("🔍 OCR BOUNDING BOX DEBUG")
-    print("========================")
 
-    for page in pages:
-        page_number = page.get("pageNumber", 1)
-        width = page.get("width")
-        height = page.get("height")
+# uploaded bytes, or a zero-copy view of a spooled upload (uploads.upload_buffer)
+Content = Union[bytes, memoryview]
 
-        print(f"\n--- PAGE {page_number} ---")
-        print(f"Page Size = {width} x {height}")
 
-        for line in page.get("lines", []):
-            text = line.get("content", "")
-            polygon = line.get("polygon", [])
+async def _request_body(content: Content) -> AsyncIterator[bytes]:
+    # stream the view in 1 MB chunks instead of materializing one big bytes
+    for chunk in iter_chunks(memoryview(content)):
+        yield chunk
 
-            if polygon:
-                xs = [polygon[i] for i in range(0, len(polygon), 2)]
-                ys = [polygon[i] for i in range(1, len(polygon), 2)]
-                bbox = (min(xs), min(ys), max(xs), max(ys))
-            else:
-                bbox = (0, 0, width, height)
 
-            print(f"TEXT: {text}")
-            print(f"POLYGON: {polygon}")
-            print(f"BOUNDING BOX: {bbox}\n")
+# --------------------------------------------------------------------
+# Azure Read API
+# --------------------------------------------------------------------
+async def run_azure_ocr_bytes(doc_id: str, doc_name: str, content: Content):
+    """
+    Azure Document Intelligence Read API (v4.0)
+    Supports: PDF, JPG, PNG, TIFF
 
-            chunks.append(
-                OCRChunk(
-                    doc_id=doc_id,
-                    doc_name=doc_name,
-                    page=page_number,
-                    text=text,
-                    bbox=bbox,
-                )
-            )
+    Non-blocking: submit + polling run on the shared async client, so the
+    event loop keeps serving other requests while Azure works. Polling
+    honours Retry-After and otherwise backs off from
+    AZURE_OCR_POLL_INITIAL_S up to AZURE_OCR_POLL_MAX_S, and the whole job
+    is bounded by AZURE_OCR_TIMEOUT_S.
+    """
 
-    print("========================")
-    print("END OF BOUNDING BOX DEBUG")
-    print("========================\n")
+    if not AZURE_OCR_ENDPOINT or not AZURE_OCR_KEY:
+        raise RuntimeError("Missing Azure config")
 
-    return chunks, width, height
+    endpoint = AZURE_OCR_ENDPOINT.rstrip("/")
+    url = f"{endpoint}/formrecognizer/documentModels/prebuilt-read:analyze?api-version=2023-07-31"
 
+    headers = {
+        "Ocp-Apim-Subscription-Key": AZURE_OCR_KEY,
+        "Content-Type": "application/pdf",  # works for image or pdf
+        "Content-Length": str(len(content)),
+    }
 
-def run_ocr(doc_id: str, doc_name: str, content: bytes):
+    client = get_http_client()
+    deadline = time.monotonic() + AZURE_OCR_TIMEOUT_S
+
+    async with _get_semaphore():
+        logger.info("Submitting %s (%d bytes) to Azure OCR", doc_id, len(content))
+
+        # Submit (retry only on throttling)
+        with stage("ocr_submit"):
+            while True:
+                response = await client.post(url, headers=headers, content=_request_body(content))
+                if response.status_code != 429:
+                    break
+                await _sleep_until_deadline(_retry_after_seconds(response.headers, 1.0), deadline)
+
+        if response.status_code != 202:
+            raise RuntimeError(f"Azure OCR submit failed ({response.status_code}): {response.text}")
+
+        operation_location = response.headers["Operation-Location"]
+
+        # Poll for result
+        delay = _retry_after_seconds(response.headers, AZURE_OCR_POLL_INITIAL_S)
+        poll_headers = {"Ocp-Apim-Subscription-Key": AZURE_OCR_KEY}
+        polls = 0
+        with stage("ocr_poll_wait"):
+            while True:
+                await _sleep_until_deadline(delay, deadline)
+                result_resp = await client.get(operation_location, headers=poll_headers)
+                polls += 1
+                if result_resp.status_code == 200:
+                    result_json = result_resp.json()
+                    status = result_json.get("status")
+                    if status == "succeeded":
+                        break
+                    if status == "failed":
+                        raise RuntimeError("Azure OCR processing failed.")
+                elif result_resp.status_code != 429 and result_resp.status_code < 500:
+                    raise RuntimeError(
+                        f"Azure OCR poll failed ({result_resp.status_code}): {result_resp.text}"
+                    )
+                backoff = min(delay * 1.5, AZURE_OCR_POLL_MAX_S)
+                delay = _retry_after_seconds(result_resp.headers, backoff)
+
+    logger.info("Azure OCR completed for %s after %d polls", doc_id, polls)
+
+    with stage("chunk_build"):
+        return _chunks_from_analyze_result(doc_id, doc_name, result_json["analyzeResult"])
+
+
+async def _sleep_until_deadline(delay: float, deadline: float) -> None:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"Azure OCR did not finish within {AZURE_OCR_TIMEOUT_S:.0f}s")
+    await asyncio.sleep(min(delay, remaining))
+
+
+def _chunks_from_analyze_result(doc_id: str, doc_name: str, result: dict):
+    """Turn an Azure `analyzeResult` payload into a ChunkTable (in page order) + per-page sizes."""
+    table, page_infos = parse_analyze_result(doc_id, doc_name, result)
+    logger.debug("OCR %s: %d pages, %d lines", doc_id, len(page_infos), len(table))
+
+    # The per-line dump carries document text: only for a sampled fraction
+    # of jobs (OCR_DEBUG_SAMPLE_RATE), and only when DEBUG is enabled.
+    if logger.isEnabledFor(logging.DEBUG) and debug_sampled():
+        for info in page_infos:
+            logger.debug("OCR %s page %s size %s x %s", doc_id, info.page, info.width, info.height)
+            start, end = table.page_range(info.page)
+            for i, text in enumerate(table.texts(start, end), start):
+                logger.debug("OCR %s line %d bbox=%s text=%r", doc_id, i, table.bbox(i), text)
+
+    return table, page_infos
+
+
+async def run_ocr(doc_id: str, doc_name: str, content: Content) -> Tuple[ChunkTable, List[PageInfo]]:
     # if USE_MOCK_OCR:
     #     return run_azure_ocr_mock(doc_id, doc_name)
 
-    return run_azure_ocr_bytes(doc_id, doc_name, content)
+    # Identical bytes → identical OCR; serve re-uploads from the cache.
+    key = await asyncio.to_thread(content_hash, content)
+    cached = await asyncio.to_thread(OCR_CACHE.get, key, doc_id, doc_name)
+    if cached is not None:
+        return cached
+
+    chunks, pages = await run_azure_ocr_bytes(doc_id, doc_name, content)
+    await asyncio.to_thread(OCR_CACHE.put, key, chunks, pages)
+    return chunks, pages
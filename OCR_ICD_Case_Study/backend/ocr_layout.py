@@ -0,0 +1,210 @@
+# ocr_layout.py
+# ---------------------------------------------------------
+# Azure `analyzeResult` → ChunkTable (+ LineLayout), vectorized.
+#
+# Per page, every polygon → bbox reduction is one NumPy pass:
+# all polygons are flattened into a single (points, 2) array and
+# np.minimum / np.maximum.reduceat take each polygon's extent, so
+# there is no per-line Python list building. Polygons without points
+# fall back to the whole page.
+#
+# Groupings are derived from the response's text spans:
+#   - words of a line: searchsorted of the line's span over the
+#     page's (offset-sorted) word offsets,
+#   - paragraph of a line: searchsorted of the line offset over the
+#     paragraph span starts.
+# ---------------------------------------------------------
+
+from array import array
+from itertools import chain
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .schemas import PageInfo
+from .chunk_table import ChunkTable, LineLayout
+
+
+def polygons_to_bboxes(polygons: Sequence[Sequence[float]], fallback: Tuple[float, float, float, float]) -> np.ndarray:
+    """(n, 4) float64 array of x1, y1, x2, y2 for flat [x0, y0, x1, y1, ...] polygons."""
+    n = len(polygons)
+    out = np.empty((n, 4), dtype=np.float64)
+    if n == 0:
+        return out
+
+    # common case: every polygon has the same number of points (Azure: 4) → one 3-D array
+    k = len(polygons[0])
+    if k and k % 2 == 0:
+        try:
+            points = np.array(polygons, dtype=np.float64)
+        except ValueError:  # ragged
+            points = None
+        if points is not None and points.shape == (n, k):
+            points = points.reshape(n, k // 2, 2)
+            out[:, 0:2] = points.min(axis=1)
+            out[:, 2:4] = points.max(axis=1)
+            return out
+
+    counts = np.fromiter((len(p) // 2 for p in polygons), dtype=np.int64, count=n)
+    total = int(counts.sum())
+    nonempty = counts > 0
+    out[~nonempty] = fallback
+    if not total:
+        return out
+
+    # odd trailing coordinates (never sent by Azure) are dropped by the // 2 above
+    flat = np.fromiter(
+        chain.from_iterable(p[: 2 * (len(p) // 2)] for p in polygons), dtype=np.float64, count=2 * total
+    )
+    points = flat.reshape(total, 2)
+    starts = (np.cumsum(counts) - counts)[nonempty]
+    out[nonempty, 0:2] = np.minimum.reduceat(points, starts, axis=0)
+    out[nonempty, 2:4] = np.maximum.reduceat(points, starts, axis=0)
+    return out
+
+
+def _span_bounds(items: List[Dict[str, Any]], key: str = "spans") -> Tuple[np.ndarray, np.ndarray]:
+    """Start / end text offsets of each item (-1 when it has no span)."""
+    if key == "span":  # words carry a single span dict
+        spans = [item.get("span") for item in items]
+        first = last = spans
+    else:
+        spans = [item.get(key) or None for item in items]
+        first = [s[0] if s else None for s in spans]
+        last = [s[-1] if s else None for s in spans]
+    starts = np.array([s["offset"] if s else -1 for s in first], dtype=np.int64)
+    ends = np.array([s["offset"] + s["length"] if s else -1 for s in last], dtype=np.int64)
+    return starts, ends
+
+
+def parse_analyze_result(doc_id: str, doc_name: str, result: Dict[str, Any]) -> Tuple[ChunkTable, List[PageInfo]]:
+    """Lines (with word / paragraph groupings attached as table.layout) + per-page sizes."""
+    pages = sorted(result.get("pages", []), key=lambda p: p.get("pageNumber", 1))
+
+    page_infos: List[PageInfo] = []
+    line_texts: List[str] = []
+    line_pages: List[np.ndarray] = []
+    line_boxes: List[np.ndarray] = []
+    line_starts: List[np.ndarray] = []
+    word_texts: List[str] = []
+    word_pages: List[np.ndarray] = []
+    word_boxes: List[np.ndarray] = []
+    line_word_start: List[np.ndarray] = []
+    line_word_end: List[np.ndarray] = []
+    word_base = 0
+
+    for page in pages:
+        page_number = page.get("pageNumber", 1)
+        width = page.get("width") or 0
+        height = page.get("height") or 0
+        whole_page = (0.0, 0.0, float(width), float(height))
+
+        lines = page.get("lines", [])
+        words = page.get("words", [])
+        page_infos.append(
+            PageInfo(page=page_number, width=width, height=height, unit=page.get("unit"), line_count=len(lines))
+        )
+
+        line_texts.extend(line.get("content", "") for line in lines)
+        line_pages.append(np.full(len(lines), page_number, dtype=np.uint32))
+        line_boxes.append(polygons_to_bboxes([line.get("polygon") or () for line in lines], whole_page))
+
+        # words in reading (offset) order, so a line's words are one contiguous row range
+        word_offsets, _ = _span_bounds(words, key="span")
+        if len(word_offsets) > 1 and (np.diff(word_offsets) < 0).any():
+            order = np.argsort(word_offsets, kind="stable")
+            words = [words[i] for i in order]
+            word_offsets = word_offsets[order]
+
+        word_texts.extend(word.get("content", "") for word in words)
+        word_pages.append(np.full(len(words), page_number, dtype=np.uint32))
+        word_boxes.append(polygons_to_bboxes([word.get("polygon") or () for word in words], whole_page))
+
+        # words of each line = words whose offset falls inside the line's span
+        starts, ends = _span_bounds(lines)
+        lo = np.searchsorted(word_offsets, starts, side="left")
+        hi = np.searchsorted(word_offsets, ends, side="left")
+        lo = np.where(starts >= 0, lo, 0)
+        hi = np.where(starts >= 0, hi, 0)
+        line_word_start.append(lo + word_base)
+        line_word_end.append(np.maximum(hi, lo) + word_base)
+        line_starts.append(starts)
+        word_base += len(words)
+
+    def _cat(parts: List[np.ndarray], dtype, width: int = 0) -> np.ndarray:
+        if parts:
+            return np.concatenate(parts).astype(dtype, copy=False)
+        return np.empty((0, width) if width else 0, dtype=dtype)
+
+    boxes = _cat(line_boxes, np.float32, 4)
+    table = ChunkTable.from_columns(
+        doc_id, doc_name, line_texts, _cat(line_pages, np.uint32).tobytes(),
+        *(np.ascontiguousarray(boxes[:, k]).tobytes() for k in range(4)),
+    )
+
+    wboxes = _cat(word_boxes, np.float32, 4)
+    words_table = ChunkTable.from_columns(
+        doc_id, doc_name, word_texts, _cat(word_pages, np.uint32).tobytes(),
+        *(np.ascontiguousarray(wboxes[:, k]).tobytes() for k in range(4)),
+    )
+
+    paragraphs_table, roles, line_paragraph = _paragraphs(
+        doc_id, doc_name, result.get("paragraphs", []), _cat(line_starts, np.int64), page_infos
+    )
+
+    table.layout = LineLayout(
+        words_table,
+        paragraphs_table,
+        roles,
+        array("q", _cat(line_word_start, np.int64).tobytes()),
+        array("q", _cat(line_word_end, np.int64).tobytes()),
+        array("q", line_paragraph.tobytes()),
+    )
+    return table, page_infos
+
+
+def _paragraphs(
+    doc_id: str,
+    doc_name: str,
+    paragraphs: List[Dict[str, Any]],
+    line_starts: np.ndarray,
+    page_infos: List[PageInfo],
+) -> Tuple[ChunkTable, List[Optional[str]], np.ndarray]:
+    """Paragraph table in page order, their roles, and the paragraph row of every line."""
+    sizes = {p.page: (p.width, p.height) for p in page_infos}
+    first_region = [(p.get("boundingRegions") or [{}])[0] for p in paragraphs]
+    page_numbers = np.fromiter((r.get("pageNumber", 1) for r in first_region), dtype=np.int64, count=len(paragraphs))
+    starts, ends = _span_bounds(paragraphs)
+
+    # ChunkTable rows must be in page order; reading order (offset) within a page
+    rows = np.lexsort((starts, page_numbers))
+    boxes = np.empty((len(paragraphs), 4), dtype=np.float64)
+    for page in np.unique(page_numbers):
+        on_page = rows[page_numbers[rows] == page]
+        w, h = sizes.get(int(page), (0, 0))
+        boxes[on_page] = polygons_to_bboxes(
+            [first_region[i].get("polygon") or () for i in on_page], (0.0, 0.0, float(w), float(h))
+        )
+
+    boxes = boxes[rows].astype(np.float32)
+    table = ChunkTable.from_columns(
+        doc_id, doc_name,
+        [paragraphs[i].get("content", "") for i in rows],
+        page_numbers[rows].astype(np.uint32).tobytes(),
+        *(np.ascontiguousarray(boxes[:, k]).tobytes() for k in range(4)),
+    )
+    roles = [paragraphs[i].get("role") for i in rows]
+
+    # paragraph containing each line's first character
+    row_of = np.empty(len(paragraphs), dtype=np.int64)
+    row_of[rows] = np.arange(len(paragraphs))
+    by_offset = np.argsort(starts, kind="stable")
+    sorted_starts = starts[by_offset]
+    line_paragraph = np.full(len(line_starts), -1, dtype=np.int64)
+    if len(paragraphs) and len(line_starts):
+        idx = np.searchsorted(sorted_starts, line_starts, side="right") - 1
+        valid = (line_starts >= 0) & (idx >= 0)
+        candidates = by_offset[np.clip(idx, 0, None)]
+        valid &= (starts[candidates] >= 0) & (line_starts < ends[candidates])
+        line_paragraph[valid] = row_of[candidates[valid]]
+    return table, roles, line_paragraph
@@ -0,0 +1,270 @@
+# pipeline.py
+# ---------------------------------------------------------
+# Bounded concurrent ingestion pipeline for bulk backfills.
+#
+#   sources ──▶ [queue] ──▶ N workers ──▶ [queue] ──▶ writer
+#   (lazy file      (bounded:     OCR → ICD →          JSONL / Parquet
+#    reads)          backpressure) grounding
+#
+# Files are read only when a worker slot frees up, so memory holds
+# at most ~2×concurrency documents no matter how large the input is.
+# Used by POST /upload/batch and by the CLI in backend/ingest.py.
+# ---------------------------------------------------------
+
+import asyncio
+import json
+import os
+import time
+import uuid
+import zipfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .ocr_client import run_ocr
+from .llm_client import extract_icds_for_chunks
+from .report_generator import generate_report_for_icds
+from .metrics import stage
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+SUPPORTED_SUFFIXES = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+# (doc_name, zero-arg loader returning the bytes)
+Source = Tuple[str, Callable[[], bytes]]
+
+
+# --------------------------------------------------------------------
+# Sources
+# --------------------------------------------------------------------
+def _read_file(path: str) -> Callable[[], bytes]:
+    def load() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    return load
+
+
+def _read_zip_member(zip_path: str, member: str) -> Callable[[], bytes]:
+    def load() -> bytes:
+        with zipfile.ZipFile(zip_path) as zf:
+            return zf.read(member)
+    return load
+
+
+def iter_sources(paths: Iterable[str]) -> Iterator[Source]:
+    """Yield (doc_name, loader) for files, directories (recursive) and .zip archives."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield from iter_sources([os.path.join(root, name)])
+        elif path.lower().endswith(".zip"):
+            with zipfile.ZipFile(path) as zf:
+                members = [m for m in zf.namelist() if m.lower().endswith(SUPPORTED_SUFFIXES)]
+            for member in members:
+                yield member, _read_zip_member(path, member)
+        elif path.lower().endswith(SUPPORTED_SUFFIXES):
+            yield os.path.basename(path), _read_file(path)
+
+
+# --------------------------------------------------------------------
+# Per-document work
+# --------------------------------------------------------------------
+async def process_document(doc_id: str, doc_name: str, content: bytes) -> Dict[str, Any]:
+    """OCR → ICD extraction → grounding for one document."""
+    started = time.perf_counter()
+    table, pages = await run_ocr(doc_id, doc_name, content)
+    with stage("llm_extract"):
+        icds = await extract_icds_for_chunks(table)
+    with stage("grounding"):
+        locations = await asyncio.to_thread(
+            generate_report_for_icds, doc_id=doc_id, table=table, icds=icds
+        )
+    return {
+        "doc_id": doc_id,
+        "doc_name": doc_name,
+        "status": "succeeded",
+        "page_count": len(pages),
+        "line_count": len(table),
+        "icds": [i.model_dump() for i in icds],
+        "locations": [loc.model_dump() for loc in locations],
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+# --------------------------------------------------------------------
+# Writers
+# --------------------------------------------------------------------
+class JSONLWriter:
+    """One JSON object per document."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, result: Dict[str, Any]) -> None:
+        self._f.write(json.dumps(result) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class ParquetWriter:
+    """One row per grounded ICD location (documents without any get one empty row)."""
+
+    def __init__(self, path: str, batch_rows: int = 5000):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet output (pip install pyarrow)")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_rows = batch_rows
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+
+    def write(self, result: Dict[str, Any]) -> None:
+        base = {
+            "doc_id": result["doc_id"],
+            "doc_name": result["doc_name"],
+            "status": result["status"],
+            "error": result.get("error"),
+        }
+        locations = result.get("locations") or [None]
+        for loc in locations:
+            row = dict(base)
+            row.update(
+                icd_code=loc["icd_code"] if loc else None,
+                icd_description=loc["icd_description"] if loc else None,
+                page=loc["page"] if loc else None,
+                x1=loc["bbox"][0] if loc else None,
+                y1=loc["bbox"][1] if loc else None,
+                x2=loc["bbox"][2] if loc else None,
+                y2=loc["bbox"][3] if loc else None,
+                sentence=loc["sentence"] if loc else None,
+                confidence=loc["confidence"] if loc else None,
+            )
+            self._rows.append(row)
+        if len(self._rows) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def make_writer(path: str):
+    if path.lower().endswith(".parquet"):
+        return ParquetWriter(path)
+    return JSONLWriter(path)
+
+
+# --------------------------------------------------------------------
+# Pipeline
+# --------------------------------------------------------------------
+class PipelineStats:
+    def __init__(self):
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at
+        done = self.succeeded + self.failed
+        return {
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_s": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+            "finished": self.finished_at is not None,
+        }
+
+
+async def run_pipeline(
+    sources: Iterable[Source],
+    writer,
+    concurrency: int,
+    stats: Optional[PipelineStats] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> PipelineStats:
+    stats = stats or PipelineStats()
+    todo: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    done: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def produce() -> None:
+        it = iter(sources)
+        while True:
+            # iter_sources walks directories and opens zip archives: off the event loop
+            source = await asyncio.to_thread(next, it, None)
+            if source is None:
+                break
+            doc_name, load = source
+            # blocks while workers are busy → backpressure on file reads
+            await todo.put((str(uuid.uuid4()), doc_name, load))
+            stats.submitted += 1
+        for _ in range(concurrency):
+            await todo.put(None)
+
+    async def work() -> None:
+        while True:
+            item = await todo.get()
+            if item is None:
+                return
+            doc_id, doc_name, load = item
+            try:
+                content = await asyncio.to_thread(load)
+                result = await process_document(doc_id, doc_name, content)
+            except Exception as e:
+                result = {"doc_id": doc_id, "doc_name": doc_name, "status": "failed", "error": str(e)}
+            await done.put(result)
+
+    async def write() -> None:
+        while True:
+            result = await done.get()
+            if result is None:
+                return
+            if result["status"] == "succeeded":
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+            await asyncio.to_thread(writer.write, result)
+            if on_result is not None:
+                on_result(result)
+
+    writer_task = asyncio.create_task(write())
+    feeding = asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    try:
+        # watch the writer together with producer + workers: if writer.write raises,
+        # nobody drains `done` any more and the workers would block on it forever
+        finished, _ = await asyncio.wait({feeding, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+        if writer_task in finished:
+            writer_task.result()  # raises the writer's error
+        await feeding
+        await done.put(None)
+        await writer_task
+    finally:
+        for task in (feeding, writer_task):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(feeding, writer_task, return_exceptions=True)
+        await asyncio.to_thread(writer.close)
+        stats.finished_at = time.time()
+    return stats
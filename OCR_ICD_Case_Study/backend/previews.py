@@ -0,0 +1,91 @@
+# previews.py
+# ---------------------------------------------------------
+# Page preview rendering.
+#
+# Nothing is rendered at upload time. The first GET for a page
+# rasterizes it from the original upload, downscales it to the
+# requested width and caches the encoded bytes in the doc store;
+# later requests (and other workers, with the sqlite store) reuse it.
+# ---------------------------------------------------------
+
+import logging
+from io import BytesIO
+from typing import Tuple
+
+from .config import PREVIEW_FORMAT, PREVIEW_QUALITY
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # type: ignore
+
+try:
+    import fitz  # PyMuPDF, optional: real PDF rasterization
+except ImportError:
+    fitz = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+# Azure reports PDF page sizes in inches
+_PDF_FALLBACK_DPI = 96
+
+
+def is_pdf(content: bytes) -> bool:
+    return content[:5] == b"%PDF-"
+
+
+def preview_blob_name(page: int, max_width: int) -> str:
+    return f"preview-p{page}-w{max_width}.{PREVIEW_FORMAT.lower()}"
+
+
+def preview_media_type() -> str:
+    return MEDIA_TYPES.get(PREVIEW_FORMAT, "application/octet-stream")
+
+
+def render_page_preview(
+    content: bytes, page: int, max_width: int, page_width: float, page_height: float
+) -> Tuple[bytes, str]:
+    """Render 1-based `page` of the upload, at most `max_width` px wide.
+
+    Returns (encoded bytes, media type).
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required for previews (pip install pillow)")
+
+    if is_pdf(content):
+        img = _rasterize_pdf_page(content, page, max_width, page_width, page_height)
+    else:
+        img = Image.open(BytesIO(content))
+        # multi-frame TIFFs carry one page per frame
+        if page > 1:
+            img.seek(min(page - 1, getattr(img, "n_frames", 1) - 1))
+        img = img.convert("RGB")
+
+    if img.width > max_width:
+        img.thumbnail((max_width, max_width * img.height // img.width), Image.LANCZOS)
+
+    buf = BytesIO()
+    if PREVIEW_FORMAT == "PNG":
+        img.save(buf, format="PNG", optimize=True)
+    else:
+        img.save(buf, format=PREVIEW_FORMAT, quality=PREVIEW_QUALITY)
+    return buf.getvalue(), preview_media_type()
+
+
+def _rasterize_pdf_page(content: bytes, page: int, max_width: int, page_width: float, page_height: float):
+    if fitz is not None:
+        with fitz.open(stream=content, filetype="pdf") as pdf:
+            pdf_page = pdf[min(page, pdf.page_count) - 1]
+            zoom = max_width / pdf_page.rect.width
+            pix = pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    # No rasterizer installed: blank canvas with the right aspect ratio,
+    # so bounding boxes still line up.
+    logger.warning("PyMuPDF not installed; rendering a blank preview canvas instead")
+    w_px = max(int(float(page_width or 8.5) * _PDF_FALLBACK_DPI), 1)
+    h_px = max(int(float(page_height or 11) * _PDF_FALLBACK_DPI), 1)
+    return Image.new("RGB", (w_px, h_px), color="white")
@@ -1,61 +1,131 @@
 # rag_retriever.py
 # ---------------------------------------------------------
-# MOCK retriever for demo without OpenAI embeddings,
-# without FAISS, and without PGVector.
+# Offline BM25 retriever over a document's OCR lines.
+# No OpenAI embeddings, no FAISS, no PGVector.
+#
+# The inverted index (term -> postings) and per-line lengths are built
+# once per document; a query only touches the postings of its own
+# terms, so grounding cost no longer grows with chunks x keywords x
+# text length.
 # ---------------------------------------------------------
 
-from typing import List
+import heapq
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-from .schemas import OCRChunk
+from .chunk_table import ChunkTable
 
+# ICD-ish tokens like "e11.9" stay whole; everything else is alnum runs
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)?")
 
-def build_retriever(chunks: List[OCRChunk]):
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or the to was were with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Retriever:
     """
-    Very simple keyword-based retriever.
+    Ranked keyword retriever (Okapi BM25).
     Compatible with LangChain's retriever interface
     by implementing both:
         - get_relevant_documents(query)
         - invoke(query)
-
-    No OpenAI, no embeddings, no FAISS, no PGVector.
-    Works fully offline.
+    Results are ordered best first and carry their BM25 "score".
     """
 
-    entries = [
-        {
-            "text": c.text,
-            "metadata": {
-                "doc_id": c.doc_id,
-                "doc_name": c.doc_name,
-                "page": c.page,
-                "bbox": c.bbox,
-            },
+    def __init__(self, table: ChunkTable, k: int = 5, k1: float = 1.5, b: float = 0.75):
+        self.k = k
+        self.k1 = k1
+        self.b = b
+        self.table = table
+
+        # term -> [(line index, term frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for i, text in enumerate(table.texts()):
+            tf = Counter(tokenize(text))
+            self.lengths.append(sum(tf.values()))
+            for term, freq in tf.items():
+                self.postings.setdefault(term, []).append((i, freq))
+
+        n = len(table)
+        self.avg_len = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
         }
-        for c in chunks
-    ]
-
-    class SimpleRetriever:
-        def get_relevant_documents(self, query: str):
-            """Return chunks whose text contains any of the keywords."""
-            if not query:
-                return []
-
-            keywords = query.lower().split()
-
-            results = []
-            for entry in entries:
-                text = entry["text"].lower()
-                if any(k in text for k in keywords):
-                    results.append(
-                        {
-                            "page_content": entry["text"],
-                            "metadata": entry["metadata"],
-                        }
-                    )
-            return results
-
-        # ⭐⭐⭐ This FIX makes LangChain compatible
-        def invoke(self, query: str):
-            return self.get_relevant_documents(query)
-
-    return SimpleRetriever()
+
+    def score(self, query: str) -> Dict[int, float]:
+        """BM25 score per line index, for lines sharing at least one query term."""
+        scores: Dict[int, float] = {}
+        if not self.avg_len:
+            return scores
+        k1, b, avg_len, lengths = self.k1, self.b, self.avg_len, self.lengths
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for i, tf in postings:
+                norm = tf + k1 * (1 - b + b * lengths[i] / avg_len)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (k1 + 1) / norm
+        return scores
+
+    def get_relevant_documents(self, query: str, k: Optional[int] = None):
+        """Return the top-k lines for `query`, best first."""
+        if not query:
+            return []
+
+        scores = self.score(query)
+        top = heapq.nlargest(k or self.k, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+        table = self.table
+        return [
+            {
+                "page_content": table.text(i),
+                "metadata": {
+                    "doc_id": table.doc_id,
+                    "doc_name": table.doc_name,
+                    "page": table.page(i),
+                    "bbox": table.bbox(i),
+                },
+                "score": s,
+            }
+            for i, s in top
+        ]
+
+    # ⭐⭐⭐ This FIX makes LangChain compatible
+    def invoke(self, query: str):
+        return self.get_relevant_documents(query)
+
+
+def build_retriever(table: ChunkTable, k: int = 5) -> BM25Retriever:
+    return BM25Retriever(table, k=k)
+
+
+# OCR output of a doc_id never changes, so its index can be reused
+# across /view-report calls.
+_RETRIEVERS: "OrderedDict[str, BM25Retriever]" = OrderedDict()
+_RETRIEVERS_MAX = 64
+_RETRIEVERS_LOCK = threading.Lock()
+
+
+def get_retriever(doc_id: str, table: ChunkTable) -> BM25Retriever:
+    with _RETRIEVERS_LOCK:
+        retriever = _RETRIEVERS.get(doc_id)
+        if retriever is not None and len(retriever.table) == len(table):
+            _RETRIEVERS.move_to_end(doc_id)
+            return retriever
+
+    retriever = build_retriever(table)
+    with _RETRIEVERS_LOCK:
+        _RETRIEVERS[doc_id] = retriever
+        while len(_RETRIEVERS) > _RETRIEVERS_MAX:
+            _RETRIEVERS.popitem(last=False)
+    return retriever
@@ -1,47 +1,46 @@
 from typing import List, Optional
 
-from .schemas import ICDItem, SupportingLocation, OCRChunk
-from .rag_retriever import build_retriever
+from .schemas import ICDItem, SupportingLocation
+from .chunk_table import ChunkTable
+from .alignment import get_aligner
 
 
 def generate_report_for_icds(
     doc_id: str,
-    chunks: List[OCRChunk],
+    table: ChunkTable,
     icds: List[ICDItem],
     filter_codes: Optional[List[str]] = None,
 ) -> List[SupportingLocation]:
 
-    retriever = build_retriever(chunks)
-    locations: List[SupportingLocation] = []
-
-    for item in icds:
+    # Filter by ICD code if UI passed filters; skip items without a sentence
+    items = [
+        item
+        for item in icds
+        if (not filter_codes or item.icd_code in filter_codes) and item.supporting_sentence
+    ]
+    if not items:
+        return []
 
-        # Filter by ICD code if UI passed filters
-        if filter_codes and item.icd_code not in filter_codes:
-            continue
+    # Fuzzy-align every supporting sentence in one batch
+    aligner = get_aligner(doc_id, table)
+    alignments = aligner.align_all([item.supporting_sentence for item in items])
 
-        # Skip if no supporting sentence
-        if not item.supporting_sentence:
-            continue
+    doc_name = table.doc_name
+    locations: List[SupportingLocation] = []
 
-        # Query mock retriever
-        docs = retriever.invoke(item.supporting_sentence)
-        if not docs:
+    for item, match in zip(items, alignments):
+        if match is None:
             continue
 
-        d = docs[0]  # best match (simple logic)
-
-        meta = d["metadata"]            # ← FIXED
-        sentence = d["page_content"]    # ← FIXED
-
         locations.append(
             SupportingLocation(
                 icd_code=item.icd_code,
                 icd_description=item.icd_description,
-                doc_name=meta.get("doc_name", ""),
-                page=int(meta.get("page", 1)),
-                bbox=tuple(meta.get("bbox", (0, 0, 0, 0))),
-                sentence=sentence,
+                doc_name=doc_name,
+                page=match.page,
+                bbox=match.bbox,       # union of all matched lines
+                sentence=match.text,
+                confidence=match.confidence,
             )
         )
 
@@ -8,13 +8,58 @@ class UploadOut(BaseModel):
     doc_id: str
 
 
+class JobStatus(BaseModel):
+    doc_id: str
+    doc_name: str
+    status: str  # queued | running | succeeded | failed
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    queue_wait_s: Optional[float] = None
+    run_s: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    status: str  # running | succeeded | failed
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed_s: float = 0.0
+    docs_per_s: float = 0.0
+    results_url: Optional[str] = None
+    error: Optional[str] = None
+
+
 class OCRChunk(BaseModel):
     doc_id: str
     doc_name: str
     page: int
     text: str
-    # (x1, y1, x2, y2) in source image coordinates
+    # (x1, y1, x2, y2) in source image coordinates (0–1 page coordinates with normalized=true)
     bbox: Tuple[float, float, float, float]
+    # line level only, when the OCR response had them: paragraph row and [start, end) word rows
+    paragraph: Optional[int] = None
+    words: Optional[Tuple[int, int]] = None
+
+
+class PageInfo(BaseModel):
+    page: int  # 1-based
+    # page size in the same units as the chunk bboxes (Azure: inch for PDF, pixel for images)
+    width: float
+    height: float
+    unit: Optional[str] = None
+    line_count: int = 0
+
+
+class ChunkPage(BaseModel):
+    doc_id: str
+    page: Optional[int] = None  # None = all pages
+    offset: int
+    limit: int
+    total: int
+    chunks: List[OCRChunk]
 
 
 class ICDItem(BaseModel):
@@ -39,11 +84,14 @@ class SupportingLocation(BaseModel):
     page: int
     bbox: Tuple[float, float, float, float]
     sentence: str
+    # 0-1 similarity between the LLM's supporting sentence and the matched OCR span
+    confidence: float = 0.0
 
 
 class ReportRequest(BaseModel):
     doc_id: str
     icd_codes: Optional[List[str]] = None  # if None, use all
+    normalized: bool = False  # return bboxes in 0–1 page coordinates
 
 
 class ReportResponse(BaseModel):
@@ -0,0 +1,90 @@
+# uploads.py
+# ---------------------------------------------------------
+# Streaming upload handling.
+#
+# An upload is copied in 1 MB chunks into a SpooledTemporaryFile
+# (RAM up to UPLOAD_SPOOL_BYTES, disk beyond) while its size is
+# checked against MAX_UPLOAD_BYTES. Queued jobs keep only that spool,
+# not a bytes copy, so 1000 queued 20 MB scans cost disk, not RAM.
+#
+# upload_buffer() then exposes the spool as a read-only memoryview:
+# the BytesIO buffer while it is still in memory, an mmap of the temp
+# file once it has rolled to disk (page cache, not heap). Hashing,
+# the Azure request body and the doc store all read from that view.
+# ---------------------------------------------------------
+
+import mmap
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import UploadFile
+
+from .config import MAX_UPLOAD_BYTES, UPLOAD_SPOOL_BYTES
+
+CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> tempfile.SpooledTemporaryFile:
+    """Copy `file` into a new spool; raises UploadTooLarge past `max_bytes`. Caller closes the spool."""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def spool_size(spool: tempfile.SpooledTemporaryFile) -> int:
+    pos = spool.tell()
+    spool.seek(0, 2)
+    size = spool.tell()
+    spool.seek(pos)
+    return size
+
+
+@contextmanager
+def upload_buffer(spool: tempfile.SpooledTemporaryFile) -> Iterator[memoryview]:
+    """Zero-copy read-only view of the spool's contents, valid inside the block."""
+    spool.flush()
+    if spool_size(spool) == 0:
+        yield memoryview(b"")
+        return
+
+    # SpooledTemporaryFile has no public "is it still in memory" API
+    if not getattr(spool, "_rolled", True):
+        view = spool._file.getbuffer()
+        readonly = view.toreadonly()
+        try:
+            yield readonly
+        finally:
+            readonly.release()
+            view.release()
+        return
+
+    with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+
+
+def iter_chunks(content: memoryview, chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Request-body chunks; only one CHUNK_BYTES copy is alive at a time."""
+    for start in range(0, len(content), chunk_bytes):
+        yield bytes(content[start:start + chunk_bytes])
@@ -1,8 +1,9 @@
 
 let currentDocId = null;
-let ocrChunks = [];
-let pageWidth = 800;
-let pageHeight = 1000;
+let docPages = [];        // [{page, width, height, line_count, image_url, chunks_url}]
+let currentPage = 1;
+let ocrChunks = [];       // chunks of the page currently shown
+let highlighted = [];     // grounded ICD locations, all pages
 
 // FastAPI URL
 let apiBase = "http://127.0.0.1:8000";
@@ -35,7 +36,14 @@ async function uploadFile() {
   }
 
   currentDocId = data.doc_id;
-  log("Upload OK. doc_id = " + currentDocId);
+  log("Upload queued. doc_id = " + currentDocId);
+
+  const job = await waitForJob(currentDocId);
+  if (job.status !== "succeeded") {
+    log("OCR job failed: " + (job.error || job.status));
+    return;
+  }
+  log("OCR done in " + job.run_s.toFixed(1) + "s (queued " + job.queue_wait_s.toFixed(1) + "s)");
 
   const docResp = await fetch(apiBase + "/doc/" + currentDocId);
   const docData = await docResp.json();
@@ -44,21 +52,65 @@ async function uploadFile() {
     return;
   }
 
-  ocrChunks = docData.chunks || [];
-  pageWidth = docData.page_width || 800;
-  pageHeight = docData.page_height || 1000;
-
-  if (docData.image_data_url) {
-    const img = document.getElementById("page-image");
-    img.onload = () => {
-      const canvas = document.getElementById("overlay");
-      canvas.width = img.clientWidth;
-      canvas.height = img.clientHeight;
-      drawAllBoxes();
-    };
-    img.src = docData.image_data_url;
-  } else {
+  docPages = docData.pages || [];
+  highlighted = [];
+  log(docData.page_count + " page(s), " + docData.line_count + " OCR lines");
+  if (!docPages.length) {
     log("No image preview available.");
+    return;
+  }
+  await showPage(docPages[0].page);
+}
+
+async function showPage(page) {
+  const info = docPages.find(p => p.page === page);
+  if (!info) return;
+  currentPage = page;
+  document.getElementById("page-label").textContent = "Page " + page + " / " + docPages.length;
+
+  // Stream this page's chunks (NDJSON) so boxes can be drawn as they arrive
+  ocrChunks = [];
+  // Boxes come back in 0–1 page coordinates: no per-redraw rescaling by page size
+  const resp = await fetch(apiBase + info.chunks_url + "&stream=true&normalized=true");
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop();
+    lines.filter(l => l).forEach(l => ocrChunks.push(JSON.parse(l)));
+  }
+
+  const img = document.getElementById("page-image");
+  img.onload = () => {
+    const canvas = document.getElementById("overlay");
+    canvas.width = img.clientWidth;
+    canvas.height = img.clientHeight;
+    drawAllBoxes(highlighted);
+  };
+  img.src = apiBase + info.image_url;
+}
+
+function changePage(delta) {
+  const idx = docPages.findIndex(p => p.page === currentPage) + delta;
+  if (idx >= 0 && idx < docPages.length) {
+    showPage(docPages[idx].page);
+  }
+}
+
+async function waitForJob(docId) {
+  let delay = 500;
+  while (true) {
+    const resp = await fetch(apiBase + "/jobs/" + docId);
+    const job = await resp.json();
+    if (!resp.ok || job.status === "succeeded" || job.status === "failed") {
+      return job;
+    }
+    await new Promise(r => setTimeout(r, delay));
+    delay = Math.min(delay * 1.5, 3000);
   }
 }
 
@@ -71,8 +123,8 @@ function drawAllBoxes(highlightICDs = []) {
 
   if (!img.naturalWidth || !img.naturalHeight) return;
 
-  const scaleX = canvas.width / pageWidth;
-  const scaleY = canvas.height / pageHeight;
+  const scaleX = canvas.width;
+  const scaleY = canvas.height;
 
   // Grey boxes for all OCR lines
   ctx.lineWidth = 1;
@@ -82,10 +134,10 @@ function drawAllBoxes(highlightICDs = []) {
     ctx.strokeRect(x1 * scaleX, y1 * scaleY, (x2 - x1) * scaleX, (y2 - y1) * scaleY);
   });
 
-  // Red boxes for ICD supporting lines
+  // Red boxes for ICD supporting lines on this page
   ctx.lineWidth = 2;
   ctx.strokeStyle = "red";
-  highlightICDs.forEach(ch => {
+  highlightICDs.filter(ch => (ch.page || 1) === currentPage).forEach(ch => {
     const [x1, y1, x2, y2] = ch.bbox;
     ctx.strokeRect(x1 * scaleX, y1 * scaleY, (x2 - x1) * scaleX, (y2 - y1) * scaleY);
   });
@@ -113,7 +165,7 @@ async function extractICD() {
   const repResp = await fetch(apiBase + "/view-report", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ doc_id: currentDocId, icd_codes: null }),
+    body: JSON.stringify({ doc_id: currentDocId, icd_codes: null, normalized: true }),
   });
   const repData = await repResp.json();
   if (!repResp.ok) {
@@ -122,13 +174,12 @@ async function extractICD() {
   }
   log("Report with locations: " + JSON.stringify(repData, null, 2));
 
-  const boxesToHighlight = [];
-  repData.locations.forEach(loc => {
-    const match = ocrChunks.find(ch => ch.text === loc.sentence);
-    if (match) {
-      boxesToHighlight.push(match);
-    }
-  });
-
-  drawAllBoxes(boxesToHighlight);
+  // Locations carry their own page + bbox, so they work on any page
+  highlighted = repData.locations;
+  const first = highlighted[0];
+  if (first && first.page !== currentPage) {
+    await showPage(first.page);
+  } else {
+    drawAllBoxes(highlighted);
+  }
 }
@@ -0,0 +1,99 @@
+"""
+Local stand-in for the Azure Document Intelligence Read API.
+
+Implements just enough of `prebuilt-read:analyze` for the backend:
+  - POST .../prebuilt-read:analyze   -> 202 + Operation-Location + Retry-After
+  - GET  .../analyzeResults/{id}      -> "running" until the simulated latency
+                                         has passed, then "succeeded"
+
+Run it, then point the backend at it:
+
+    python scripts/azure_ocr_stub.py --port 8100 --latency 3
+    AZURE_OCR_ENDPOINT=http://127.0.0.1:8100 AZURE_OCR_KEY=stub \\
+        uvicorn backend.app:app --port 8000
+"""
+
+import argparse
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Azure Read API stub")
+
+LATENCY_S = 3.0
+RETRY_AFTER_S = 1
+LINES_PER_PAGE = 40
+PAGES = 1
+
+# operation id -> submit timestamp
+OPERATIONS: Dict[str, float] = {}
+
+
+def _fake_analyze_result() -> dict:
+    pages = []
+    for page_number in range(1, PAGES + 1):
+        lines = []
+        for i in range(LINES_PER_PAGE):
+            y = 0.5 + i * 0.25
+            lines.append(
+                {
+                    "content": f"Line {i + 1} of page {page_number}: Diagnosis: Hypertension",
+                    "polygon": [1.0, y, 7.5, y, 7.5, y + 0.2, 1.0, y + 0.2],
+                }
+            )
+        pages.append(
+            {"pageNumber": page_number, "width": 8.5, "height": 11, "unit": "inch", "lines": lines}
+        )
+    return {"apiVersion": "2023-07-31", "modelId": "prebuilt-read", "pages": pages}
+
+
+@app.post("/formrecognizer/documentModels/prebuilt-read:analyze")
+async def analyze(request: Request):
+    await request.body()
+    op_id = str(uuid.uuid4())
+    OPERATIONS[op_id] = time.monotonic()
+    base = str(request.base_url).rstrip("/")
+    location = f"{base}/formrecognizer/documentModels/prebuilt-read/analyzeResults/{op_id}"
+    return JSONResponse(
+        status_code=202,
+        content=None,
+        headers={"Operation-Location": location, "Retry-After": str(RETRY_AFTER_S)},
+    )
+
+
+@app.get("/formrecognizer/documentModels/prebuilt-read/analyzeResults/{op_id}")
+async def analyze_result(op_id: str):
+    started = OPERATIONS.get(op_id)
+    if started is None:
+        return JSONResponse(status_code=404, content={"error": {"code": "NotFound"}})
+
+    if time.monotonic() - started < LATENCY_S:
+        return JSONResponse(
+            content={"status": "running"},
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
+
+    OPERATIONS.pop(op_id, None)
+    return {"status": "succeeded", "analyzeResult": _fake_analyze_result()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=LATENCY_S, help="simulated OCR time per job (s)")
+    parser.add_argument("--retry-after", type=int, default=RETRY_AFTER_S)
+    parser.add_argument("--lines", type=int, default=LINES_PER_PAGE, help="lines per page")
+    parser.add_argument("--pages", type=int, default=PAGES)
+    args = parser.parse_args()
+
+    LATENCY_S = args.latency
+    RETRY_AFTER_S = args.retry_after
+    LINES_PER_PAGE = args.lines
+    PAGES = args.pages
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
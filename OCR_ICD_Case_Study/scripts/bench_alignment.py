@@ -0,0 +1,130 @@
+"""
+Batch sentence -> bbox alignment on synthetic 500-line pages.
+
+Plants supporting sentences (some split over two OCR lines, some
+re-cased / lightly paraphrased the way an LLM quotes them) into filler
+text, then aligns every ICD of the document in one align_all() call.
+Precision: distractor lines that share only section labels or a common
+word with a sentence the document does not contain are planted too;
+those sentences must align to nothing ("false" column; the script exits
+non-zero if any of them is grounded). From OCR_ICD_Case_Study/:
+
+    python -m scripts.bench_alignment --pages 1 5 20
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from backend.chunk_table import ChunkTable
+from backend.alignment import SentenceAligner
+
+LINES_PER_PAGE = 500
+
+FILLER = [
+    "Patient seen in clinic today for routine follow-up.",
+    "Vital signs stable, afebrile, no acute distress.",
+    "Medications reviewed and reconciled with the patient.",
+    "Labs drawn this morning, results pending at time of note.",
+    "Patient reports good adherence to the current regimen.",
+    "No new complaints; sleep and appetite are unchanged.",
+    "Denies chest pain, shortness of breath or palpitations.",
+    "Plan discussed with patient who verbalized understanding.",
+]
+
+# (OCR lines as printed on the page, sentence as the LLM quotes it)
+PLANTED = [
+    (["Assessment: Type 2 diabetes mellitus", "without complications, A1c 7.1%."],
+     "Type 2 diabetes mellitus without complications"),
+    (["History of essential hypertension, BP 142/88 today."],
+     "history of essential (primary) hypertension"),
+    (["Hyperlipidemia, on atorvastatin 40 mg daily."],
+     "Hyperlipidemia on atorvastatin"),
+    (["Chronic kidney disease stage 3,", "eGFR 48, stable compared to prior."],
+     "Chronic kidney disease stage 3, eGFR 48"),
+    (["Paroxysmal atrial fibrillation, rate controlled on metoprolol."],
+     "paroxysmal atrial fibrillation - rate controlled"),
+]
+
+
+# lines that look like evidence but are not, and sentences (absent from
+# the document) that must not be grounded on them
+DISTRACTORS = [
+    "Diagnosis: Hypertension",
+    "Type of visit: Diagnosis: Hypertension",
+    "Assessment: atrial rhythm regular on exam.",
+]
+ABSENT = [
+    "Diagnosis: Type 2 myocardial infarction",  # vs. "Type of visit: Diagnosis: Hypertension"
+    "Diagnosis: Major depressive disorder",
+    "Assessment: atrial flutter",
+    "History of chronic obstructive pulmonary disease",
+]
+
+
+def synthetic_document(pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    rows = []
+    expected = []  # (sentence, first line index, last line index exclusive)
+    for page in range(1, pages + 1):
+        lines = [rng.choice(FILLER) for _ in range(LINES_PER_PAGE)]
+        for text in DISTRACTORS:  # before the planted sentences, which may overwrite them
+            lines[rng.randrange(0, LINES_PER_PAGE)] = text
+        for ocr_lines, sentence in PLANTED:
+            at = rng.randrange(0, LINES_PER_PAGE - len(ocr_lines))
+            lines[at:at + len(ocr_lines)] = ocr_lines
+            base = len(rows)
+            expected.append((sentence, base + at, base + at + len(ocr_lines)))
+        for i, text in enumerate(lines):
+            y = 20 + i * 2.0
+            rows.append((page, text, (40, y, 560, y + 1.8)))
+    return ChunkTable.from_lines("bench", "bench.pdf", rows), expected
+
+
+def main(page_counts) -> int:
+    print(f"{'pages':>6} {'lines':>7} {'icds':>5} {'build ms':>9} {'align ms':>9} {'ms/icd':>7} "
+          f"{'hit':>5} {'conf':>5} {'false':>6}")
+    false_matches = 0
+    for pages in page_counts:
+        table, expected = synthetic_document(pages)
+
+        started = time.perf_counter()
+        aligner = SentenceAligner(table)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        sentences = [s for s, _, _ in expected]
+        started = time.perf_counter()
+        results = aligner.align_all(sentences)
+        align_ms = (time.perf_counter() - started) * 1000
+
+        # a planted sentence occurs once per page; any page's copy counts
+        hits = 0
+        confidences = []
+        for (sentence, _, _), r in zip(expected, results):
+            if r is None:
+                continue
+            confidences.append(r.confidence)
+            spans = [(s, e) for q, s, e in expected if q == sentence]
+            if any(r.start < e and s < r.end for s, e in spans):
+                hits += 1
+
+        wrong = [(s, r.text, r.confidence) for s, r in zip(ABSENT, aligner.align_all(ABSENT)) if r is not None]
+        for sentence, text, confidence in wrong:
+            print(f"  false match: {sentence!r} -> {text!r} ({confidence})")
+        false_matches += len(wrong)
+
+        n = len(expected)
+        avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
+        print(
+            f"{pages:>6} {len(table):>7} {n:>5} {build_ms:>9.1f} {align_ms:>9.1f} "
+            f"{align_ms / n:>7.3f} {hits / n:>5.0%} {avg_conf:>5.2f} {len(wrong):>3}/{len(ABSENT)}"
+        )
+    return false_matches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20])
+    args = parser.parse_args()
+    sys.exit(1 if main(args.pages) else 0)
@@ -0,0 +1,85 @@
+"""
+Wall-clock ICD extraction time vs. document length: single call vs. map-reduce.
+
+Runs fully offline against scripts/fake_llm_server.py. From
+OCR_ICD_Case_Study/:
+
+    python scripts/fake_llm_server.py --port 8200 &
+    python -m scripts.bench_icd_extraction --lines 100 1000 5000 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# Must be set before backend.config is imported
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:8200/v1")
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+os.environ["USE_MOCK_LLM"] = "false"
+
+from backend.chunk_table import ChunkTable  # noqa: E402
+from backend import llm_client  # noqa: E402
+
+FILLER = [
+    "Patient seen in clinic today for routine follow-up.",
+    "Vital signs stable, afebrile, no acute distress.",
+    "Medications reviewed and reconciled with the patient.",
+    "Labs drawn this morning, results pending at time of note.",
+    "Patient reports good adherence to the current regimen.",
+    "No new complaints; sleep and appetite are unchanged.",
+]
+FINDINGS = [
+    "Assessment: Type 2 diabetes, A1c 7.9%, continue metformin.",
+    "History of hypertension, BP 142/88 today.",
+    "Hyperlipidemia on atorvastatin 40 mg daily.",
+    "Chronic kidney disease stage 3, eGFR 48.",
+    "Paroxysmal atrial fibrillation, rate controlled.",
+]
+
+
+def synthetic_chunks(n_lines: int, seed: int = 0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_lines):
+        text = rng.choice(FINDINGS) if rng.random() < 0.01 else rng.choice(FILLER)
+        page = i // 50 + 1
+        y = (i % 50) * 0.2 + 0.5
+        rows.append((page, text, (1, y, 7.5, y + 0.18)))
+    return ChunkTable.from_lines("bench", "bench.pdf", rows)
+
+
+async def _time(coro):
+    started = time.perf_counter()
+    try:
+        result = await coro
+        return time.perf_counter() - started, len(result), None
+    except Exception as e:  # e.g. context_length_exceeded on the single-call path
+        return time.perf_counter() - started, 0, type(e).__name__
+
+
+async def main(sizes, window_tokens: int, concurrency: int) -> None:
+    print(f"window={window_tokens} tokens, concurrency={concurrency}\n")
+    print(f"{'lines':>7} {'tokens':>8} {'windows':>8} {'single s':>10} {'icds':>5} {'chunked s':>10} {'icds':>5}")
+    for n in sizes:
+        table = synthetic_chunks(n)
+        tokens = sum(llm_client.estimate_tokens(t) for t in table.texts())
+        windows = len(llm_client.split_into_windows(table, window_tokens, 3))
+
+        single_s, single_n, single_err = await _time(llm_client.extract_icd_with_llm(table.full_text()))
+        chunked_s, chunked_n, _ = await _time(
+            llm_client.extract_icd_chunked(table, max_tokens=window_tokens, concurrency=concurrency)
+        )
+
+        single_col = f"{single_s:>10.2f}" if not single_err else f"{'error':>10}"
+        print(f"{n:>7} {tokens:>8} {windows:>8} {single_col} {single_n:>5} {chunked_s:>10.2f} {chunked_n:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[100, 500, 1000, 5000, 10000])
+    parser.add_argument("--window-tokens", type=int, default=llm_client.ICD_WINDOW_TOKENS)
+    parser.add_argument("--concurrency", type=int, default=llm_client.ICD_MAX_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(main(args.lines, args.window_tokens, args.concurrency))
@@ -0,0 +1,150 @@
+"""
+Micro-benchmark of OCR post-processing (Azure analyzeResult → lines).
+
+Compares the old per-line Python polygon → bbox loop with the vectorized
+parse in backend/ocr_layout.py (which also builds word / paragraph
+groupings). Pass a recorded Azure response with --fixture; without one a
+synthetic 100-page response in the same shape is generated once under
+.cache/. From OCR_ICD_Case_Study/:
+
+    python -m scripts.bench_ocr_parse --fixture recorded_analyze_result.json
+    python -m scripts.bench_ocr_parse --pages 100
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from backend.ocr_layout import parse_analyze_result, polygons_to_bboxes
+
+LINES_PER_PAGE = 60
+WORDS = "patient history assessment plan diabetes mellitus hypertension stable follow up today labs".split()
+
+
+def synthetic_analyze_result(pages: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    content_parts = []
+    offset = 0
+    result_pages = []
+    paragraphs = []
+    for page in range(1, pages + 1):
+        lines, words = [], []
+        paragraph_start = offset
+        paragraph_lines = []
+        for i in range(LINES_PER_PAGE):
+            y = 0.5 + i * 0.17
+            line_words = [rng.choice(WORDS) for _ in range(rng.randint(4, 12))]
+            line_offset = offset
+            x = 0.6
+            for w in line_words:
+                width = 0.07 * len(w)
+                # slightly skewed quadrilaterals, as Azure returns them
+                words.append({
+                    "content": w,
+                    "polygon": [x, y, x + width, y + 0.01, x + width, y + 0.15, x, y + 0.14],
+                    "confidence": 0.99,
+                    "span": {"offset": offset, "length": len(w)},
+                })
+                offset += len(w) + 1
+                x += width + 0.05
+            text = " ".join(line_words)
+            content_parts.append(text)
+            lines.append({
+                "content": text,
+                "polygon": [0.6, y, x, y + 0.01, x, y + 0.15, 0.6, y + 0.14],
+                "spans": [{"offset": line_offset, "length": len(text)}],
+            })
+            paragraph_lines.append(text)
+            # a paragraph every 6 lines
+            if len(paragraph_lines) == 6:
+                paragraphs.append({
+                    "content": " ".join(paragraph_lines),
+                    "boundingRegions": [{"pageNumber": page, "polygon": [0.6, y - 0.85, 7.9, y - 0.85, 7.9, y + 0.15, 0.6, y + 0.15]}],
+                    "spans": [{"offset": paragraph_start, "length": offset - 1 - paragraph_start}],
+                })
+                paragraph_start = offset
+                paragraph_lines = []
+        result_pages.append({
+            "pageNumber": page, "width": 8.5, "height": 11, "unit": "inch",
+            "words": words, "lines": lines,
+        })
+    return {"content": "\n".join(content_parts), "pages": result_pages, "paragraphs": paragraphs}
+
+
+def legacy_parse(result: dict):
+    """The pre-vectorization loop: Python lists per polygon, one line at a time."""
+    rows = []
+    for page in sorted(result.get("pages", []), key=lambda p: p.get("pageNumber", 1)):
+        width, height = page.get("width"), page.get("height")
+        for line in page.get("lines", []):
+            polygon = line.get("polygon", [])
+            if polygon:
+                xs = [polygon[i] for i in range(0, len(polygon), 2)]
+                ys = [polygon[i] for i in range(1, len(polygon), 2)]
+                bbox = (min(xs), min(ys), max(xs), max(ys))
+            else:
+                bbox = (0, 0, width, height)
+            rows.append((page.get("pageNumber", 1), line.get("content", ""), bbox))
+    return rows
+
+
+def load_fixture(path: str, pages: int) -> dict:
+    if path:
+        with open(path) as f:
+            data = json.load(f)
+        return data.get("analyzeResult", data)
+
+    cached = os.path.join(".cache", f"azure_analyze_result_{pages}p.json")
+    if not os.path.exists(cached):
+        os.makedirs(".cache", exist_ok=True)
+        with open(cached, "w") as f:
+            json.dump(synthetic_analyze_result(pages), f)
+    with open(cached) as f:
+        return json.load(f)
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(fixture: str, pages: int, repeat: int) -> None:
+    result = load_fixture(fixture, pages)
+    n_pages = len(result.get("pages", []))
+    n_lines = sum(len(p.get("lines", [])) for p in result.get("pages", []))
+    n_words = sum(len(p.get("words", [])) for p in result.get("pages", []))
+
+    legacy_s = _best_of(lambda: legacy_parse(result), repeat)
+    lines_s = _best_of(lambda: [
+        polygons_to_bboxes([line.get("polygon") or () for line in p.get("lines", [])], (0, 0, p.get("width") or 0, p.get("height") or 0))
+        for p in result.get("pages", [])
+    ], repeat)
+    vector_s = _best_of(lambda: parse_analyze_result("bench", "bench.pdf", result), repeat)
+
+    table, _ = parse_analyze_result("bench", "bench.pdf", result)
+    legacy = legacy_parse(result)
+    max_err = max(
+        (abs(a - b) for i, (_, _, bbox) in enumerate(legacy) for a, b in zip(bbox, table.bbox(i))),
+        default=0.0,
+    )
+
+    print(f"pages={n_pages} lines={n_lines} words={n_words} paragraphs={len(result.get('paragraphs', []))}")
+    print(f"legacy per-line loop (line bboxes):       {legacy_s * 1000:8.1f} ms")
+    print(f"vectorized per page (line bboxes):        {lines_s * 1000:8.1f} ms")
+    print(f"vectorized (lines + words + paragraphs):  {vector_s * 1000:8.1f} ms")
+    print(f"max |bbox diff| vs legacy: {max_err:.2e} (float32 storage)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default="", help="recorded Azure analyze response (JSON)")
+    parser.add_argument("--pages", type=int, default=100, help="synthetic fixture size when --fixture is not given")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.fixture, args.pages, args.repeat)
@@ -0,0 +1,89 @@
+"""
+Throughput benchmark: N concurrent uploads against a running backend.
+
+While the uploads are in flight a probe loop keeps hitting a cheap
+endpoint; if OCR blocked the event loop the probe latency would climb to
+the OCR latency. Start the Azure stub and the backend first (see
+scripts/azure_ocr_stub.py), then:
+
+    python scripts/bench_upload.py --uploads 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# 1x1 white PNG, enough for OCR + preview to run end to end
+SAMPLE_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de"
+    "0000000c49444154789c63f8ffff3f0005fe02fe0def46b80000000049454e44ae426082"
+)
+
+
+async def _upload(client: httpx.AsyncClient, base: str, i: int):
+    """Returns (enqueue latency, time until the job finished)."""
+    started = time.perf_counter()
+    files = {"file": (f"bench-{i}.png", SAMPLE_PNG, "image/png")}
+    resp = await client.post(f"{base}/upload", files=files)
+    resp.raise_for_status()
+    enqueued = time.perf_counter() - started
+
+    doc_id = resp.json()["doc_id"]
+    while True:
+        job = (await client.get(f"{base}/jobs/{doc_id}")).json()
+        if job.get("status") in ("succeeded", "failed"):
+            break
+        await asyncio.sleep(0.2)
+    return enqueued, time.perf_counter() - started
+
+
+async def _probe(client: httpx.AsyncClient, base: str, stop: asyncio.Event, samples: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(f"{base}/doc/does-not-exist")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+
+
+def _pct(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def main(base: str, uploads: int) -> None:
+    limits = httpx.Limits(max_connections=uploads + 4)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        stop = asyncio.Event()
+        probe_samples: list = []
+        probe = asyncio.create_task(_probe(client, base, stop, probe_samples))
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_upload(client, base, i) for i in range(uploads)))
+        wall = time.perf_counter() - started
+
+        stop.set()
+        await probe
+
+    print(f"uploads:           {uploads}")
+    print(f"wall clock:        {wall:.2f}s")
+    print(f"throughput:        {uploads / wall:.2f} uploads/s")
+    enqueue = [r[0] for r in results]
+    done = [r[1] for r in results]
+    print(f"enqueue p50 / p99: {_pct(enqueue, 0.5) * 1000:.1f}ms / {_pct(enqueue, 0.99) * 1000:.1f}ms")
+    print(f"done    p50 / p99: {_pct(done, 0.5):.2f}s / {_pct(done, 0.99):.2f}s")
+    if probe_samples:
+        print(
+            f"probe p50 / max:   {statistics.median(probe_samples) * 1000:.1f}ms / "
+            f"{max(probe_samples) * 1000:.1f}ms  ({len(probe_samples)} samples)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://127.0.0.1:8000")
+    parser.add_argument("--uploads", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.base, args.uploads))
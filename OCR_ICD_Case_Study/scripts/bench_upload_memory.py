@@ -0,0 +1,105 @@
+"""
+Peak RSS of the backend worker under N concurrent large uploads (Linux).
+
+Samples /proc/<pid>/status (VmRSS, RssAnon) of the uvicorn process
+every 10 ms while the uploads are sent and their jobs run, and reports
+the peak growth over the idle baseline, total and per in-flight request.
+
+Exits non-zero when the peak RssAnon growth per request exceeds
+--max-growth-x times the upload size. RssAnon is the heap: it leaves
+out the mmap'ed spool files, which are page cache. Reading each body
+into bytes (the pre-spool handler) grew it by 1.6-1.8x the upload; a
+spooled upload by 1-1.2x, almost all of it the source blob kept per
+document (the memory doc store holds one, the sqlite store copies one
+while writing it). Run it against a freshly started worker: freed heap
+is reused, not returned, so a second run starts from a raised baseline
+and under-reports. Start the Azure stub and the backend first (see
+scripts/azure_ocr_stub.py), then:
+
+    python scripts/bench_upload_memory.py --pid $(pgrep -f "uvicorn backend.app") --uploads 20 --size-mb 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+
+def _rss_bytes(pid: int) -> dict:
+    rss = {"VmRSS": 0, "RssAnon": 0}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key = line.split(":", 1)[0]
+            if key in rss:
+                rss[key] = int(line.split()[1]) * 1024
+    return rss
+
+
+def _payload(size_mb: int) -> bytes:
+    # PDF magic + random body: incompressible, sized like a scanned chart
+    return b"%PDF-1.7\n" + os.urandom(size_mb * 1024 * 1024)
+
+
+async def _upload(client: httpx.AsyncClient, base: str, i: int, payload: bytes) -> str:
+    files = {"file": (f"scan-{i}.pdf", payload, "application/pdf")}
+    resp = await client.post(f"{base}/upload", files=files)
+    if resp.status_code == 413:
+        return "rejected"
+    resp.raise_for_status()
+    doc_id = resp.json()["doc_id"]
+    while True:
+        job = (await client.get(f"{base}/jobs/{doc_id}")).json()
+        if job.get("status") in ("succeeded", "failed"):
+            return job["status"]
+        await asyncio.sleep(0.2)
+
+
+async def _sample(pid: int, stop: asyncio.Event, peak: dict) -> None:
+    while not stop.is_set():
+        for key, value in _rss_bytes(pid).items():
+            peak[key] = max(peak[key], value)
+        await asyncio.sleep(0.01)
+
+
+async def main(base: str, pid: int, uploads: int, size_mb: int, max_growth_x: float) -> None:
+    payload = _payload(size_mb)
+    baseline = _rss_bytes(pid)
+    peak = dict(baseline)
+
+    limits = httpx.Limits(max_connections=uploads + 2)
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample(pid, stop, peak))
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(_upload(client, base, i, payload) for i in range(uploads)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    mb = 1024 * 1024
+    print(f"uploads: {uploads} x {size_mb} MB in {elapsed:.1f}s  ({', '.join(f'{s}={statuses.count(s)}' for s in sorted(set(statuses)))})")
+    for key in ("VmRSS", "RssAnon"):
+        growth = peak[key] - baseline[key]
+        print(f"{key:<8} baseline {baseline[key] / mb:.0f} MB, peak {peak[key] / mb:.0f} MB, "
+              f"growth {growth / mb:.0f} MB total, {growth / mb / uploads:.1f} MB per request "
+              f"({growth / uploads / (size_mb * mb):.2f}x upload size)")
+    growth = peak["RssAnon"] - baseline["RssAnon"]
+    limit = max_growth_x * size_mb * mb * uploads
+    if growth > limit:
+        sys.exit(f"FAIL: peak RssAnon growth {growth / mb:.0f} MB > {limit / mb:.0f} MB "
+                 f"({max_growth_x}x upload size per request)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://127.0.0.1:8000")
+    parser.add_argument("--pid", type=int, required=True, help="pid of the uvicorn worker to watch")
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--max-growth-x", type=float, default=1.5,
+                        help="fail above this peak RssAnon growth per request, in upload sizes")
+    args = parser.parse_args()
+    asyncio.run(main(args.base, args.pid, args.uploads, args.size_mb, args.max_growth_x))
@@ -0,0 +1,60 @@
+"""
+Invariant check for llm_client.split_into_windows (no LLM needed).
+
+For random documents, budgets and overlaps, every window must:
+  - stay within max_tokens, unless it is a single over-long line,
+  - start after the previous window and end after it (no window is a
+    re-grown copy of the one before),
+  - together with the others cover every line, in order.
+Exits non-zero on the first violation. From OCR_ICD_Case_Study/:
+
+    python -m scripts.check_windows
+"""
+
+import argparse
+import random
+import sys
+
+from backend.chunk_table import ChunkTable
+from backend.llm_client import estimate_tokens, split_into_windows
+
+
+def _table(texts):
+    return ChunkTable.from_lines("check", "check.pdf", [(1, t, (0, 0, 1, 1)) for t in texts])
+
+
+def check(texts, max_tokens: int, overlap_lines: int) -> None:
+    tokens = [estimate_tokens(t) for t in texts]
+    windows = split_into_windows(_table(texts), max_tokens, overlap_lines)
+    where = f"max_tokens={max_tokens} overlap={overlap_lines} tokens={tokens} windows={windows}"
+
+    assert windows[0][0] == 0 and windows[-1][1] == len(texts), f"lines not covered: {where}"
+    for (prev_start, prev_end), (start, end) in zip(windows, windows[1:]):
+        assert prev_start < start <= prev_end < end, f"window does not advance: {where}"
+        assert prev_end - start <= overlap_lines, f"overlap too long: {where}"
+    for start, end in windows:
+        assert end > start, f"empty window: {where}"
+        if end - start > 1:
+            assert sum(tokens[start:end]) <= max_tokens, f"window over budget: {where}"
+
+
+def main(cases: int, seed: int) -> None:
+    # the reported regression: 12 lines of 11 tokens, budget 25, overlap 3
+    check(["x" * 40] * 12, 25, 3)
+
+    rng = random.Random(seed)
+    for _ in range(cases):
+        texts = ["x" * rng.choice([0, 10, 40, 120, 400]) for _ in range(rng.randint(1, 60))]
+        check(texts, rng.choice([5, 25, 60, 200]), rng.randint(0, 6))
+    print(f"ok: {cases + 1} documents")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        main(args.cases, args.seed)
+    except AssertionError as e:
+        sys.exit(f"FAIL: {e}")
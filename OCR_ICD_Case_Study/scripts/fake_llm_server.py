@@ -0,0 +1,196 @@
+"""
+Local fake of the OpenAI chat completions and embeddings endpoints for
+offline tests of the ICD backend and the RAG chat apps.
+
+POST /v1/chat/completions sleeps for a latency that grows with the prompt
+size, like a real model, then answers:
+  - JSON mode (response_format json_object, as the ICD extractor asks):
+    a `{"icds": [...]}` body built by keyword-matching the clinical text,
+  - otherwise: a prose answer of --answer-tokens words, generated at
+    --per-token seconds per word.
+With "stream": true the answer is sent as chat.completion.chunk SSE
+events, word by word as it is generated, so time-to-first-token and
+total time can be told apart; unstreamed, it is sent when complete. Prompts over --context-tokens are rejected
+with the same 400 error OpenAI returns.
+
+POST /v1/embeddings returns deterministic unit vectors (a hash of the
+text), 1536-d unless `dimensions` is given.
+
+    python scripts/fake_llm_server.py --port 8200
+    OPENAI_BASE_URL=http://127.0.0.1:8200/v1 OPENAI_API_KEY=fake ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake OpenAI chat completions")
+
+BASE_LATENCY_S = 0.3
+PER_1K_TOKENS_S = 0.4
+CONTEXT_TOKENS = 16000
+PER_TOKEN_S = 0.02
+ANSWER_TOKENS = 150
+EMBEDDING_DIM = 1536
+
+# keyword (lowercase) -> (code, description)
+KNOWN_CONDITIONS = {
+    "type 2 diabetes": ("E11.9", "Type 2 diabetes mellitus without complications"),
+    "hypertension": ("I10", "Essential (primary) hypertension"),
+    "hyperlipidemia": ("E78.5", "Hyperlipidemia, unspecified"),
+    "asthma": ("J45.909", "Unspecified asthma, uncomplicated"),
+    "atrial fibrillation": ("I48.91", "Unspecified atrial fibrillation"),
+    "chronic kidney disease": ("N18.9", "Chronic kidney disease, unspecified"),
+    "copd": ("J44.9", "Chronic obstructive pulmonary disease, unspecified"),
+    "major depressive disorder": ("F32.9", "Major depressive disorder, single episode, unspecified"),
+}
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _extract(text: str) -> list:
+    icds = {}
+    for line in text.splitlines():
+        lower = line.lower()
+        for keyword, (code, description) in KNOWN_CONDITIONS.items():
+            if keyword in lower and code not in icds:
+                icds[code] = {
+                    "icd_code": code,
+                    "icd_description": description,
+                    "supporting_sentence": line.strip(),
+                }
+    return list(icds.values())
+
+
+def _answer(prompt: str) -> str:
+    words = prompt.split()[-20:] or ["context"]
+    return " ".join(words[i % len(words)] for i in range(ANSWER_TOKENS))
+
+
+def _embedding(text: str, dim: int) -> list:
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    v = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+    return [x / norm for x in v]
+
+
+async def _stream_chunks(completion_id: str, model: str, content: str, per_token_s: float):
+    def chunk(delta: dict, finish_reason=None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }) + "\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    for i, word in enumerate(content.split(" ")):
+        if i:
+            await asyncio.sleep(per_token_s)
+        yield chunk({"content": word if i == 0 else " " + word})
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dim = int(body.get("dimensions") or EMBEDDING_DIM)
+    tokens = sum(_estimate_tokens(t) for t in inputs)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": _embedding(text, dim)}
+            for i, text in enumerate(inputs)
+        ],
+        "model": body.get("model", "fake"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = "\n".join(m.get("content", "") for m in body.get("messages", []) if isinstance(m.get("content"), str))
+    prompt_tokens = _estimate_tokens(prompt)
+
+    if prompt_tokens > CONTEXT_TOKENS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error": {
+                    "message": f"This model's maximum context length is {CONTEXT_TOKENS} tokens. "
+                    f"However, your messages resulted in {prompt_tokens} tokens.",
+                    "type": "invalid_request_error",
+                    "code": "context_length_exceeded",
+                }
+            },
+        )
+
+    await asyncio.sleep(BASE_LATENCY_S + PER_1K_TOKENS_S * prompt_tokens / 1000)
+
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        content, per_token_s = json.dumps({"icds": _extract(prompt)}), 0.0
+    else:
+        content, per_token_s = _answer(prompt), PER_TOKEN_S
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream_chunks(completion_id, body.get("model", "fake"), content, per_token_s),
+            media_type="text/event-stream",
+        )
+    # the whole answer is generated before a non-streamed response is sent
+    await asyncio.sleep(per_token_s * (len(content.split(" ")) - 1))
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _estimate_tokens(content),
+            "total_tokens": prompt_tokens + _estimate_tokens(content),
+        },
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--base-latency", type=float, default=BASE_LATENCY_S)
+    parser.add_argument("--per-1k-tokens", type=float, default=PER_1K_TOKENS_S)
+    parser.add_argument("--context-tokens", type=int, default=CONTEXT_TOKENS)
+    parser.add_argument("--per-token", type=float, default=PER_TOKEN_S, help="seconds between streamed words")
+    parser.add_argument("--answer-tokens", type=int, default=ANSWER_TOKENS, help="words in a prose answer")
+    args = parser.parse_args()
+
+    BASE_LATENCY_S = args.base_latency
+    PER_1K_TOKENS_S = args.per_1k_tokens
+    CONTEXT_TOKENS = args.context_tokens
+    PER_TOKEN_S = args.per_token
+    ANSWER_TOKENS = args.answer_tokens
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -5,20 +5,23 @@
 
 
 from fastapi import FastAPI, Request, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from supabase import create_client, Client
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub import PubNub
-from openai import OpenAI
 import os
 import json
+import asyncio
 import base64
 import logging
 import tempfile
+import time
 
-from supabase_lib import query_rag_content
+from llm_gateway import get_gateway
+from embedding_cache import embed_cached, get_embedding_cache
+from rag_backend import group_batch_rows
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -46,9 +49,13 @@ pnconfig.subscribe_key = pubnub_subscribe_key
 pnconfig.user_id = "server-instance"
 pubnub_client = PubNub(pnconfig)
 
-# OpenAI client
-openai_api_key = os.environ.get("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
+# Shared async OpenAI gateway (pooled client, concurrency limit, retries)
+llm = get_gateway()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await llm.aclose()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -61,6 +68,12 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/api/llm/stats")
+async def llm_stats():
+    """Per-operation call / retry / latency / token counters of the LLM gateway (+ embedding cache)."""
+    return {**llm.stats(), "embedding_cache": get_embedding_cache().stats()}
+
+
 @app.get("/api/message")
 async def get_message():
     """Returns backend message as HTML fragment"""
@@ -127,10 +140,47 @@ async def chat_page(request: Request):
     return templates.TemplateResponse("chat.html", {"request": request})
 
 
+def _sse(event: str, data) -> str:
+    """One Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_chat(messages, rag_results, started):
+    """
+    SSE body of a streamed /api/chat: `rag_results` first, then one `token`
+    event per answer delta, then `done` with the full response and timings
+    (ms since the request arrived), or `error`.
+    """
+    yield _sse("rag_results", {"rag_results": rag_results})
+    response, first_token_ms = [], None
+    tokens = llm.chat_stream(model="gpt-4", messages=messages, max_tokens=300, temperature=0)
+    try:
+        async for token in tokens:
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+            response.append(token)
+            yield _sse("token", {"text": token})
+    except Exception as e:
+        yield _sse("error", {"error": f"Error communicating with OpenAI: {str(e)}"})
+        return
+    finally:
+        await tokens.aclose()
+    yield _sse("done", {
+        "response": "".join(response),
+        "first_token_ms": first_token_ms,
+        "total_ms": (time.perf_counter() - started) * 1000,
+    })
+
+
 @app.post("/api/chat")
 async def chat(request: Request):
-    """Handle chat messages with OpenAI and RAG"""
-    if not openai_client:
+    """
+    Handle chat messages with OpenAI and RAG.
+    With "stream": true in the body (or Accept: text/event-stream) the answer
+    is sent as Server-Sent Events: rag_results first, then tokens as they arrive.
+    """
+    started = time.perf_counter()
+    if not llm.configured:
         return {
             "error": "OpenAI API key not configured. Please add OPENAI_API_KEY to your .env file."
         }
@@ -142,22 +192,21 @@ async def chat(request: Request):
         if not user_message:
             return {"error": "No message provided"}
 
-        # Generate embedding for the user message
-        embedding_response = openai_client.embeddings.create(
-            input=user_message,
-            model='text-embedding-3-small'
-        )
-        query_embedding = embedding_response.data[0].embedding
+        # Generate embedding for the user message (repeated questions hit the embedding cache)
+        query_embedding = (await embed_cached(llm, [user_message], 'text-embedding-3-small'))[0]
 
         # Query rag_content table with cosine distance to get top 10 results
-        rag_results = supabase.rpc(
-            'match_documents_by_document_type',
-            {
-                'query_embedding': query_embedding,
-                'match_count': 10,
-                'query_document_type': 'job'
-            }
-        ).execute()
+        # blocking HTTP round trip: off the event loop, so open SSE streams keep flowing
+        rag_results = await asyncio.to_thread(
+            supabase.rpc(
+                'match_documents_by_document_type',
+                {
+                    'query_embedding': query_embedding,
+                    'match_count': 10,
+                    'query_document_type': 'job'
+                }
+            ).execute
+        )
 
         # Extract context from RAG results
         context_items = []
@@ -170,13 +219,25 @@ async def chat(request: Request):
         # Build context string
         rag_context = "\n\n".join(context_items) if context_items else "No relevant context found."
 
+        messages = [
+            {"role": "system", "content": f"You are a senior data engineer who has mastered data engineering. Use the following context to answer questions:\n\n{rag_context}"},
+            {"role": "user", "content": user_message}
+        ]
+
+        stream = body.get("stream")
+        if stream is None:
+            stream = "text/event-stream" in request.headers.get("accept", "")
+        if stream:
+            return StreamingResponse(
+                _stream_chat(messages, rag_results.data if rag_results.data else [], started),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
         # Call OpenAI API with RAG context
-        completion = openai_client.chat.completions.create(
+        completion = await llm.chat(
             model="gpt-4",
-            messages=[
-                {"role": "system", "content": f"You are a senior data engineer who has mastered data engineering. Use the following context to answer questions:\n\n{rag_context}"},
-                {"role": "user", "content": user_message}
-            ],
+            messages=messages,
             max_tokens=300,
             temperature=0
         )
@@ -207,7 +268,7 @@ async def resume_with_matching_page(request: Request):
 @app.post('/api/parse-resume-with-matching')
 async def parse_resume_with_matching(request: Request):
     """Parse HTML resume/LinkedIn profile using OpenAI"""
-    if not openai_client:
+    if not llm.configured:
         return {
             "error": "OpenAI API key not configured. Please add OPENAI_API_KEY to your .env file."
         }
@@ -272,7 +333,7 @@ Format the output as clean JSON"""
 
         print('user prompt is', user_prompt)
         # Call OpenAI API
-        completion = openai_client.chat.completions.create(
+        completion = await llm.chat(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -363,24 +424,23 @@ Format the output as clean JSON"""
         )
 
         parsed_resume = completion.choices[0].message.tool_calls[0].function.arguments
-        embedding_response = openai_client.embeddings.create(
-            input=parsed_resume,
-            model='text-embedding-3-small'
-        )
+        embedding_response = await llm.embed(parsed_resume, model='text-embedding-3-small')
         query_embedding = embedding_response.data[0].embedding
 
-        jobs = query_rag_content(query_embedding, 10, 'job')
-        profile = query_rag_content(query_embedding, 10, 'profile')
+        # jobs and profiles for the same embedding in one round trip
+        [[jobs, profile]] = await asyncio.to_thread(
+            query_rag_content_batch, [query_embedding], [['job'], ['profile']], 10
+        )
 
         job_items = []
-        if jobs.data:
-            for item in jobs.data:
+        if jobs:
+            for item in jobs:
                 if item['similarity'] > .3:
                     job_items.append(item.get('context', ''))
 
         profile_items = []
-        if profile.data:
-            for item in profile.data:
+        if profile:
+            for item in profile:
                 if item['similarity'] > .3:
                     profile_items.append(item.get('context', ''))
 
@@ -394,6 +454,93 @@ Format the output as clean JSON"""
 
 
 
+MAX_RESUME_BYTES = 10 * 1024 * 1024
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+
+async def _spool_upload(file: UploadFile, max_bytes: int):
+    """Stream an upload into a SpooledTemporaryFile (RAM up to 1 MB, disk beyond).
+
+    Returns (spool, size), or (None, size) once the upload passes max_bytes.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    while True:
+        chunk = await file.read(1024 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            return None, size
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, size
+
+
+async def _parse_resume_file(spool, filename, content_type):
+    """Parse a spooled PDF/image resume; PDFs are streamed to the Files API."""
+    # 🔹 Handle PDF upload
+    if content_type in ["application/pdf", "application/x-pdf"]:
+        # Upload PDF to OpenAI Files API straight from the spool (streamed, no temp copy)
+        uploaded_file = await llm.upload_file(file=(filename or "resume.pdf", spool), purpose="assistants")
+
+        file_id = uploaded_file.id
+        logger.info("Uploaded PDF to OpenAI, file_id: %s", file_id)
+
+        # Call Completions API with file ID
+        completion = await llm.chat(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a resume parser that extracts structured information from PDF resumes."},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Extract and format this resume into JSON:"},
+                        {"type": "file", "file": {"file_id": file_id}}
+                    ]
+                }
+            ],
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+
+        logger.info("Model raw response: %s", completion)
+        parsed_resume = completion.choices[0].message.content
+        insert_resume(json.loads(parsed_resume))
+        return {"parsed_resume": parsed_resume}
+
+    # 🔹 Handle image upload
+    elif content_type and content_type.startswith("image/"):
+        # base64 needs the whole image: encode from the in-memory buffer / disk file once
+        base64_image = base64.b64encode(spool.read()).decode("ascii")
+        image_url = f"data:{content_type};base64,{base64_image}"
+
+        completion = await llm.chat(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a resume parser that extracts structured information from images of resumes."},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Extract and format this resume into JSON:"},
+                        {"type": "image_url", "image_url": {"url": image_url}}
+                    ]
+                }
+            ],
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+
+        logger.info("Model raw response: %s", completion)
+        parsed_resume = completion.choices[0].message.content
+        insert_resume(json.loads(parsed_resume))
+        return {"parsed_resume": parsed_resume}
+
+    else:
+        return {"error": f"Unsupported file type: {content_type}"}
+
+
 @app.post("/api/parse-resume")
 async def parse_resume(request: Request, file: UploadFile = File(None)):
     """
@@ -402,7 +549,7 @@ async def parse_resume(request: Request, file: UploadFile = File(None)):
     - PDF: uploaded via Files API
     - Image: base64 encoded and passed to chat model
     """
-    if not openai_client:
+    if not llm.configured:
         return {"error": "OpenAI API key not configured. Please add OPENAI_API_KEY to your .env file."}
 
     try:
@@ -412,85 +559,19 @@ async def parse_resume(request: Request, file: UploadFile = File(None)):
         if file:
             logger.info("Uploaded file type: %s", content_type)
 
-            # ✅ Change 1: Read file once at the top to avoid re-reading later
-            contents = await file.read()
-
-            # ✅ Change 2: Global file size check (applies to PDF & images)
-            max_size_mb = 10
-            if len(contents) > max_size_mb * 1024 * 1024:
-                return {"error": f"File exceeds {max_size_mb}MB limit"}
+            # Stream to a spooled temp file; stop reading once over the limit (applies to PDF & images)
+            spool, size = await _spool_upload(file, MAX_RESUME_BYTES)
+            if spool is None:
+                return {"error": f"File exceeds {MAX_RESUME_BYTES // (1024 * 1024)}MB limit"}
 
-            if len(contents) == 0:
+            if size == 0:
+                spool.close()
                 return {"error": "Uploaded file is empty"}
 
-            # 🔹 Handle PDF upload
-            if content_type in ["application/pdf", "application/x-pdf"]:
-                # Upload PDF to OpenAI Files API
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                    tmp_file.write(contents)
-                    pdf_path = tmp_file.name
-
-                try:
-                    uploaded_file = openai_client.files.create(
-                        file=open(pdf_path, "rb"),
-                        purpose="assistants"
-                    )
-                finally:
-                    os.remove(pdf_path)  # ✅ Prevents disk bloat
-
-                file_id = uploaded_file.id
-                logger.info("Uploaded PDF to OpenAI, file_id: %s", file_id)
-
-                # Call Completions API with file ID
-                completion = openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "You are a resume parser that extracts structured information from PDF resumes."},
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": "Extract and format this resume into JSON:"},
-                                {"type": "file", "file": {"file_id": file_id}}
-                            ]
-                        }
-                    ],
-                    temperature=0,
-                    response_format={"type": "json_object"}
-                )
-
-                logger.info("Model raw response: %s", completion)
-                parsed_resume = completion.choices[0].message.content
-                insert_resume(json.loads(parsed_resume))
-                return {"parsed_resume": parsed_resume}
-
-            # 🔹 Handle image upload
-            elif content_type and content_type.startswith("image/"):
-                base64_image = base64.b64encode(contents).decode("utf-8")
-                image_url = f"data:{content_type};base64,{base64_image}"
-
-                completion = openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "You are a resume parser that extracts structured information from images of resumes."},
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": "Extract and format this resume into JSON:"},
-                                {"type": "image_url", "image_url": {"url": image_url}}
-                            ]
-                        }
-                    ],
-                    temperature=0,
-                    response_format={"type": "json_object"}
-                )
-
-                logger.info("Model raw response: %s", completion)
-                parsed_resume = completion.choices[0].message.content
-                insert_resume(json.loads(parsed_resume))
-                return {"parsed_resume": parsed_resume}
-
-            else:
-                return {"error": f"Unsupported file type: {content_type}"}
+            try:
+                return await _parse_resume_file(spool, file.filename, content_type)
+            finally:
+                spool.close()
 
         # 🔹 Handle HTML JSON body as fallback
         body = await request.json()
@@ -501,7 +582,7 @@ async def parse_resume(request: Request, file: UploadFile = File(None)):
         system_prompt = """You are a resume parser. Extract and format key info from LinkedIn/HTML resumes as JSON."""
         user_prompt = f"Please parse and format this resume into JSON:\n\n{html_content}\n\n"
 
-        completion = openai_client.chat.completions.create(
+        completion = await llm.chat(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -551,4 +632,25 @@ def insert_resume(resume_json: dict) -> dict:
 
     except Exception as e:
         print(f"❌ Error inserting resume: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def query_rag_content_batch(query_embeddings, document_type_sets, match_count=10):
+    """
+    Top match_count rag_content rows for every (embedding, document-type set)
+    pair with one match_rag_batch RPC (defined in assignment_2/rag_content.sql).
+    Blocking: call it from async code through asyncio.to_thread.
+
+    Returns:
+        list: result[query][set] → rows (dicts with context, similarity, ...).
+    """
+    response = supabase.rpc(
+        'match_rag_batch',
+        {
+            'query_embeddings': list(query_embeddings),
+            'match_count': match_count,
+            'document_type_sets': document_type_sets
+        }
+    ).execute()
+
+    return group_batch_rows(response.data or [], len(query_embeddings), len(document_type_sets))
@@ -0,0 +1,233 @@
+# answer_cache.py
+# ---------------------------------------------------------
+# Semantic answer cache for /api/chat.
+#
+# A question whose embedding is close enough (cosine similarity >=
+# ANSWER_CACHE_THRESHOLD) to one answered recently, under exactly the
+# same filters (document types, document, chapter, paragraph range,
+# tenant, top_k), gets the stored answer and rag_hits back without a
+# match_rag call or a completion.
+#
+# - per filter scope, a small exact index: the stored question
+#   vectors stacked into one L2-normalized matrix, one
+#   matrix-vector product per lookup;
+# - entries expire after ANSWER_CACHE_TTL_S, and the oldest are
+#   evicted beyond ANSWER_CACHE_MAX_ENTRIES;
+# - each entry records the content version (ingest_manifest.py) of
+#   every document its answer drew on; once load_books.py re-syncs
+#   or removes one of them, the entry is dropped on its next hit.
+#   Versions are re-read at most every ANSWER_CACHE_REFRESH_S, and
+#   only if the manifest file exists (documents it does not track
+#   rely on the TTL alone).
+# stats() reports hit rate and the time hits saved (the retrieval +
+# completion time of the original answer, minus the lookup).
+# ---------------------------------------------------------
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ingest_manifest import INGEST_MANIFEST_PATH, IngestManifest
+
+Scope = Tuple
+
+
+def scope_key(filters: Dict[str, Any]) -> Scope:
+    """Hashable scope of a chat request's metadata filters (document type order does not matter)."""
+    return tuple(
+        (k, tuple(sorted(v)) if isinstance(v, (list, tuple)) else v)
+        for k, v in sorted(filters.items())
+    )
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "query", "answer", "rows", "versions", "created", "cost_s")
+
+    def __init__(self, scope, vector, query, answer, rows, versions, cost_s):
+        self.scope = scope
+        self.vector = vector
+        self.query = query
+        self.answer = answer
+        self.rows = rows
+        self.versions = versions
+        self.created = time.time()
+        self.cost_s = cost_s
+
+
+class _ScopeIndex:
+    """Entries of one filter scope; the stacked matrix is rebuilt lazily after changes."""
+
+    __slots__ = ("entries", "_matrix")
+
+    def __init__(self):
+        self.entries: List[_Entry] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def add(self, entry: _Entry) -> None:
+        self.entries.append(entry)
+        self._matrix = None
+
+    def remove(self, entry: _Entry) -> None:
+        self.entries.remove(entry)
+        self._matrix = None
+
+    def best(self, q: np.ndarray) -> Tuple[Optional[_Entry], float]:
+        if not self.entries:
+            return None, 0.0
+        if self._matrix is None:
+            self._matrix = np.stack([e.vector for e in self.entries])
+        sims = self._matrix @ q
+        i = int(np.argmax(sims))
+        return self.entries[i], float(sims[i])
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_s: float = 3600.0,
+        max_entries: int = 2048,
+        manifest_path: Optional[str] = INGEST_MANIFEST_PATH,
+        refresh_s: float = 5.0,
+    ):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.manifest_path = manifest_path
+        self.refresh_s = refresh_s
+        self._lock = threading.Lock()
+        self._scopes: Dict[Scope, _ScopeIndex] = {}
+        self._order: "OrderedDict[int, _Entry]" = OrderedDict()  # insertion order, for eviction
+        self._versions: Dict[str, str] = {}
+        self._versions_read = float("-inf")
+        self._manifest: Optional[IngestManifest] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+        self.saved_s = 0.0
+        self.lookup_s = 0.0
+
+    # --- document versions ---
+    def _current_versions(self) -> Dict[str, str]:
+        now = time.monotonic()
+        if now - self._versions_read >= self.refresh_s:
+            self._versions_read = now
+            if self._manifest is None and self.manifest_path and os.path.exists(self.manifest_path):
+                self._manifest = IngestManifest(self.manifest_path)
+            if self._manifest is not None:
+                self._versions = self._manifest.versions()
+        return self._versions
+
+    def _versions_of(self, rows: Sequence[dict], filters: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        current = self._current_versions()
+        documents = {r.get("document_id") for r in rows if r.get("document_id")}
+        if filters.get("document_id"):
+            documents.add(filters["document_id"])
+        return {d: current.get(d) for d in documents}
+
+    def _drop(self, entry: _Entry) -> None:
+        self._scopes[entry.scope].remove(entry)
+        if not self._scopes[entry.scope].entries:
+            del self._scopes[entry.scope]
+        self._order.pop(id(entry), None)
+
+    # --- lookups / inserts ---
+    def lookup(self, embedding: Sequence[float], filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The cached answer for a near-duplicate question under the same filters, or None."""
+        started = time.perf_counter()
+        q = np.asarray(embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scope = scope_key(filters)
+        with self._lock:
+            found = None
+            index = self._scopes.get(scope)
+            while index is not None and found is None:
+                entry, similarity = index.best(q)
+                if entry is None or similarity < self.threshold:
+                    break
+                if time.time() - entry.created > self.ttl_s:
+                    self.expired += 1
+                elif any(self._current_versions().get(d) != v for d, v in entry.versions.items()):
+                    self.invalidated += 1
+                else:
+                    found = entry, similarity
+                    break
+                self._drop(entry)
+                index = self._scopes.get(scope)
+
+            elapsed = time.perf_counter() - started
+            self.lookup_s += elapsed
+            if found is None:
+                self.misses += 1
+                return None
+            entry, similarity = found
+            self.hits += 1
+            self.saved_s += max(entry.cost_s - elapsed, 0.0)
+            return {
+                "query": entry.query,
+                "answer": entry.answer,
+                "rag_hits": entry.rows,
+                "similarity": similarity,
+                "age_s": time.time() - entry.created,
+            }
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        filters: Dict[str, Any],
+        query: str,
+        answer: str,
+        rows: List[dict],
+        cost_s: float,
+    ) -> None:
+        """Remember an answer; cost_s is what producing it took (retrieval + completion)."""
+        q = np.asarray(embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scope = scope_key(filters)
+        with self._lock:
+            entry = _Entry(scope, q, query, answer, rows, self._versions_of(rows, filters), cost_s)
+            self._scopes.setdefault(scope, _ScopeIndex()).add(entry)
+            self._order[id(entry)] = entry
+            while len(self._order) > self.max_entries:
+                self._drop(next(iter(self._order.values())))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "expired": self.expired,
+            "invalidated": self.invalidated,
+            "entries": len(self._order),
+            "scopes": len(self._scopes),
+            "threshold": self.threshold,
+            "ttl_s": self.ttl_s,
+            "saved_s": self.saved_s,
+            "saved_ms_per_hit": (self.saved_s / self.hits * 1000) if self.hits else 0.0,
+            "lookup_ms_avg": (self.lookup_s / lookups * 1000) if lookups else 0.0,
+        }
+
+
+_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Process-wide cache configured from the environment; None when ANSWER_CACHE_ENABLED is off."""
+    global _cache
+    if os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        _cache = SemanticAnswerCache(
+            threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl_s=float(os.environ.get("ANSWER_CACHE_TTL_S", "3600")),
+            max_entries=int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2048")),
+            refresh_s=float(os.environ.get("ANSWER_CACHE_REFRESH_S", "5")),
+        )
+    return _cache
@@ -0,0 +1,85 @@
+"""
+Perceived latency of /api/chat, buffered JSON vs. streamed (SSE).
+
+For each mode it reports, in ms from sending the request:
+  ttfb   first response byte,
+  hits   retrieved rows available to the client (rag_hits / rag_results),
+  ttft   first answer token,
+  total  response complete.
+Buffered JSON has all four at the same moment.
+
+Runs offline against the fake LLM (which also serves embeddings) and the
+in-process retrieval index:
+
+    python ../OCR_ICD_Case_Study/scripts/fake_llm_server.py --port 8200 &
+    export OPENAI_BASE_URL=http://127.0.0.1:8200/v1 OPENAI_API_KEY=fake
+    RAG_BACKEND=local uvicorn main:app --port 8000 &
+    python bench_chat_stream.py --url http://127.0.0.1:8000/api/chat --requests 20
+
+assignment_1 takes a JSON body instead of a form: add --json.
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+
+def _payload(message: str, stream: bool, as_json: bool) -> Dict:
+    if as_json:
+        return {"json": {"message": message, "stream": stream}}
+    return {"data": {"message": message, "stream": "true" if stream else "false"}}
+
+
+def timed_request(client: httpx.Client, url: str, message: str, stream: bool, as_json: bool) -> Dict[str, float]:
+    marks: Dict[str, float] = {}
+    started = time.perf_counter()
+    with client.stream("POST", url, **_payload(message, stream, as_json)) as resp:
+        resp.raise_for_status()
+        event = None
+        for line in resp.iter_lines():
+            now = (time.perf_counter() - started) * 1000
+            marks.setdefault("ttfb", now)
+            if not stream:
+                continue
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event in ("rag_hits", "rag_results"):
+                    marks.setdefault("hits", now)
+                elif event == "token":
+                    marks.setdefault("ttft", now)
+                elif event == "error":
+                    raise RuntimeError(json.loads(line[len("data: "):])["error"])
+    marks["total"] = (time.perf_counter() - started) * 1000
+    for key in ("ttfb", "hits", "ttft"):
+        marks.setdefault(key, marks["total"])
+    return marks
+
+
+def main(url: str, requests: int, as_json: bool) -> None:
+    with httpx.Client(timeout=120) as client:
+        print(f"{'mode':<9} {'metric':<6} {'p50 ms':>9} {'p95 ms':>9}")
+        for stream in (False, True):
+            runs: List[Dict[str, float]] = [
+                # distinct questions: the embedding cache would otherwise skip the embedding call
+                timed_request(client, url, f"What happens in chapter {i} ({'stream' if stream else 'buffered'})?",
+                              stream, as_json)
+                for i in range(requests)
+            ]
+            for key in ("ttfb", "hits", "ttft", "total"):
+                values = [r[key] for r in runs]
+                print(f"{'stream' if stream else 'buffered':<9} {key:<6} "
+                      f"{np.percentile(values, 50):>9.1f} {np.percentile(values, 95):>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api/chat")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="JSON body (assignment_1) instead of a form")
+    args = parser.parse_args()
+    main(args.url, args.requests, args.json)
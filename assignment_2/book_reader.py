@@ -0,0 +1,160 @@
+# book_reader.py
+# ---------------------------------------------------------
+# Streaming book reader: files → lines → (chapter, paragraph).
+#
+# Nothing holds a whole book in memory:
+#   - .txt files are read line by line,
+#   - .html files are fed to an incremental parser in 64 KB chunks
+#     (lxml's SAX-style target parser when installed, else the
+#     stdlib html.parser) and every text node is emitted as soon as
+#     it is complete,
+#   - chapter headings are matched per line, and paragraphs are
+#     yielded as they are read.
+# Output matches the old read-everything / re.split version: a text
+# node or line is a paragraph candidate, text before the first
+# "CHAPTER ..." heading is dropped, and a book without any heading
+# becomes one "Full Book" chapter. Only in that last case is the
+# preamble buffered, since it is not known to be the whole book until
+# the end.
+# ---------------------------------------------------------
+
+import os
+import re
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None  # type: ignore
+
+CHAPTER_RE = re.compile(r"CHAPTER\s+[A-Z0-9]+.*", re.IGNORECASE)
+READ_CHUNK_CHARS = 64 * 1024
+
+# not page text (BeautifulSoup's get_text skips these too)
+_SKIP_TAGS = {"script", "style", "template"}
+
+
+class _TextCollector:
+    """Parser target: collects text nodes in document order, one string per node."""
+
+    def __init__(self):
+        self.nodes: List[str] = []
+        self._parts: List[str] = []
+        self._skip = 0
+
+    def _flush(self) -> None:
+        # a node can arrive in several data() calls (chunk boundaries, entities)
+        if self._parts:
+            self.nodes.append("".join(self._parts))
+            self._parts = []
+
+    def start(self, tag, attrib=None) -> None:
+        self._flush()
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+
+    def end(self, tag) -> None:
+        self._flush()
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def data(self, text: str) -> None:
+        if not self._skip:
+            self._parts.append(text)
+
+    def comment(self, text: str) -> None:
+        self._flush()
+
+    def close(self) -> None:
+        self._flush()
+
+
+class _StdlibHTMLParser(HTMLParser):
+    """html.parser driving the same target interface as lxml."""
+
+    def __init__(self, target: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def handle_comment(self, data):
+        self.target.comment(data)
+
+    def close(self):
+        super().close()
+        self.target.close()
+
+
+def iter_html_text(path: str) -> Iterator[str]:
+    """Text nodes of an HTML file, parsed incrementally."""
+    collector = _TextCollector()
+    parser = etree.HTMLParser(target=collector) if etree is not None else _StdlibHTMLParser(collector)
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_CHARS)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            nodes, collector.nodes = collector.nodes, []
+            yield from nodes
+    parser.close()
+    yield from collector.nodes
+
+
+def iter_file_lines(path: str) -> Iterator[str]:
+    if path.endswith(".txt"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+    elif path.endswith(".html"):
+        for node in iter_html_text(path):
+            yield from node.split("\n")
+    # anything else (jpg/png title pages, ...) has no text to read here
+
+
+def iter_book_lines(book_folder: str) -> Iterator[str]:
+    # sorted walk: same order on every machine, so paragraph numbers (and row ids) are stable
+    for root, dirs, files in os.walk(book_folder):
+        dirs.sort()
+        for name in sorted(files):
+            yield from iter_file_lines(os.path.join(root, name))
+
+
+def iter_paragraphs(book_folder: str) -> Iterator[Tuple[str, int, str]]:
+    """(chapter_title, paragraph_number, paragraph) for one book, lazily."""
+    title: Optional[str] = None
+    number = 0
+    preamble: List[str] = []
+
+    for line in iter_book_lines(book_folder):
+        m = CHAPTER_RE.search(line)
+        if m:
+            head = line[:m.start()].strip()  # text before the heading ends the previous chapter
+            if title is not None and head:
+                number += 1
+                yield title, number, head
+            title = m.group(0).strip()
+            number = 0
+            preamble = []
+            continue
+
+        paragraph = line.strip()
+        if not paragraph:
+            continue
+        if title is None:
+            preamble.append(paragraph)
+        else:
+            number += 1
+            yield title, number, paragraph
+
+    if title is None:
+        for number, paragraph in enumerate(preamble, start=1):
+            yield "Full Book", number, paragraph
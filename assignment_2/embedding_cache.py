@@ -0,0 +1,245 @@
+# embedding_cache.py
+# ---------------------------------------------------------
+# Embedding cache shared by ingestion (load_books.py) and the query
+# paths of both RAG apps.
+#
+# Key  = SHA-256 of (model, normalized text); normalization is NFKC
+#        + collapsed whitespace, so trivially different spellings
+#        of the same question share a vector.
+# Two tiers:
+#   - in-memory LRU of float32 arrays (EMBEDDING_CACHE_MEMORY_ENTRIES),
+#   - on disk under EMBEDDING_CACHE_DIR: one append-only float32
+#     matrix per (model, dim), read through mmap, plus a SQLite index
+#     key → (matrix, row). Appends are serialized by the index's write
+#     transaction, so several processes (the loader, uvicorn workers
+#     of either app) can share one directory.
+#
+# Each app in this repo runs from its own folder, so this file is
+# vendored into assignment_1/ and assignment_2/; keep the copies in
+# sync (`python check_vendored.py` at the repo root fails when they
+# differ). Point EMBEDDING_CACHE_DIR of both at the same absolute path to
+# share vectors between them.
+# ---------------------------------------------------------
+
+import asyncio
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_SQL_VARS = 500  # keys per IN (...) lookup
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _matrix_name(model: str, dim: int) -> str:
+    return f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model)}-{dim}.f32"
+
+
+class EmbeddingCache:
+    def __init__(self, directory: Optional[str] = None, max_memory_entries: int = 4096):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self._mem: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._maps: Dict[str, mmap.mmap] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # autocommit; writes take an explicit BEGIN IMMEDIATE (cross-process lock)
+            self._db = sqlite3.connect(
+                os.path.join(directory, "index.sqlite"), check_same_thread=False, isolation_level=None
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " key TEXT PRIMARY KEY, matrix TEXT NOT NULL, dim INTEGER NOT NULL, row INTEGER NOT NULL)"
+            )
+
+    # --- lookups ---
+    def get_many(
+        self, model: str, texts: Sequence[str], remember: bool = True
+    ) -> List[Optional[List[float]]]:
+        keys = [cache_key(model, t) for t in texts]
+        found: List[Optional[array]] = [None] * len(keys)
+        with self._lock:
+            missing: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vec = self._mem.get(key)
+                if vec is not None:
+                    self._mem.move_to_end(key)
+                    found[i] = vec
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._db is not None:
+                for key, vec in self._read_disk(list(missing)).items():
+                    if remember:
+                        self._remember(key, vec)
+                    for i in missing[key]:
+                        found[i] = vec
+                    self.disk_hits += len(missing[key])
+
+            n_missing = sum(v is None for v in found)
+            self.misses += n_missing
+            self.hits += len(found) - n_missing
+        return [v.tolist() if v is not None else None for v in found]
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, array]:
+        rows = []
+        for i in range(0, len(keys), _SQL_VARS):
+            chunk = keys[i:i + _SQL_VARS]
+            rows += self._db.execute(
+                f"SELECT key, matrix, dim, row FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+        out = {}
+        for key, matrix, dim, row in rows:
+            row_bytes = dim * 4
+            mm = self._map(matrix, (row + 1) * row_bytes)
+            if mm is None:
+                continue
+            vec = array("f")
+            vec.frombytes(mm[row * row_bytes:(row + 1) * row_bytes])
+            out[key] = vec
+        return out
+
+    def _map(self, matrix: str, needed: int) -> Optional[mmap.mmap]:
+        """Read-only map of a matrix file, remapped when it has grown past the current map."""
+        mm = self._maps.get(matrix)
+        if mm is None or len(mm) < needed:
+            path = os.path.join(self.directory, matrix)
+            if not os.path.exists(path) or os.path.getsize(path) < needed:
+                return None
+            if mm is not None:
+                mm.close()
+            with open(path, "rb") as f:
+                mm = self._maps[matrix] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mm
+
+    # --- inserts ---
+    def put_many(
+        self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]], remember: bool = True
+    ) -> None:
+        """Store vectors; remember=False skips the LRU (bulk ingestion would flush hot queries)."""
+        items: Dict[str, array] = {}
+        for text, vector in zip(texts, vectors):
+            items[cache_key(model, text)] = array("f", vector)
+        if not items:
+            return
+        with self._lock:
+            if remember:
+                for key, vec in items.items():
+                    self._remember(key, vec)
+            if self._db is not None:
+                self._append(model, items)
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> None:
+        self.put_many(model, [text], [vector])
+
+    def _append(self, model: str, items: Dict[str, array]) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            keys = list(items)
+            present = set()
+            for i in range(0, len(keys), _SQL_VARS):
+                chunk = keys[i:i + _SQL_VARS]
+                present.update(r[0] for r in self._db.execute(
+                    f"SELECT key FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ))
+
+            by_matrix: Dict[Tuple[str, int], List[Tuple[str, array]]] = {}
+            for key, vec in items.items():
+                if key not in present:
+                    by_matrix.setdefault((_matrix_name(model, len(vec)), len(vec)), []).append((key, vec))
+
+            for (matrix, dim), entries in by_matrix.items():
+                path = os.path.join(self.directory, matrix)
+                row_bytes = dim * 4
+                with open(path, "ab"):
+                    pass
+                with open(path, "r+b") as f:
+                    # a torn row from a crashed writer is overwritten
+                    row = os.path.getsize(path) // row_bytes
+                    f.seek(row * row_bytes)
+                    for _, vec in entries:
+                        f.write(vec.tobytes())
+                    f.truncate()
+                self._db.executemany(
+                    "INSERT INTO vectors (key, matrix, dim, row) VALUES (?, ?, ?, ?)",
+                    [(key, matrix, dim, row + i) for i, (key, _) in enumerate(entries)],
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _remember(self, key: str, vec: array) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory_entries:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        disk_entries = 0
+        if self._db is not None:
+            with self._lock:
+                disk_entries = self._db.execute("SELECT count(*) FROM vectors").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "memory_entries": len(self._mem),
+            "max_memory_entries": self.max_memory_entries,
+            "disk_entries": disk_entries,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache, configured from the environment on first use."""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(
+            directory=os.environ.get("EMBEDDING_CACHE_DIR", ".cache/embeddings") or None,
+            max_memory_entries=int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", "4096")),
+        )
+    return _cache
+
+
+async def embed_cached(llm, texts: Sequence[str], model: str, remember: bool = True) -> List[List[float]]:
+    """Embeddings for `texts` via the gateway `llm`; only cache misses are sent, in one request."""
+    cache = get_embedding_cache()
+    vectors = await asyncio.to_thread(cache.get_many, model, texts, remember)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        # repeated texts within one call are embedded once
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        resp = await llm.embed(unique, model=model)
+        fresh = {unique[d.index]: d.embedding for d in resp.data}
+        for i in missing:
+            vectors[i] = fresh[texts[i]]
+        await asyncio.to_thread(cache.put_many, model, list(fresh), list(fresh.values()), remember)
+    return vectors
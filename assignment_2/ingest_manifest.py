@@ -0,0 +1,128 @@
+# ingest_manifest.py
+# ---------------------------------------------------------
+# Local checkpoint of what load_books.py has uploaded to rag_content.
+#
+# SQLite file (INGEST_MANIFEST_PATH) with two tables:
+#   rows      – id of every row already upserted, per document;
+#               written after each insert chunk, so a crashed run
+#               resumes without re-embedding what already landed.
+#   documents – per book: fingerprint of its source files (path,
+#               size, mtime) and a content version (hash of its row
+#               ids) set once the book is fully synced. An unchanged
+#               fingerprint skips the book without reading it.
+#
+# Row ids are deterministic (row_id): the same paragraph text at the
+# same position always maps to the same uuid, so upserts are
+# idempotent even without the manifest.
+# ---------------------------------------------------------
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+
+# fixed namespace: ids must stay stable across runs and machines
+ROW_NAMESPACE = uuid.UUID("6c1f0b9e-4f1e-4c53-9a43-2f0d1c8e7b21")
+
+INGEST_MANIFEST_PATH = os.environ.get("INGEST_MANIFEST_PATH", ".cache/ingest_manifest.sqlite")
+
+
+def row_id(document_id: str, chapter_title: str, paragraph_number: int, text: str) -> str:
+    """uuid derived from (document, chapter, paragraph number, text)."""
+    key = "\x1f".join((document_id, chapter_title, str(paragraph_number), text))
+    return str(uuid.uuid5(ROW_NAMESPACE, key))
+
+
+def folder_fingerprint(folder_path: str) -> str:
+    """Hash of relative path, size and mtime of every file under folder_path (contents are not read)."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            h.update(f"{os.path.relpath(path, folder_path)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def content_version(ids: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(ids)).encode()).hexdigest()[:16]
+
+
+class IngestManifest:
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rows (id TEXT PRIMARY KEY, document_id TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS rows_document ON rows (document_id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " document_id TEXT PRIMARY KEY, fingerprint TEXT, version TEXT, synced_at REAL)"
+        )
+        self._db.commit()
+
+    # --- documents ---
+    def fingerprint(self, document_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def versions(self) -> Dict[str, str]:
+        """document_id → content version of every fully synced document."""
+        with self._lock:
+            rows = self._db.execute("SELECT document_id, version FROM documents").fetchall()
+        return {document_id: version for document_id, version in rows}
+
+    def documents(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document_id FROM documents UNION SELECT DISTINCT document_id FROM rows"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def mark_synced(self, document_id: str, fingerprint: str, ids: Iterable[str]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (document_id, fingerprint, version, synced_at) VALUES (?, ?, ?, ?)",
+                (document_id, fingerprint, content_version(ids), time.time()),
+            )
+            self._db.commit()
+
+    def forget_document(self, document_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            self._db.execute("DELETE FROM rows WHERE document_id = ?", (document_id,))
+            self._db.commit()
+
+    # --- rows ---
+    def row_ids(self, document_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM rows WHERE document_id = ?", (document_id,)).fetchall()
+        return {r[0] for r in rows}
+
+    def add_rows(self, rows: Iterable[dict]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rows (id, document_id) VALUES (?, ?)",
+                [(row["id"], row["document_id"]) for row in rows],
+            )
+            self._db.commit()
+
+    def remove_rows(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM rows WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,254 @@
+# llm_gateway.py
+# ---------------------------------------------------------
+# One shared, pooled AsyncOpenAI client for the whole process.
+#
+# - connection pooling (one httpx pool, keep-alive)
+# - bounded concurrency (LLM_MAX_CONCURRENCY calls in flight)
+# - per-call timeout (LLM_TIMEOUT_S)
+# - retry with exponential backoff + jitter on 429 / 5xx / network
+#   errors, honouring Retry-After (LLM_MAX_RETRIES)
+# - per-operation latency / token counters via stats()
+# - streamed chat (chat_stream) with time-to-first-token counters
+#
+# Each app in this repo runs from its own folder, so this file is
+# vendored into assignment_1/, assignment_2/ and
+# OCR_ICD_Case_Study/backend/; keep the copies in sync
+# (`python check_vendored.py` at the repo root fails when they differ).
+# ---------------------------------------------------------
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    import httpx
+    from openai import (
+        AsyncOpenAI,
+        APIConnectionError,
+        APIStatusError,
+        APITimeoutError,
+        RateLimitError,
+    )
+except ImportError:
+    httpx = None  # type: ignore
+    AsyncOpenAI = None  # type: ignore
+
+
+def _retryable(e: Exception) -> bool:
+    if AsyncOpenAI is None:
+        return False
+    if isinstance(e, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class _OpStats:
+    __slots__ = ("calls", "errors", "retries", "latency_sum", "latency_max",
+                 "prompt_tokens", "completion_tokens", "total_tokens",
+                 "first_token_sum", "first_token_max")
+
+    def __init__(self):
+        self.calls = self.errors = self.retries = 0
+        self.latency_sum = self.latency_max = 0.0
+        self.prompt_tokens = self.completion_tokens = self.total_tokens = 0
+        self.first_token_sum = self.first_token_max = 0.0  # streamed calls only
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in self.__slots__}
+        d["latency_avg"] = self.latency_sum / self.calls if self.calls else 0.0
+        d["first_token_avg"] = self.first_token_sum / self.calls if self.calls else 0.0
+        return d
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout_s: float = 60.0,
+        max_retries: int = 4,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 20.0,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._client: Optional["AsyncOpenAI"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats: Dict[str, _OpStats] = {}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key) and AsyncOpenAI is not None
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        if not self.configured:
+            raise RuntimeError("OpenAI client is not configured (set OPENAI_API_KEY).")
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout_s,
+                max_retries=0,  # retries are done here, with jitter and metrics
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_concurrency * 2,
+                        max_keepalive_connections=self.max_concurrency,
+                    ),
+                    timeout=self.timeout_s,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def _sem(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _backoff(self, e: Exception, attempt: int) -> float:
+        delay = _retry_after(e)
+        if delay is None:
+            cap = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt))
+            delay = random.uniform(cap / 2, cap)
+        return delay
+
+    async def _call(self, op: str, fn, **kwargs):
+        stats = self._stats.setdefault(op, _OpStats())
+        attempt = 0
+        while True:
+            try:
+                async with self._sem():
+                    # latency excludes time spent waiting for a slot
+                    started = time.perf_counter()
+                    resp = await fn(**kwargs)
+                    elapsed = time.perf_counter() - started
+            except Exception as e:
+                if attempt >= self.max_retries or not _retryable(e):
+                    stats.errors += 1
+                    raise
+                attempt += 1
+                stats.retries += 1
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+
+            stats.calls += 1
+            stats.latency_sum += elapsed
+            stats.latency_max = max(stats.latency_max, elapsed)
+            usage = getattr(resp, "usage", None)
+            if usage is not None:
+                stats.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                stats.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+                stats.total_tokens += getattr(usage, "total_tokens", 0) or 0
+            return resp
+
+    async def chat(self, **kwargs):
+        """client.chat.completions.create(**kwargs) with pooling, limits and retries."""
+        return await self._call("chat", self.client.chat.completions.create, **kwargs)
+
+    async def chat_stream(self, **kwargs) -> AsyncIterator[str]:
+        """
+        client.chat.completions.create(stream=True, **kwargs), yielding the
+        content deltas as they arrive. Opening the stream is retried like
+        chat(); once tokens have been yielded a failure is raised as is.
+        The concurrency slot is held until the stream is consumed or closed.
+        """
+        stats = self._stats.setdefault("chat_stream", _OpStats())
+        sem = self._sem()
+        attempt = 0
+        while True:
+            await sem.acquire()
+            started = time.perf_counter()
+            try:
+                try:
+                    stream = await self.client.chat.completions.create(stream=True, **kwargs)
+                except BaseException:
+                    # includes cancellation (client gone while the stream was opening)
+                    sem.release()
+                    raise
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not _retryable(e):
+                    stats.errors += 1
+                    raise
+                attempt += 1
+                stats.retries += 1
+                await asyncio.sleep(self._backoff(e, attempt))
+
+        first_token = None
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                yield delta
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            # also runs when the consumer stops early (client disconnect)
+            sem.release()
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+        elapsed = time.perf_counter() - started
+        stats.calls += 1
+        stats.latency_sum += elapsed
+        stats.latency_max = max(stats.latency_max, elapsed)
+        first_token = elapsed if first_token is None else first_token
+        stats.first_token_sum += first_token
+        stats.first_token_max = max(stats.first_token_max, first_token)
+
+    async def embed(self, input, model: str = "text-embedding-3-small"):
+        """client.embeddings.create(...); `input` may be a string or a list of strings."""
+        return await self._call("embeddings", self.client.embeddings.create, input=input, model=model)
+
+    async def upload_file(self, file, purpose: str = "assistants"):
+        return await self._call("files", self.client.files.create, file=file, purpose=purpose)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "operations": {op: s.as_dict() for op, s in self._stats.items()},
+        }
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_gateway() -> LLMGateway:
+    """Process-wide gateway, configured from the environment on first use."""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            base_url=os.environ.get("OPENAI_BASE_URL") or None,
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+            timeout_s=float(os.environ.get("LLM_TIMEOUT_S", "60")),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", "4")),
+        )
+    return _gateway
@@ -1,19 +1,42 @@
 # load_books.py
+# ---------------------------------------------------------
+# Books folder → embeddings → rag_content.
+#
+# Pipeline (all stages overlap, queues are bounded):
+#   streaming read + split (thread, book_reader) → token-budgeted batches
+#   → EMBED_CONCURRENCY workers, one multi-input embeddings request
+#     per batch for the paragraphs not in the embedding cache
+#     (through the shared LLM gateway: pooling, retries)
+#   → re-chunked into INSERT_BATCH_SIZE rows
+#   → INSERT_CONCURRENCY workers, one bulk upsert per chunk.
+# Throughput (rows/s, tokens/s, request counts) is printed as it runs.
+#
+# Incremental: row ids are content hashes (ingest_manifest.row_id) and
+# a local manifest records every upserted id and each synced book's
+# file fingerprint. Unchanged books are skipped without being read,
+# rows already uploaded are not re-embedded, a crashed run resumes
+# where it stopped, and rows whose paragraph changed or disappeared
+# are deleted once the book is fully synced.
+# ---------------------------------------------------------
+import argparse
+import asyncio
 import os
-import re
-from uuid import uuid4
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 from supabase import create_client
-from openai import OpenAI
+from llm_gateway import get_gateway
+from book_reader import iter_paragraphs
+from embedding_cache import embed_cached, get_embedding_cache
+from ingest_manifest import INGEST_MANIFEST_PATH, IngestManifest, folder_fingerprint, row_id
 
-load_dotenv()
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or BPE file not downloadable
+    _encoding = None
 
-# OpenAI client (new SDK style)
-openai_api_key = os.environ.get("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("OPENAI_API_KEY must be set in environment to run loader")
-client = OpenAI(api_key=openai_api_key)
+load_dotenv()
 
 # Supabase client
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -29,92 +52,297 @@ DOCUMENT_TYPE = "book"
 DEFAULT_USERNAME = os.environ.get("DEFAULT_USERNAME", "naveen")
 DEFAULT_USER_ID = os.environ.get("DEFAULT_USER_ID", "naveen")
 
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+MIN_PARAGRAPH_CHARS = 20
+
+# Batching / concurrency. API limits per embeddings request: 2048 inputs,
+# 300k tokens; PostgREST bodies grow ~30 KB per row (1536 floats as JSON).
+EMBED_BATCH_TOKENS = int(os.environ.get("EMBED_BATCH_TOKENS", "50000"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "512"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", os.environ.get("LLM_MAX_CONCURRENCY", "8")))
+INSERT_BATCH_SIZE = int(os.environ.get("INSERT_BATCH_SIZE", "200"))
+INSERT_CONCURRENCY = int(os.environ.get("INSERT_CONCURRENCY", "4"))
+PROGRESS_EVERY = int(os.environ.get("PROGRESS_EVERY", "2000"))
+DELETE_BATCH_SIZE = 200
 
-def read_book_text(book_folder):
-    full_text = ""
-    for root, dirs, files in os.walk(book_folder):
-        for file in files:
-            path = os.path.join(root, file)
-            if file.endswith(".txt"):
-                with open(path, "r", encoding="utf-8") as f:
-                    full_text += f.read() + "\n"
-            elif file.endswith(".html"):
-                with open(path, "r", encoding="utf-8") as f:
-                    soup = BeautifulSoup(f.read(), "html.parser")
-                    full_text += soup.get_text(separator="\n") + "\n"
-            else:
-                # ignore images (jpg/png) — titles in image should be handled externally
-                continue
-    return full_text
 
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode_ordinary(text))
+    return len(text) // 4 + 1  # ~4 characters per token for English prose
 
-def split_into_chapters(text):
-    chapter_regex = r"(CHAPTER\s+[A-Z0-9]+.*)"
-    parts = re.split(chapter_regex, text, flags=re.IGNORECASE)
-    chapters = []
-    i = 1
-    while i < len(parts):
-        title = parts[i].strip()
-        content = parts[i + 1].strip()
-        chapters.append((title, content))
-        i += 2
-    return chapters
 
+def iter_book_rows(book_folder: str, folder_path: str) -> Iterator[dict]:
+    """rag_content rows (without embeddings) for every paragraph of one book, as it is read."""
+    found = False
+    for chapter_title, paragraph_number, paragraph in iter_paragraphs(folder_path):
+        found = True
+        if len(paragraph) < MIN_PARAGRAPH_CHARS:
+            continue
+        metadata = {
+            "source": "local_books_folder",
+            "book_folder": book_folder,
+            "chapter_title": chapter_title
+        }
+        yield {
+            "id": row_id(book_folder, chapter_title, paragraph_number, paragraph),
+            "context": paragraph,
+            "user_id": DEFAULT_USER_ID,
+            "username": DEFAULT_USERNAME,
+            "document_type": DOCUMENT_TYPE,
+            "document_id": book_folder,
+            "chapter_title": chapter_title,
+            "paragraph_number": paragraph_number,
+            "metadata": metadata
+        }
+    if not found:
+        print(f"⚠️ No text found in {book_folder}, skipping.")
 
-def split_into_paragraphs(chapter_text):
-    paragraphs = [p.strip() for p in chapter_text.split("\n") if p.strip()]
-    return paragraphs
 
+class BookSync:
+    """What one run saw of a book: its fingerprint, ids already uploaded and current ids."""
 
-def get_embedding(text):
-    resp = client.embeddings.create(model="text-embedding-3-small", input=text)
-    return resp.data[0].embedding
+    def __init__(self, fingerprint: str, known: Set[str]):
+        self.fingerprint = fingerprint
+        self.known = known
+        self.current: Set[str] = set()
 
 
-def upload_books_to_supabase():
-    for book_folder in os.listdir(BOOKS_PATH):
-        folder_path = os.path.join(BOOKS_PATH, book_folder)
+def iter_rows(
+    books_path: str,
+    manifest: IngestManifest,
+    stats: "LoadStats",
+    synced: Dict[str, BookSync],
+    full: bool = False,
+) -> Iterator[dict]:
+    """Rows that still need embedding + upload; fills `synced` for every book read."""
+    for book_folder in sorted(os.listdir(books_path)):
+        folder_path = os.path.join(books_path, book_folder)
         if not os.path.isdir(folder_path):
             continue
+        fingerprint = folder_fingerprint(folder_path)
+        if not full and manifest.fingerprint(book_folder) == fingerprint:
+            stats.unchanged_books += 1
+            continue
 
         print(f"Processing book folder: {book_folder}")
-        book_text = read_book_text(folder_path)
-        if not book_text.strip():
-            print(f"⚠️ No text found in {book_folder}, skipping.")
+        book = synced[book_folder] = BookSync(fingerprint, manifest.row_ids(book_folder))
+        for row in iter_book_rows(book_folder, folder_path):
+            if row["id"] in book.current:
+                continue  # identical paragraph repeated at the same position
+            book.current.add(row["id"])
+            if row["id"] in book.known and not full:
+                stats.skipped += 1
+                continue
+            yield row
+
+
+def token_batches(
+    rows: Iterator[dict], max_tokens: int = EMBED_BATCH_TOKENS, max_items: int = EMBED_BATCH_SIZE
+) -> Iterator[Tuple[List[dict], int]]:
+    """Group rows into (batch, token count) with at most max_tokens / max_items per batch."""
+    batch: List[dict] = []
+    tokens = 0
+    for row in rows:
+        n = count_tokens(row["context"])
+        if batch and (tokens + n > max_tokens or len(batch) >= max_items):
+            yield batch, tokens
+            batch, tokens = [], 0
+        batch.append(row)
+        tokens += n
+    if batch:
+        yield batch, tokens
+
+
+def upsert_rows(rows: List[dict]) -> None:
+    # one PostgREST request for the whole chunk; ids are deterministic, so re-sends are no-ops
+    supabase.table("rag_content").upsert(rows, on_conflict="id").execute()
+
+
+def delete_rows(ids: List[str]) -> None:
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        supabase.table("rag_content").delete().in_("id", ids[i:i + DELETE_BATCH_SIZE]).execute()
+
+
+def finish_book(manifest: IngestManifest, document_id: str, book: BookSync) -> int:
+    """Delete rows of paragraphs that changed or disappeared, then mark the book synced."""
+    stale = sorted(book.known - book.current)
+    if stale:
+        delete_rows(stale)
+        manifest.remove_rows(stale)
+    manifest.mark_synced(document_id, book.fingerprint, book.current)
+    return len(stale)
+
+
+def prune_missing_books(manifest: IngestManifest, books_path: str) -> List[str]:
+    """Delete rag_content rows of books that are in the manifest but no longer on disk."""
+    present = {b for b in os.listdir(books_path) if os.path.isdir(os.path.join(books_path, b))}
+    removed = []
+    for document_id in manifest.documents():
+        if document_id in present:
             continue
+        supabase.table("rag_content").delete().eq("document_type", DOCUMENT_TYPE).eq(
+            "document_id", document_id
+        ).execute()
+        manifest.forget_document(document_id)
+        removed.append(document_id)
+    return removed
+
+
+class LoadStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.embedded = 0
+        self.tokens = 0
+        self.embed_requests = 0
+        self.inserted = 0
+        self.insert_requests = 0
+        self.skipped = 0
+        self.unchanged_books = 0
+        self.deleted = 0
+        self.first_row_s: Optional[float] = None
+        self.per_book: Dict[str, int] = {}
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (
+            f"{self.inserted} rows inserted / {self.embedded} embedded in {elapsed:.1f}s "
+            f"({self.inserted / elapsed:.1f} rows/s, {self.tokens / elapsed:.0f} tokens/s; "
+            f"{self.embed_requests} embedding batches, {self.insert_requests} upserts; "
+            f"{self.skipped} rows already uploaded, {self.unchanged_books} books unchanged, "
+            f"{self.deleted} stale rows deleted)"
+            + (f", first row after {self.first_row_s:.2f}s" if self.first_row_s is not None else "")
+        )
+
+
+async def upload_books_async(
+    books_path: str = BOOKS_PATH,
+    manifest_path: str = INGEST_MANIFEST_PATH,
+    full: bool = False,
+    prune_missing: bool = False,
+) -> LoadStats:
+    stats = LoadStats()
+    llm = get_gateway()
+    # fail before reading anything: the embedding workers need the gateway's key
+    if not llm.configured:
+        raise RuntimeError("OPENAI_API_KEY must be set in environment to run loader")
+    manifest = IngestManifest(manifest_path)
+    synced: Dict[str, BookSync] = {}
+    batches: asyncio.Queue = asyncio.Queue(maxsize=EMBED_CONCURRENCY * 2)
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=EMBED_CONCURRENCY * 2)
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=INSERT_CONCURRENCY * 2)
+
+    async def produce() -> None:
+        # file reads and splitting are blocking: one thread hop per batch
+        pending = token_batches(iter_rows(books_path, manifest, stats, synced, full=full))
+        while True:
+            item = await asyncio.to_thread(next, pending, None)
+            if item is None:
+                break
+            await batches.put(item)
+        for _ in range(EMBED_CONCURRENCY):
+            await batches.put(None)
+
+    async def embed() -> None:
+        while True:
+            item = await batches.get()
+            if item is None:
+                return
+            rows, tokens = item
+            # vectors go to the disk tier only: a bulk load must not flush hot query vectors
+            vectors = await embed_cached(llm, [row["context"] for row in rows], EMBEDDING_MODEL, remember=False)
+            for row, vector in zip(rows, vectors):
+                row["embedding"] = vector
+            stats.embedded += len(rows)
+            stats.tokens += tokens
+            stats.embed_requests += 1
+            await embedded.put(rows)
+
+    async def rechunk() -> None:
+        pending: List[dict] = []
+        while True:
+            rows = await embedded.get()
+            if rows is None:
+                break
+            pending.extend(rows)
+            while len(pending) >= INSERT_BATCH_SIZE:
+                await chunks.put(pending[:INSERT_BATCH_SIZE])
+                pending = pending[INSERT_BATCH_SIZE:]
+        if pending:
+            await chunks.put(pending)
+        for _ in range(INSERT_CONCURRENCY):
+            await chunks.put(None)
+
+    async def insert() -> None:
+        while True:
+            rows = await chunks.get()
+            if rows is None:
+                return
+            await asyncio.to_thread(upsert_rows, rows)
+            # checkpoint: a re-run after a crash skips these
+            await asyncio.to_thread(manifest.add_rows, rows)
+            before = stats.inserted
+            if stats.first_row_s is None:
+                stats.first_row_s = time.perf_counter() - stats.started
+            stats.inserted += len(rows)
+            stats.insert_requests += 1
+            for row in rows:
+                stats.per_book[row["document_id"]] = stats.per_book.get(row["document_id"], 0) + 1
+            if PROGRESS_EVERY and stats.inserted // PROGRESS_EVERY > before // PROGRESS_EVERY:
+                print(stats.report())
+
+    feeders = [asyncio.create_task(produce())] + [asyncio.create_task(embed()) for _ in range(EMBED_CONCURRENCY)]
+
+    async def close_embedded() -> None:
+        await asyncio.gather(*feeders)
+        await embedded.put(None)
+
+    tasks = feeders + [asyncio.create_task(close_embedded()), asyncio.create_task(rechunk())]
+    tasks += [asyncio.create_task(insert()) for _ in range(INSERT_CONCURRENCY)]
+    try:
+        # every stage ends on its own sentinel, so this returns when all are done, or
+        # on the first failure: a dead stage stops draining its queue and the stages
+        # feeding it would block forever
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+
+        # only books whose every row landed get their stale rows removed / marked synced
+        for document_id, book in synced.items():
+            stats.deleted += await asyncio.to_thread(finish_book, manifest, document_id, book)
+        if prune_missing:
+            for document_id in await asyncio.to_thread(prune_missing_books, manifest, books_path):
+                print(f"Removed {document_id} (no longer in {books_path})")
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await llm.aclose()
+        manifest.close()
+    return stats
+
 
-        chapters = split_into_chapters(book_text)
-        if len(chapters) == 0:
-            chapters = [("Full Book", book_text)]
-
-        total = 0
-        for chapter_title, chapter_content in chapters:
-            paragraphs = split_into_paragraphs(chapter_content)
-            for paragraph_number, paragraph in enumerate(paragraphs, start=1):
-                if len(paragraph) < 20:
-                    continue
-                embedding = get_embedding(paragraph)
-                metadata = {
-                    "source": "local_books_folder",
-                    "book_folder": book_folder,
-                    "chapter_title": chapter_title
-                }
-                row = {
-                    "id": str(uuid4()),
-                    "embedding": embedding,
-                    "context": paragraph,
-                    "user_id": DEFAULT_USER_ID,
-                    "username": DEFAULT_USERNAME,
-                    "document_type": DOCUMENT_TYPE,
-                    "document_id": book_folder,
-                    "chapter_title": chapter_title,
-                    "paragraph_number": paragraph_number,
-                    "metadata": metadata
-                }
-                supabase.table("rag_content").insert(row).execute()
-                total += 1
+def upload_books_to_supabase(
+    books_path: str = BOOKS_PATH,
+    manifest_path: str = INGEST_MANIFEST_PATH,
+    full: bool = False,
+    prune_missing: bool = False,
+):
+    stats = asyncio.run(upload_books_async(books_path, manifest_path, full=full, prune_missing=prune_missing))
+    for book_folder, total in sorted(stats.per_book.items()):
         print(f"Uploaded {total} chunks for {book_folder}")
+    print(stats.report())
+    print(f"Embedding cache: {get_embedding_cache().stats()}")
+    return stats
 
 
 if __name__ == "__main__":
-    upload_books_to_supabase()
+    parser = argparse.ArgumentParser(description="Embed the books folder into rag_content (incremental).")
+    parser.add_argument("--books-path", default=BOOKS_PATH)
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH, help="local checkpoint (SQLite)")
+    parser.add_argument("--full", action="store_true", help="re-embed and upsert every paragraph")
+    parser.add_argument("--prune-missing", action="store_true",
+                        help="delete rows of books that were removed from --books-path")
+    args = parser.parse_args()
+    upload_books_to_supabase(args.books_path, args.manifest, full=args.full, prune_missing=args.prune_missing)
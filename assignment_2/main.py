@@ -2,20 +2,23 @@
 import os
 import re
 import json
+import asyncio
+import time
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
-from openai import OpenAI
-from supabase_lib import query_rag, insert_resume
+from rag_backend import query_rag, query_rag_batch
+from llm_gateway import get_gateway
+from embedding_cache import embed_cached, get_embedding_cache
+from answer_cache import get_answer_cache
 
 load_dotenv()
 
-# OpenAI client (new SDK style)
-openai_api_key = os.environ.get("OPENAI_API_KEY")
-if not openai_api_key:
+# Shared async OpenAI gateway (pooled client, concurrency limit, retries)
+llm = get_gateway()
+if not llm.configured:
     print("Warning: OPENAI_API_KEY not set — endpoints that use OpenAI will fail.")
-client = OpenAI(api_key=openai_api_key) if openai_api_key else None
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -66,30 +69,130 @@ def extract_metadata_from_text(text: str):
     return meta
 
 
-def get_embedding(text: str):
-    if not client:
+async def get_embedding(text: str):
+    if not llm.configured:
         raise RuntimeError("OpenAI client is not configured (set OPENAI_API_KEY).")
-    resp = client.embeddings.create(model="text-embedding-3-small", input=text)
-    return resp.data[0].embedding
+    # repeated questions are served from the shared embedding cache
+    vectors = await embed_cached(llm, [text], "text-embedding-3-small")
+    return vectors[0]
 
 
-def compose_answer_with_contexts(user_query: str, contexts: list):
-    """
-    Uses LLM (if available) to generate a final answer from contexts.
-    Falls back to concatenation if client not available.
-    """
-    if not client:
-        return "OpenAI not configured. Retrieved contexts:\n\n" + "\n\n---\n\n".join(contexts)
+def _answer_messages(user_query: str, contexts: list):
     system_msg = "You are a helpful assistant. Use the provided context snippets from books to answer the user's question concisely."
     full_context = "\n\n".join(contexts) if contexts else "No context available."
-    messages = [
+    return [
         {"role": "system", "content": system_msg},
         {"role": "user", "content": f"Context:\n\n{full_context}\n\nUser question: {user_query}"}
     ]
-    completion = client.chat.completions.create(model="gpt-4", messages=messages, temperature=0)
+
+
+def _unconfigured_answer(contexts: list):
+    return "OpenAI not configured. Retrieved contexts:\n\n" + "\n\n---\n\n".join(contexts)
+
+
+async def compose_answer_with_contexts(user_query: str, contexts: list):
+    """
+    Uses LLM (if available) to generate a final answer from contexts.
+    Falls back to concatenation if client not available.
+    """
+    if not llm.configured:
+        return _unconfigured_answer(contexts)
+    completion = await llm.chat(model="gpt-4", messages=_answer_messages(user_query, contexts), temperature=0)
     return completion.choices[0].message.content
 
 
+async def stream_answer_with_contexts(user_query: str, contexts: list):
+    """compose_answer_with_contexts, yielding answer tokens as the model produces them."""
+    if not llm.configured:
+        yield _unconfigured_answer(contexts)
+        return
+    tokens = llm.chat_stream(model="gpt-4", messages=_answer_messages(user_query, contexts), temperature=0)
+    try:
+        async for token in tokens:
+            yield token
+    finally:
+        await tokens.aclose()
+
+
+def sse_event(event: str, data) -> str:
+    """One Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def wants_stream(request: Request, stream) -> bool:
+    """Streaming if asked for explicitly (stream=true) or via Accept: text/event-stream."""
+    if stream is not None:
+        return str(stream).lower() in ("1", "true", "yes")
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+async def remember_answer(query_embedding, metadata_filters: dict, message: str, answer: str, rows: list,
+                          retrieval_started: float):
+    """Store a generated answer in the semantic answer cache (if enabled)."""
+    answer_cache = get_answer_cache()
+    if answer_cache is None or not llm.configured:
+        return
+    cost_s = time.perf_counter() - retrieval_started
+    await asyncio.to_thread(answer_cache.store, query_embedding, metadata_filters, message, answer, rows, cost_s)
+
+
+async def stream_cached_chat(message: str, metadata_filters: dict, cached: dict, started: float):
+    """stream_chat for an answer-cache hit: the whole answer arrives as one token."""
+    yield sse_event("rag_hits", {"query": message, "metadata_filters": metadata_filters, "rag_hits": cached["rag_hits"]})
+    yield sse_event("token", {"text": cached["answer"]})
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    yield sse_event("done", {
+        "answer": cached["answer"],
+        "cached": {k: cached[k] for k in ("query", "similarity", "age_s")},
+        "first_token_ms": elapsed_ms,
+        "total_ms": elapsed_ms,
+    })
+
+
+async def stream_chat(message: str, metadata_filters: dict, rows: list, started: float,
+                      query_embedding=None, retrieval_started: float = None):
+    """
+    SSE body of a streamed /api/chat: `rag_hits` first (the retrieved rows and
+    filters), then one `token` event per answer delta, then `done` with the
+    full answer and timings (ms since the request arrived), or `error`.
+    A completed answer is stored in the answer cache.
+    """
+    yield sse_event("rag_hits", {"query": message, "metadata_filters": metadata_filters, "rag_hits": rows})
+    answer, first_token_ms = [], None
+    try:
+        async for token in stream_answer_with_contexts(message, [r.get("context", "") for r in rows]):
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+            answer.append(token)
+            yield sse_event("token", {"text": token})
+    except Exception as e:
+        yield sse_event("error", {"error": f"Answer generation failed: {str(e)}"})
+        return
+    if query_embedding is not None:
+        await remember_answer(query_embedding, metadata_filters, message, "".join(answer), rows, retrieval_started)
+    yield sse_event("done", {
+        "answer": "".join(answer),
+        "first_token_ms": first_token_ms,
+        "total_ms": (time.perf_counter() - started) * 1000,
+    })
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await llm.aclose()
+
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    """Per-operation call / retry / latency / token counters of the LLM gateway (+ embedding / answer caches)."""
+    answer_cache = get_answer_cache()
+    return {
+        **llm.stats(),
+        "embedding_cache": get_embedding_cache().stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+    }
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     try:
@@ -111,6 +214,7 @@ async def chat_endpoint(
     username: str = Form(None),
     user_id: str = Form(None),
     top_k: int = Form(8),
+    stream: str = Form(None),
 ):
     """
     Accepts form-encoded fields (also works with JSON if you call body parsing).
@@ -119,7 +223,13 @@ async def chat_endpoint(
     - document_id/chapter_title/min_paragraph/max_paragraph: optional filters
     - username/user_id: optional tenant filters (strongly recommended in multi-tenant setups)
     - top_k: how many matches to retrieve
+    - stream: "true" (or Accept: text/event-stream) answers with Server-Sent
+      Events: rag_hits first, then answer tokens as they arrive (see stream_chat)
+    A near-duplicate of a recently answered question under the same filters
+    is answered from the semantic answer cache (answer_cache.py); such
+    responses carry a "cached" field.
     """
+    started = time.perf_counter()
 
     # prefer explicit form inputs; if not provided, try to extract from message
     if not message:
@@ -143,12 +253,47 @@ async def chat_endpoint(
     user_id = user_id or os.environ.get("DEFAULT_USER_ID") or DEFAULT_USER_ID
 
     try:
-        query_embedding = get_embedding(message)
+        query_embedding = await get_embedding(message)
     except Exception as e:
         return JSONResponse({"error": f"Failed to create embedding: {str(e)}"}, status_code=500)
 
-    # Call Supabase RPC with all metadata filters supported by SQL
-    resp = query_rag(
+    metadata_filters = {
+        "document_types": doc_types,
+        "document_id": document_id,
+        "chapter_title": chapter_title,
+        "min_paragraph": min_paragraph,
+        "max_paragraph": max_paragraph,
+        "username": username,
+        "user_id": user_id,
+        "top_k": top_k
+    }
+
+    # near-duplicate question under the same filters → stored answer, no retrieval or completion
+    answer_cache = get_answer_cache() if llm.configured else None
+    cached = None
+    if answer_cache is not None:
+        cached = await asyncio.to_thread(answer_cache.lookup, query_embedding, metadata_filters)
+    if cached is not None:
+        if wants_stream(request, stream):
+            return StreamingResponse(
+                stream_cached_chat(message, metadata_filters, cached, started),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        return {
+            "query": message,
+            "metadata_filters": metadata_filters,
+            "rag_hits": cached["rag_hits"],
+            "answer": cached["answer"],
+            "cached": {k: cached[k] for k in ("query", "similarity", "age_s")},
+        }
+
+    retrieval_started = time.perf_counter()
+    # Call Supabase RPC with all metadata filters supported by SQL.
+    # Both backends block (HTTP round trip / numpy search): run them off the event loop
+    # so other open SSE streams keep flowing.
+    resp = await asyncio.to_thread(
+        query_rag,
         query_embedding=query_embedding,
         match_count=top_k,
         document_types=doc_types,
@@ -164,27 +309,96 @@ async def chat_endpoint(
         return JSONResponse({"error": f"Database error: {resp.error}"}, status_code=500)
 
     rows = resp.data or []
-    contexts = [r.get("context", "") for r in rows]
 
-    answer = compose_answer_with_contexts(message, contexts)
+    if wants_stream(request, stream):
+        return StreamingResponse(
+            stream_chat(message, metadata_filters, rows, started, query_embedding, retrieval_started),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    contexts = [r.get("context", "") for r in rows]
+    answer = await compose_answer_with_contexts(message, contexts)
+    await remember_answer(query_embedding, metadata_filters, message, answer, rows, retrieval_started)
 
     return {
         "query": message,
-        "metadata_filters": {
-            "document_types": doc_types,
-            "document_id": document_id,
-            "chapter_title": chapter_title,
-            "min_paragraph": min_paragraph,
-            "max_paragraph": max_paragraph,
-            "username": username,
-            "user_id": user_id,
-            "top_k": top_k
-        },
+        "metadata_filters": metadata_filters,
         "rag_hits": rows,
         "answer": answer
     }
 
 
+MAX_BATCH_MESSAGES = int(os.environ.get("CHAT_BATCH_MAX_MESSAGES", "64"))
+
+
+@app.post("/api/chat/batch")
+async def chat_batch_endpoint(request: Request):
+    """
+    Several questions × several document-type sets in one retrieval call.
+    JSON body:
+    - messages: list of questions (required)
+    - document_type_sets: list of type lists, e.g. [["book"], ["job"]]
+      (default: [["book"]])
+    - document_id/chapter_title/min_paragraph/max_paragraph/username/user_id:
+      optional filters shared by every question (no inline extraction)
+    - top_k: matches per (question, type set)
+    - answer: generate an answer per question from all its hits (default true;
+      false for retrieval-only sweeps)
+    All questions are embedded in one request and retrieved with one
+    match_rag_batch call; answers are generated concurrently.
+    """
+    body = await request.json()
+    messages = body.get("messages") or []
+    if not isinstance(messages, list) or not messages or not all(isinstance(m, str) and m for m in messages):
+        return JSONResponse({"error": "messages must be a non-empty list of strings"}, status_code=400)
+    if len(messages) > MAX_BATCH_MESSAGES:
+        return JSONResponse({"error": f"at most {MAX_BATCH_MESSAGES} messages per batch"}, status_code=400)
+
+    type_sets = body.get("document_type_sets") or [["book"]]
+    top_k = int(body.get("top_k", 8))
+    filters = {
+        "document_id": body.get("document_id"),
+        "chapter_title": body.get("chapter_title"),
+        "min_paragraph": body.get("min_paragraph"),
+        "max_paragraph": body.get("max_paragraph"),
+        "username": body.get("username") or os.environ.get("DEFAULT_USERNAME") or DEFAULT_USERNAME,
+        "user_id": body.get("user_id") or os.environ.get("DEFAULT_USER_ID") or DEFAULT_USER_ID,
+    }
+
+    if not llm.configured:
+        return JSONResponse({"error": "Failed to create embedding: OpenAI client is not configured (set OPENAI_API_KEY)."}, status_code=500)
+    try:
+        query_embeddings = await embed_cached(llm, messages, "text-embedding-3-small")
+    except Exception as e:
+        return JSONResponse({"error": f"Failed to create embedding: {str(e)}"}, status_code=500)
+
+    resp = await asyncio.to_thread(
+        query_rag_batch, query_embeddings, match_count=top_k, document_type_sets=type_sets, **filters
+    )
+    if resp.error:
+        return JSONResponse({"error": f"Database error: {resp.error}"}, status_code=500)
+
+    answers = [None] * len(messages)
+    if body.get("answer", True):
+        answers = await asyncio.gather(*(
+            compose_answer_with_contexts(message, [r.get("context", "") for rows in per_set for r in rows])
+            for message, per_set in zip(messages, resp.data)
+        ))
+
+    return {
+        "metadata_filters": {**filters, "document_type_sets": type_sets, "top_k": top_k},
+        "results": [
+            {
+                "query": message,
+                "rag_hits": [{"document_types": types, "rows": rows} for types, rows in zip(type_sets, per_set)],
+                "answer": answer,
+            }
+            for message, per_set, answer in zip(messages, resp.data, answers)
+        ],
+    }
+
+
 # Simple resume parser kept (unchanged behavior)
 @app.post("/api/parse-resume")
 async def parse_resume(request: Request):
@@ -193,10 +407,10 @@ async def parse_resume(request: Request):
     if not html_content:
         return JSONResponse({"error": "No html_content provided"}, status_code=400)
 
-    if client:
+    if llm.configured:
         system_prompt = "You are a resume parser. Extract name, contact, summary, work_experience, education, skills into JSON."
         user_prompt = f"Parse HTML and return only JSON:\n\n{html_content}"
-        completion = client.chat.completions.create(
+        completion = await llm.chat(
             model="gpt-4o",
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
             temperature=0
@@ -207,7 +421,7 @@ async def parse_resume(request: Request):
         except Exception:
             parsed_json = {"parsed_text": parsed}
         # optionally insert into DB (commented out to be non-destructive)
-        # insert_resume(parsed_json)
+        # from supabase_lib import insert_resume; insert_resume(parsed_json)
         return {"parsed_resume": parsed_json}
     else:
         return {"parsed_resume": {"raw_html": html_content}}
@@ -0,0 +1,112 @@
+# rag_backend.py
+# ---------------------------------------------------------
+# Retrieval backend switch for the chat endpoints.
+#
+# RAG_BACKEND=supabase (default): match_rag RPC in Postgres.
+# RAG_BACKEND=local: in-process index built from an export of
+#   rag_content (vector_index.py); no database round trip, and
+#   supabase_lib (which needs SUPABASE_URL / SUPABASE_KEY) is never
+#   imported.
+#
+# Both return an object with .data (match_rag rows) and .error.
+# query_rag_batch returns .data as one list of row lists per query,
+# one row list per document-type set.
+#
+# Vendored into assignment_1/ for group_batch_rows (assignment_1
+# calls match_rag_batch through its own supabase client); keep the
+# copies in sync (`python check_vendored.py` at the repo root).
+# ---------------------------------------------------------
+
+import os
+from typing import Any, List, Optional, Sequence
+
+
+def rag_backend() -> str:
+    # read per call: main.py imports this module before load_dotenv() runs
+    return os.environ.get("RAG_BACKEND", "supabase").lower()
+
+
+class RAGResult:
+    __slots__ = ("data", "error")
+
+    def __init__(self, data: List[dict], error: Optional[Any] = None):
+        self.data = data
+        self.error = error
+
+
+def query_rag(
+    query_embedding,
+    match_count=5,
+    document_types=None,
+    chapter_title=None,
+    document_id=None,
+    min_paragraph=None,
+    max_paragraph=None,
+    username=None,
+    user_id=None,
+):
+    """Top match_count rows for query_embedding under match_rag's metadata filters."""
+    filters = dict(
+        document_types=document_types,
+        chapter_title=chapter_title,
+        document_id=document_id,
+        min_paragraph=min_paragraph,
+        max_paragraph=max_paragraph,
+        username=username,
+        user_id=user_id,
+    )
+    if rag_backend() == "local":
+        from vector_index import get_local_index
+
+        return RAGResult(get_local_index().search(query_embedding, match_count, **filters))
+
+    from supabase_lib import query_rag as query_rag_sql
+
+    return query_rag_sql(query_embedding, match_count, **filters)
+
+
+def group_batch_rows(rows: List[dict], n_queries: int, n_sets: int) -> List[List[List[dict]]]:
+    """match_rag_batch rows (query_index / filter_index) → [query][set] → rows, in rank order."""
+    grouped: List[List[List[dict]]] = [[[] for _ in range(n_sets)] for _ in range(n_queries)]
+    for row in rows:
+        row = dict(row)
+        grouped[row.pop("query_index")][row.pop("filter_index")].append(row)
+    return grouped
+
+
+def query_rag_batch(
+    query_embeddings: Sequence,
+    match_count=5,
+    document_type_sets=None,
+    chapter_title=None,
+    document_id=None,
+    min_paragraph=None,
+    max_paragraph=None,
+    username=None,
+    user_id=None,
+):
+    """Top match_count rows for every (query, document-type set) pair; shared metadata filters."""
+    sets = list(document_type_sets) if document_type_sets else [None]
+    filters = dict(
+        chapter_title=chapter_title,
+        document_id=document_id,
+        min_paragraph=min_paragraph,
+        max_paragraph=max_paragraph,
+        username=username,
+        user_id=user_id,
+    )
+    if rag_backend() == "local":
+        from vector_index import get_local_index
+
+        index = get_local_index()
+        return RAGResult([
+            [index.search(q, match_count, document_types=types, **filters) for types in sets]
+            for q in query_embeddings
+        ])
+
+    from supabase_lib import query_rag_batch as query_rag_batch_sql
+
+    resp = query_rag_batch_sql(query_embeddings, match_count, document_type_sets=sets, **filters)
+    if resp.error:
+        return RAGResult([], resp.error)
+    return RAGResult(group_batch_rows(resp.data or [], len(query_embeddings), len(sets)))
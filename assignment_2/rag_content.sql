@@ -1,5 +1,5 @@
 -- rag_content.sql
--- Enable required extensions
+-- Enable required extensions (pgvector >= 0.5 for HNSW)
 create extension if not exists vector;
 create extension if not exists pgcrypto;
 
@@ -21,15 +21,77 @@ create table public.rag_content (
     metadata jsonb
 );
 
--- Vector index for similarity search (ivfflat with cosine)
-create index if not exists idx_rag_content_embedding on public.rag_content
-using ivfflat (embedding vector_cosine)
-with (lists = 100);
+-- ---------------------------------------------------------------------
+-- Vector indexes (HNSW, cosine)
+-- ---------------------------------------------------------------------
+-- HNSW needs no training data (ivfflat's `lists` had to be tuned to the
+-- row count and was built on an empty table) and its recall is tuned
+-- per query through hnsw.ef_search (see match_rag's ef_search argument).
+create index if not exists idx_rag_content_embedding_hnsw on public.rag_content
+using hnsw (embedding vector_cosine_ops)
+with (m = 16, ef_construction = 64);
+
+-- Partial HNSW per document type: a query for books walks a graph that
+-- only contains books, instead of discarding every other type while
+-- scanning. match_rag inlines a single document type as a literal so
+-- the planner can match these predicates. Add one per type you query.
+create index if not exists idx_rag_content_embedding_book on public.rag_content
+using hnsw (embedding vector_cosine_ops)
+with (m = 16, ef_construction = 64)
+where document_type = 'book';
+
+create index if not exists idx_rag_content_embedding_job on public.rag_content
+using hnsw (embedding vector_cosine_ops)
+with (m = 16, ef_construction = 64)
+where document_type = 'job';
+
+-- ---------------------------------------------------------------------
+-- B-tree indexes for the metadata filters
+-- ---------------------------------------------------------------------
+-- document → chapter → paragraph range (match_rag scans these exactly)
+create index if not exists idx_rag_content_document on public.rag_content
+    (document_id, chapter_title, paragraph_number);
+-- tenant + type
+create index if not exists idx_rag_content_user_type on public.rag_content (user_id, document_type);
+create index if not exists idx_rag_content_username_type on public.rag_content (username, document_type);
+create index if not exists idx_rag_content_type on public.rag_content (document_type);
 
 -- GIN index for metadata lookups (if you use metadata keys later)
 create index if not exists idx_rag_content_metadata_gin on public.rag_content using gin (metadata);
 
+-- Per-tenant partial HNSW, for tenants large enough to deserve their own
+-- graph:  select public.create_tenant_vector_index('some-user-id');
+create or replace function public.create_tenant_vector_index(tenant_user_id text)
+returns void
+language plpgsql as $$
+begin
+    execute format(
+        'create index if not exists %I on public.rag_content '
+        'using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64) '
+        'where user_id = %L',
+        'idx_rag_content_embedding_user_' || left(md5(tenant_user_id), 16),
+        tenant_user_id
+    );
+end;
+$$;
+
+-- ---------------------------------------------------------------------
 -- RPC: match_rag (supports metadata filtering)
+-- ---------------------------------------------------------------------
+-- The query is assembled per call with only the filters that are set,
+-- so each filter combination gets its own plan instead of one generic
+-- plan full of `x is null or ...` branches:
+--   - document_id given → the document's rows come from the b-tree
+--     index and are ranked exactly (a document is small, and the ANN
+--     graph would have to skip everything else);
+--   - otherwise → HNSW (the partial per-type / per-tenant graph when
+--     one exists), with ef_search candidates per query.
+-- A single document type and user_id are inlined as literals (%L) so
+-- partial index predicates can be matched; everything else is bound.
+-- volatile, not stable: it sets hnsw.ef_search (a side effect), which a
+-- stable function may not be relied on to do.
+drop function if exists public.match_rag(vector, int, text[], text, text, text, text, int, int);
+
 create or replace function public.match_rag(
     query_embedding vector(1536),
     match_count int,
@@ -39,7 +101,8 @@ create or replace function public.match_rag(
     filter_document_id text default null,
     filter_chapter_title text default null,
     min_paragraph int default null,
-    max_paragraph int default null
+    max_paragraph int default null,
+    ef_search int default 100
 )
 returns table (
     id uuid,
@@ -52,26 +115,130 @@ returns table (
     user_id text,
     similarity float
 )
-language sql stable as $$
-    select
-        rc.id,
-        rc.context,
-        rc.document_type,
-        rc.document_id,
-        rc.chapter_title,
-        rc.paragraph_number,
-        rc.username,
-        rc.user_id,
-        1 - (rc.embedding <=> query_embedding) as similarity
-    from public.rag_content rc
-    where
-        (query_document_types is null or rc.document_type = any(query_document_types))
-        and (filter_username is null or rc.username = filter_username)
-        and (filter_user_id is null or rc.user_id = filter_user_id)
-        and (filter_document_id is null or rc.document_id = filter_document_id)
-        and (filter_chapter_title is null or rc.chapter_title = filter_chapter_title)
-        and (min_paragraph is null or rc.paragraph_number >= min_paragraph)
-        and (max_paragraph is null or rc.paragraph_number <= max_paragraph)
-    order by rc.embedding <=> query_embedding
-    limit match_count;
+language plpgsql volatile as $$
+declare
+    conds text[] := array[]::text[];
+    where_sql text;
+    select_sql text := 'select rc.id, rc.context, rc.document_type, rc.document_id, rc.chapter_title, '
+        'rc.paragraph_number, rc.username, rc.user_id, 1 - (rc.embedding <=> $1) as similarity';
+begin
+    -- transaction-local; never below match_count or HNSW returns fewer rows than asked,
+    -- never above 1000 (pgvector's maximum; larger values make set_config fail)
+    perform set_config('hnsw.ef_search', least(1000, greatest(ef_search, match_count))::text, true);
+
+    if query_document_types is not null then
+        if cardinality(query_document_types) = 1 then
+            conds := conds || format('rc.document_type = %L', query_document_types[1]);
+        else
+            conds := conds || 'rc.document_type = any($2)'::text;
+        end if;
+    end if;
+    if filter_username is not null then
+        conds := conds || 'rc.username = $3'::text;
+    end if;
+    if filter_user_id is not null then
+        conds := conds || format('rc.user_id = %L', filter_user_id);
+    end if;
+    if filter_document_id is not null then
+        conds := conds || 'rc.document_id = $5'::text;
+    end if;
+    if filter_chapter_title is not null then
+        conds := conds || 'rc.chapter_title = $6'::text;
+    end if;
+    if min_paragraph is not null then
+        conds := conds || 'rc.paragraph_number >= $7'::text;
+    end if;
+    if max_paragraph is not null then
+        conds := conds || 'rc.paragraph_number <= $8'::text;
+    end if;
+    where_sql := coalesce(nullif(array_to_string(conds, ' and '), ''), 'true');
+
+    if filter_document_id is not null then
+        -- exact ranking over the (b-tree filtered) rows of one document
+        return query execute format(
+            'with candidates as materialized ('
+            '  select rc.*, rc.embedding <=> $1 as distance from public.rag_content rc where %s'
+            ') %s from candidates rc order by rc.distance limit $9',
+            where_sql, select_sql
+        )
+        using query_embedding, query_document_types, filter_username, filter_user_id,
+              filter_document_id, filter_chapter_title, min_paragraph, max_paragraph, match_count;
+    else
+        return query execute format(
+            '%s from public.rag_content rc where %s order by rc.embedding <=> $1 limit $9',
+            select_sql, where_sql
+        )
+        using query_embedding, query_document_types, filter_username, filter_user_id,
+              filter_document_id, filter_chapter_title, min_paragraph, max_paragraph, match_count;
+    end if;
+end;
+$$;
+
+-- ---------------------------------------------------------------------
+-- RPC: match_rag_batch (N query embeddings x M document-type sets)
+-- ---------------------------------------------------------------------
+-- One round trip for what would otherwise be N*M match_rag calls
+-- (evaluation sweeps, resume → jobs + profiles, multi-question chat).
+--   query_embeddings:   jsonb array of embeddings, e.g. [[0.1, ...], ...]
+--                       (jsonb because PostgREST cannot pass vector[])
+--   document_type_sets: jsonb array of type lists, e.g. [["job"], ["profile"]];
+--                       a null entry (or a null argument) means no type filter
+-- The remaining filters apply to every pair. Each pair runs through
+-- match_rag, so it gets the same per-filter plan and index choice.
+-- Rows carry query_index / filter_index (0-based) to regroup them.
+-- volatile because match_rag is.
+create or replace function public.match_rag_batch(
+    query_embeddings jsonb,
+    match_count int,
+    document_type_sets jsonb default null,
+    filter_username text default null,
+    filter_user_id text default null,
+    filter_document_id text default null,
+    filter_chapter_title text default null,
+    min_paragraph int default null,
+    max_paragraph int default null,
+    ef_search int default 100
+)
+returns table (
+    query_index int,
+    filter_index int,
+    id uuid,
+    context text,
+    document_type text,
+    document_id text,
+    chapter_title text,
+    paragraph_number int,
+    username text,
+    user_id text,
+    similarity float
+)
+language plpgsql volatile as $$
+declare
+    q record;
+    s record;
+    types text[];
+begin
+    for q in
+        select e.value::text::vector(1536) as embedding, (e.ordinality - 1)::int as idx
+        from jsonb_array_elements(query_embeddings) with ordinality as e
+    loop
+        for s in
+            select t.value as type_set, (t.ordinality - 1)::int as idx
+            from jsonb_array_elements(coalesce(document_type_sets, '[null]'::jsonb)) with ordinality as t
+        loop
+            if jsonb_typeof(s.type_set) = 'array' then
+                types := array(select jsonb_array_elements_text(s.type_set));
+            else
+                types := null;
+            end if;
+
+            return query
+            select q.idx, s.idx, m.*
+            from public.match_rag(
+                q.embedding, match_count, types, filter_username, filter_user_id,
+                filter_document_id, filter_chapter_title, min_paragraph, max_paragraph, ef_search
+            ) m;
+        end loop;
+    end loop;
+end;
 $$;
@@ -22,10 +22,13 @@ def query_rag(
     max_paragraph=None,
     username=None,
     user_id=None,
+    ef_search=None,
 ):
     """
     Call match_rag RPC in Supabase with all supported metadata filters.
     All filter_* arguments default to None and are passed-through.
+    ef_search (HNSW candidates per query) is only sent when set, so the
+    SQL function's default applies otherwise.
     """
     payload = {
         "query_embedding": query_embedding,
@@ -38,11 +41,50 @@ def query_rag(
         "min_paragraph": min_paragraph,
         "max_paragraph": max_paragraph
     }
+    if ef_search is not None:
+        payload["ef_search"] = ef_search
 
     resp = supabase.rpc("match_rag", payload).execute()
     return resp
 
 
+def query_rag_batch(
+    query_embeddings,
+    match_count=5,
+    document_type_sets=None,
+    chapter_title=None,
+    document_id=None,
+    min_paragraph=None,
+    max_paragraph=None,
+    username=None,
+    user_id=None,
+    ef_search=None,
+):
+    """
+    Call match_rag_batch RPC: top match_count rows for every
+    (query embedding, document-type set) pair in one round trip.
+    document_type_sets is a list of type lists (None entries = no type
+    filter); None runs each query once without a type filter. The other
+    filters apply to every pair. Rows carry query_index / filter_index.
+    """
+    payload = {
+        "query_embeddings": list(query_embeddings),
+        "match_count": match_count,
+        "document_type_sets": document_type_sets,
+        "filter_username": username,
+        "filter_user_id": user_id,
+        "filter_document_id": document_id,
+        "filter_chapter_title": chapter_title,
+        "min_paragraph": min_paragraph,
+        "max_paragraph": max_paragraph
+    }
+    if ef_search is not None:
+        payload["ef_search"] = ef_search
+
+    resp = supabase.rpc("match_rag_batch", payload).execute()
+    return resp
+
+
 def insert_resume(resume_json: dict) -> dict:
     """
     Insert parsed resume JSON into the 'resumes' table.
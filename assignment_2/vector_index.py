@@ -0,0 +1,431 @@
+# vector_index.py
+# ---------------------------------------------------------
+# In-process vector index over an export of rag_content: the same
+# filters and similarity as the match_rag SQL function, no database.
+#
+# On disk (RAG_LOCAL_INDEX_DIR):
+#   vectors.f32 – L2-normalized float32 matrix (n, dim), memory-mapped
+#   rows.json   – the columns match_rag returns (id, context, ...)
+#   hnsw.bin    – HNSW graph (only when hnswlib is installed)
+#
+# hnswlib is optional and not pulled in by any requirements file:
+# `pip install hnswlib` to enable the HNSW path below. Loading or
+# building an index without it logs a warning once the row count is
+# past EXACT_SEARCH_MAX, where every query becomes a full scan.
+#
+# Filters are boolean bitmaps over the rows, one per (column, value),
+# set from per-column postings lists (built on first use) and AND-ed
+# together with the paragraph range. A query whose filters leave at
+# most EXACT_SEARCH_MAX rows is answered exactly (one matrix-vector
+# product over those rows); otherwise HNSW is searched with the
+# bitmap as its filter, so filtered rows never crowd out matches the
+# way a post-filtered ivfflat scan can. Without hnswlib every query
+# is exact. hnswlib keeps its graph (and a vector copy) in memory;
+# the exact path reads the memory-mapped matrix.
+#
+#   python vector_index.py export --out rag_content.jsonl
+#   python vector_index.py build --export rag_content.jsonl
+#   python vector_index.py parity --queries 200
+#   python vector_index.py selftest   # exact vs HNSW on synthetic rows, offline
+# ---------------------------------------------------------
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None  # type: ignore
+
+RAG_LOCAL_INDEX_DIR = os.environ.get("RAG_LOCAL_INDEX_DIR", ".cache/rag_index")
+RAG_LOCAL_EF_SEARCH = int(os.environ.get("RAG_LOCAL_EF_SEARCH", "64"))
+EXACT_SEARCH_MAX = int(os.environ.get("RAG_LOCAL_EXACT_MAX", "20000"))
+
+logger = logging.getLogger(__name__)
+
+# columns returned by match_rag (plus similarity)
+COLUMNS = ("id", "context", "document_type", "document_id", "chapter_title", "paragraph_number", "username", "user_id")
+# filter argument → column, for the equality filters of match_rag
+FILTER_COLUMNS = {
+    "username": "username",
+    "user_id": "user_id",
+    "document_id": "document_id",
+    "chapter_title": "chapter_title",
+}
+
+
+def _parse_embedding(value) -> np.ndarray:
+    # PostgREST returns pgvector columns as "[0.1,0.2,...]" strings
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+class LocalVectorIndex:
+    def __init__(self, directory: str = RAG_LOCAL_INDEX_DIR, ef_search: int = RAG_LOCAL_EF_SEARCH):
+        with open(os.path.join(directory, "rows.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.dim: int = meta["dim"]
+        self.columns: Dict[str, List[Any]] = meta["columns"]
+        self.count = len(self.columns["id"])
+        self.vectors = np.memmap(
+            os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+        )
+        # NULL paragraph numbers are NaN: every range comparison is false, as in SQL
+        self.paragraphs = np.array(
+            [np.nan if p is None else p for p in self.columns["paragraph_number"]], dtype=np.float64
+        )
+        self._postings: Dict[str, Dict[Any, np.ndarray]] = {}
+
+        self.hnsw = None
+        hnsw_path = os.path.join(directory, "hnsw.bin")
+        if hnswlib is not None and os.path.exists(hnsw_path) and self.count:
+            self.hnsw = hnswlib.Index(space="cosine", dim=self.dim)
+            self.hnsw.load_index(hnsw_path, max_elements=self.count)
+            self.hnsw.set_ef(ef_search)
+        elif self.count > EXACT_SEARCH_MAX:
+            logger.warning(
+                "%s: %d rows and %s; every query is an exact scan", directory, self.count,
+                "no hnsw.bin (rebuild the index)" if hnswlib is not None else "hnswlib not installed (pip install hnswlib)",
+            )
+
+    # --- filters ---
+    def _bitmap(self, column: str, value: Any) -> np.ndarray:
+        postings = self._postings.get(column)
+        if postings is None:
+            rows_by_value: Dict[Any, List[int]] = {}
+            for i, v in enumerate(self.columns[column]):
+                rows_by_value.setdefault(v, []).append(i)
+            postings = self._postings[column] = {
+                v: np.asarray(rows, dtype=np.int64) for v, rows in rows_by_value.items()
+            }
+        bitmap = np.zeros(self.count, dtype=bool)
+        rows = postings.get(value)
+        if rows is not None:
+            bitmap[rows] = True
+        return bitmap
+
+    def filter_mask(
+        self,
+        document_types: Optional[Sequence[str]] = None,
+        min_paragraph: Optional[int] = None,
+        max_paragraph: Optional[int] = None,
+        **equals: Optional[str],
+    ) -> Optional[np.ndarray]:
+        """Rows passing every given filter (None = no filter at all), with match_rag's NULL semantics."""
+        mask: Optional[np.ndarray] = None
+
+        def _and(bitmap: np.ndarray) -> None:
+            nonlocal mask
+            mask = bitmap if mask is None else (mask & bitmap)
+
+        if document_types is not None:
+            any_type = np.zeros(self.count, dtype=bool)
+            for t in document_types:
+                # `document_type = any(...)` is never true for NULL, on either side
+                if t is not None:
+                    any_type |= self._bitmap("document_type", t)
+            _and(any_type)
+        for arg, value in equals.items():
+            if value is not None:
+                _and(self._bitmap(FILTER_COLUMNS[arg], value))
+        if min_paragraph is not None:
+            _and(self.paragraphs >= min_paragraph)
+        if max_paragraph is not None:
+            _and(self.paragraphs <= max_paragraph)
+        return mask
+
+    # --- search ---
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        match_count: int = 5,
+        document_types: Optional[Sequence[str]] = None,
+        chapter_title: Optional[str] = None,
+        document_id: Optional[str] = None,
+        min_paragraph: Optional[int] = None,
+        max_paragraph: Optional[int] = None,
+        username: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top match_count rows by cosine similarity, shaped like match_rag's result rows."""
+        if not self.count or match_count <= 0:
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+
+        mask = self.filter_mask(
+            document_types, min_paragraph, max_paragraph,
+            username=username, user_id=user_id, document_id=document_id, chapter_title=chapter_title,
+        )
+        candidates = self.count if mask is None else int(np.count_nonzero(mask))
+        k = min(match_count, candidates)
+        if k == 0:
+            return []
+
+        found = None
+        if self.hnsw is not None and candidates > EXACT_SEARCH_MAX:
+            found = self._search_hnsw(q, k, mask)
+        rows, sims = found if found is not None else self._search_exact(q, k, mask)
+        return [
+            {**{c: self.columns[c][i] for c in COLUMNS}, "similarity": float(s)}
+            for i, s in zip(rows.tolist(), sims.tolist())
+        ]
+
+
+    def _search_exact(self, q: np.ndarray, k: int, mask: Optional[np.ndarray]):
+        if mask is None:
+            # straight off the memmap; fancy indexing would copy the whole matrix per query
+            rows = np.arange(self.count)
+            sims = self.vectors @ q
+        else:
+            rows = np.flatnonzero(mask)
+            sims = self.vectors[rows] @ q
+        top = np.argpartition(-sims, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return rows[top], sims[top]
+
+    def _search_hnsw(self, q: np.ndarray, k: int, mask: Optional[np.ndarray]):
+        self.hnsw.set_ef(max(RAG_LOCAL_EF_SEARCH, k))
+        try:
+            labels, distances = self.hnsw.knn_query(
+                q, k=k, filter=None if mask is None else (lambda i: bool(mask[i]))
+            )
+        except RuntimeError:  # fewer than k reachable under the filter: the caller falls back to exact
+            return None
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+
+_index: Optional[LocalVectorIndex] = None
+
+
+def get_local_index() -> LocalVectorIndex:
+    global _index
+    if _index is None:
+        _index = LocalVectorIndex(RAG_LOCAL_INDEX_DIR)
+    return _index
+
+
+# --------------------------------------------------------------------
+# Build / export
+# --------------------------------------------------------------------
+def iter_export(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a rag_content export: JSON lines (see `export`) or a JSON array."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            yield from json.load(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def build_index(rows: Iterable[Dict[str, Any]], directory: str = RAG_LOCAL_INDEX_DIR,
+                m: int = 16, ef_construction: int = 200) -> int:
+    """Write vectors.f32 / rows.json (/ hnsw.bin) for `rows`; returns the row count."""
+    os.makedirs(directory, exist_ok=True)
+    columns: Dict[str, List[Any]] = {c: [] for c in COLUMNS}
+    dim = 0
+    with open(os.path.join(directory, "vectors.f32"), "wb") as f:
+        for row in rows:
+            if row.get("embedding") is None:
+                continue
+            vec = _parse_embedding(row["embedding"])
+            dim = dim or len(vec)
+            if len(vec) != dim:
+                raise ValueError(f"row {row.get('id')}: embedding has {len(vec)} dims, expected {dim}")
+            f.write((vec / (np.linalg.norm(vec) or 1.0)).astype(np.float32).tobytes())
+            for c in COLUMNS:
+                columns[c].append(row.get(c))
+
+    count = len(columns["id"])
+    with open(os.path.join(directory, "rows.json"), "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "columns": columns}, f)
+
+    hnsw_path = os.path.join(directory, "hnsw.bin")
+    if os.path.exists(hnsw_path):
+        os.remove(hnsw_path)
+    if hnswlib is None:
+        if count > EXACT_SEARCH_MAX:
+            logger.warning("hnswlib not installed (pip install hnswlib): %s gets no HNSW graph", directory)
+    elif count:
+        vectors = np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+        index = hnswlib.Index(space="cosine", dim=dim)
+        index.init_index(max_elements=count, M=m, ef_construction=ef_construction)
+        index.add_items(vectors, np.arange(count))
+        index.save_index(hnsw_path)
+    return count
+
+
+def export_rag_content(out_path: str, page_size: int = 1000) -> int:
+    """Page through rag_content with the Supabase client and write JSON lines."""
+    from supabase_lib import supabase
+
+    select = ",".join(COLUMNS + ("embedding",))
+    written = 0
+    with open(out_path, "w", encoding="utf-8") as f:
+        while True:
+            resp = (
+                supabase.table("rag_content").select(select).order("id")
+                .range(written, written + page_size - 1).execute()
+            )
+            rows = resp.data or []
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            written += len(rows)
+            if len(rows) < page_size:
+                return written
+
+
+# --------------------------------------------------------------------
+# Parity with the SQL path
+# --------------------------------------------------------------------
+def _random_filters(index: LocalVectorIndex, rng: random.Random) -> Dict[str, Any]:
+    """A match_rag filter combination drawn from values present in the index."""
+    i = rng.randrange(index.count)
+    filters: Dict[str, Any] = {"document_types": [index.columns["document_type"][i]]}
+    for arg in ("username", "user_id", "document_id", "chapter_title"):
+        if rng.random() < 0.3:
+            filters[arg] = index.columns[FILTER_COLUMNS[arg]][i]
+    p = index.columns["paragraph_number"][i]
+    if p is not None and rng.random() < 0.3:
+        filters["min_paragraph"], filters["max_paragraph"] = max(p - 20, 1), p + 20
+    return filters
+
+
+def parity(queries: int, match_count: int, seed: int = 0) -> None:
+    """Compare local top-k with match_rag for queries sampled from the corpus itself."""
+    from supabase_lib import query_rag
+
+    index = get_local_index()
+    rng = random.Random(seed)
+    overlaps, local_ms, sql_ms = [], [], []
+    for _ in range(queries):
+        # a stored vector plus noise: realistic neighbours, not an exact self-match
+        q = np.asarray(index.vectors[rng.randrange(index.count)]) + np.random.default_rng(
+            rng.randrange(1 << 30)
+        ).normal(0, 0.01, index.dim).astype(np.float32)
+        filters = _random_filters(index, rng)
+
+        started = time.perf_counter()
+        local = index.search(q.tolist(), match_count, **filters)
+        local_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        sql = query_rag(q.tolist(), match_count, **filters).data or []
+        sql_ms.append((time.perf_counter() - started) * 1000)
+
+        expected = {r["id"] for r in local}
+        got = {r["id"] for r in sql}
+        if expected or got:
+            overlaps.append(len(expected & got) / max(len(expected), len(got)))
+
+    print(f"queries: {queries}, k={match_count}, index rows: {index.count}, hnsw: {index.hnsw is not None}")
+    print(f"top-k overlap local vs match_rag: mean {np.mean(overlaps):.3f}, min {np.min(overlaps):.3f}, "
+          f"identical {sum(o == 1.0 for o in overlaps)}/{len(overlaps)}")
+    print(f"latency p50/p95 ms: local {np.percentile(local_ms, 50):.3f}/{np.percentile(local_ms, 95):.3f}, "
+          f"match_rag {np.percentile(sql_ms, 50):.1f}/{np.percentile(sql_ms, 95):.1f}")
+
+
+# --------------------------------------------------------------------
+# Offline self-test: exact vs HNSW, NULL semantics
+# --------------------------------------------------------------------
+def _synthetic_rows(count: int, dim: int, seed: int) -> Iterator[Dict[str, Any]]:
+    """Clustered vectors (like embeddings of related chunks); every fourth row has no document type."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(count // 100, 1), dim)).astype(np.float32)
+    types = ("book", "job", "profile", None)
+    for i in range(count):
+        vec = centers[rng.integers(len(centers))] + rng.normal(0, 0.3, dim).astype(np.float32)
+        yield {
+            "id": str(i), "context": f"row {i}", "document_type": types[i % 4],
+            "document_id": f"doc-{i % 40}", "chapter_title": None, "paragraph_number": (i % 300) or None,
+            "username": None, "user_id": f"user-{i % 3}", "embedding": vec.tolist(),
+        }
+
+
+def selftest(count: int, dim: int, queries: int, match_count: int, min_recall: float, seed: int = 0) -> None:
+    """Top-k recall of HNSW against exact search on a synthetic index, plus match_rag's NULL semantics."""
+    with tempfile.TemporaryDirectory() as directory:
+        build_index(_synthetic_rows(count, dim, seed), directory)
+        index = LocalVectorIndex(directory)
+        types = index.columns["document_type"]
+
+        assert not index.search(index.vectors[0], match_count, document_types=[None]), \
+            "document_types=[None] matched untyped rows"
+        untyped = {index.columns["id"][i] for i, t in enumerate(types) if t is None}
+        for filter_types in (["book"], ["job", "profile"], ["book", None]):
+            hits = index.search(index.vectors[3], count, document_types=filter_types)
+            assert hits and not untyped & {r["id"] for r in hits}, f"{filter_types} matched untyped rows"
+        print("ok: untyped rows never match a document_types filter")
+
+        if index.hnsw is None:
+            sys.exit("selftest: hnswlib not installed (pip install hnswlib), HNSW not compared")
+        rng = random.Random(seed)
+        filter_sets = [{}, {"document_types": ["book"]}, {"document_types": ["job", "profile"]}, {"user_id": "user-1"}]
+        for filters in filter_sets:
+            mask = index.filter_mask(
+                filters.get("document_types"), user_id=filters.get("user_id"),
+            )
+            recalls, fallbacks = [], 0
+            for _ in range(queries):
+                q = np.asarray(index.vectors[rng.randrange(index.count)]) + np.random.default_rng(
+                    rng.randrange(1 << 30)
+                ).normal(0, 0.05, index.dim).astype(np.float32)
+                q /= np.linalg.norm(q)
+                exact, _ = index._search_exact(q, match_count, mask)
+                found = index._search_hnsw(q, match_count, mask)
+                if found is None:
+                    fallbacks += 1
+                    continue
+                assert mask is None or mask[found[0]].all(), f"HNSW returned filtered-out rows for {filters}"
+                recalls.append(len(set(exact.tolist()) & set(found[0].tolist())) / len(exact))
+            recall = float(np.mean(recalls)) if recalls else 1.0
+            print(f"filters {filters or 'none'}: recall@{match_count} {recall:.3f} "
+                  f"(min {min(recalls, default=1.0):.2f}), {fallbacks} exact fallbacks")
+            assert recall >= min_recall, f"HNSW recall {recall:.3f} < {min_recall} for {filters}"
+        print(f"ok: {len(filter_sets)} filter sets x {queries} queries, {index.count} rows, dim {index.dim}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local rag_content vector index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="dump rag_content (with embeddings) to JSON lines")
+    p.add_argument("--out", default="rag_content.jsonl")
+    p = sub.add_parser("build", help="build the index from an export")
+    p.add_argument("--export", default="rag_content.jsonl")
+    p.add_argument("--dir", default=RAG_LOCAL_INDEX_DIR)
+    p = sub.add_parser("parity", help="compare local results with match_rag")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=8)
+    p = sub.add_parser("selftest", help="exact vs HNSW top-k on synthetic rows (no database)")
+    p.add_argument("--rows", type=int, default=5000)
+    p.add_argument("--dim", type=int, default=64)
+    p.add_argument("--queries", type=int, default=100)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--min-recall", type=float, default=0.9)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"exported {export_rag_content(args.out)} rows to {args.out}")
+    elif args.command == "build":
+        started = time.perf_counter()
+        n = build_index(iter_export(args.export), args.dir)
+        print(f"indexed {n} rows in {time.perf_counter() - started:.1f}s → {args.dir}")
+    elif args.command == "parity":
+        parity(args.queries, args.k)
+    else:
+        try:
+            selftest(args.rows, args.dim, args.queries, args.k, args.min_recall)
+        except AssertionError as e:
+            sys.exit(f"FAIL: {e}")
@@ -0,0 +1,62 @@
+"""
+Check that the vendored module copies are identical.
+
+Each app in this repo runs from its own folder, so shared modules are
+copied into every app that uses them ("keep the copies in sync").
+This fails, listing the differing copies, when any copy drifts:
+
+    python check_vendored.py          # exit status 1 on a mismatch
+
+Edit one copy, then copy it over the others.
+"""
+
+import hashlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+VENDORED = {
+    "llm_gateway.py": [
+        "assignment_1/llm_gateway.py",
+        "assignment_2/llm_gateway.py",
+        "OCR_ICD_Case_Study/backend/llm_gateway.py",
+    ],
+    "embedding_cache.py": [
+        "assignment_1/embedding_cache.py",
+        "assignment_2/embedding_cache.py",
+    ],
+    "rag_backend.py": [
+        "assignment_1/rag_backend.py",
+        "assignment_2/rag_backend.py",
+    ],
+}
+
+
+def _sha256(path: str) -> str:
+    with open(os.path.join(ROOT, path), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def main() -> int:
+    failed = False
+    for name, copies in VENDORED.items():
+        digests = {}
+        for path in copies:
+            if not os.path.exists(os.path.join(ROOT, path)):
+                print(f"{name}: missing copy {path}")
+                failed = True
+                continue
+            digests.setdefault(_sha256(path), []).append(path)
+        if len(digests) > 1:
+            failed = True
+            print(f"{name}: copies differ")
+            for digest, paths in digests.items():
+                print(f"  {digest[:12]}  {', '.join(paths)}")
+        elif digests:
+            print(f"{name}: {len(copies)} copies in sync ({next(iter(digests))[:12]})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())